@@ -8,17 +8,31 @@
 from machine import Timer
 from devices import Devices
 from bbl import *
+from bbl.servos import PULSE_MIN_DEFAULT, PULSE_MAX_DEFAULT
 from machine import Pin
 from parser import DataParser
+from parser import ANALOG_HYSTERESIS_DEFAULT, ANALOG_DWELL_DEFAULT
+from runtime import GCPolicy
+from array import array
 import utime
 import ulogger
 
 logger = ulogger.Logger()
 
 
+BUTTON_NUM = 4
+
+
 class ButtonHandler:
     """
     A class to handle button events.
+
+    The button levels are packed into a bitmask (bit set = pressed) and edges
+    are found by XOR with the mask of the previous frame, so a frame without
+    any change and without a pending long press costs a single compare.
+    Besides press down, release, short and long presses the handler reports
+    double clicks and chords (several buttons held together). A chord
+    replaces the single key events of its buttons.
     """
 
     def __init__(self):
@@ -28,24 +42,32 @@ class ButtonHandler:
         Args:
             None
         """
-        self.buttons = {
-            "button1": {
-                "LONG_THR": 1000
-            },
-            "button2": {
-                "LONG_THR": 1000
-            },
-            "button3": {
-                "LONG_THR": 1000
-            },
-            "button4": {
-                "LONG_THR": 1000
-            },
-        }
+        self.button_names = ("button1", "button2", "button3", "button4")
+        self.long_thr = array('l', [1000] * BUTTON_NUM)
+        self.double_thr = 300
+        self.pressed_time = array('l', [0] * BUTTON_NUM)
+        self.released_time = array('l', [0] * BUTTON_NUM)
+        self.chord_masks = bytearray(0)
+
+        self.last_mask = 0
+        # Buttons whose press down was reported and release is not yet
+        self.down_mask = 0
+        # Buttons held down whose long press has not been reported yet
+        self.long_wait_mask = 0
+        # Buttons released after a short press, waiting for a second click
+        self.short_wait_mask = 0
+        # Buttons with a double click event, their short press is held
+        # back until the double click time has passed
+        self.double_mask = (1 << BUTTON_NUM) - 1
+        # Buttons of the chord being held
+        self.chord_mask = 0
+
         self.buttons_long_callback = None
         self.buttons_short_callback = None
         self.buttons_press_down_callback = None
         self.buttons_release_callback = None
+        self.buttons_double_callback = None
+        self.chord_callback = None
 
     def set_long_threshold(self, button_name, new_threshold):
         """
@@ -60,13 +82,45 @@ class ButtonHandler:
             >>> # Update the long press threshold for button1
             >>> update_threshold(init_config, "button1", 1500)
         """
-        if button_name in self.buttons:
-            self.buttons[button_name]['LONG_THR'] = new_threshold
+        if button_name in self.button_names:
+            self.long_thr[self.button_names.index(button_name)] = new_threshold
             print("Button {} long press threshold updated to {}.".format(
                 button_name, new_threshold))
         else:
             print(f"Button {button_name} does not exist.")
 
+    def set_double_threshold(self, new_threshold):
+        """
+        Update the maximum time between two short presses of the same button
+        that is still reported as a double click.
+
+        Args:
+            new_threshold: Time threshold in milliseconds (ms).
+        """
+        self.double_thr = new_threshold
+
+    def set_double_mask(self, mask):
+        """
+        Set the buttons that report double clicks. Only these wait for a
+        second click before reporting a short press.
+
+        Args:
+            mask (int): Bitmask of the buttons, bit 0 is button1.
+        """
+        self.double_mask = mask
+        self.short_wait_mask &= mask
+
+    def set_chords(self, chord_masks):
+        """
+        Set the button combinations reported as chords.
+
+        Args:
+            chord_masks (list): Bitmasks of the combinations, bit 0 is button1.
+                Masks with less than two buttons are ignored.
+        """
+        self.chord_masks = bytearray(m if m & (m - 1) else 0
+                                     for m in chord_masks)
+
     def long_callback_register(self, callback):
         """
         Registers a callback for long button presses.
@@ -103,57 +157,623 @@ class ButtonHandler:
         """
         self.buttons_release_callback = callback
 
-    def check_buttons(self, buttons_value_list):
+    def double_callback_register(self, callback):
+        """
+        Registers a callback for double clicks. A double click is not
+        reported as short presses.
+
+        Args:
+            callback (function): The callback function.
+        """
+        self.buttons_double_callback = callback
+
+    def chord_callback_register(self, callback):
+        """
+        Registers a callback for chords, called with the chord index.
+
+        Args:
+            callback (function): The callback function.
+        """
+        self.chord_callback = callback
+
+    def check_buttons(self, buttons_value, offset=0):
         """
         Checks the button states and triggers callbacks as needed.
 
         Args:
-            value (list): A list of button states.
-        """
-        if not isinstance(buttons_value_list, list):
-            raise ValueError("[BTN]buttons_value_list must be a list")
-        if len(buttons_value_list) != len(self.buttons):
-            raise ValueError(
-                "[BTN]The length must match the number of buttons")
-
-        for i, (button_name, button_config) in enumerate(self.buttons.items()):
-            button_state = buttons_value_list[i]
-
-            # Check if the button is pressed
-            if button_state == 0:
-                if "pressed_time" not in button_config:
-                    button_config["pressed_time"] = utime.ticks_ms()
-                    # print("press down")
+            buttons_value (list): Button levels, 0 means pressed.
+            offset (int): Index of the first button in buttons_value.
+        """
+        self.check_mask((buttons_value[offset] == 0)
+                        | (buttons_value[offset + 1] == 0) << 1
+                        | (buttons_value[offset + 2] == 0) << 2
+                        | (buttons_value[offset + 3] == 0) << 3)
+
+    def check_mask(self, mask):
+        """
+        Checks the packed button states and triggers callbacks as needed.
+
+        Args:
+            mask (int): Pressed buttons, bit 0 is button1.
+        """
+        changed = mask ^ self.last_mask
+        if changed == 0 and self.long_wait_mask == 0 and \
+                self.short_wait_mask == 0:
+            return
+
+        now = utime.ticks_ms()
+        if changed != 0:
+            self.last_mask = mask
+            if changed & mask:
+                # A chord fires once all of its buttons are held
+                for i in range(len(self.chord_masks)):
+                    if self.chord_masks[i] == mask:
+                        self._chord_start(mask)
+                        self.chord_callback(i)
+
+            for i in range(BUTTON_NUM):
+                bit = 1 << i
+                if changed & bit == 0:
+                    continue
+                if mask & bit:
+                    if self.chord_mask & bit:
+                        continue
+                    self.pressed_time[i] = now
+                    self.long_wait_mask |= bit
+                    self.down_mask |= bit
                     self.buttons_press_down_callback(i)
+                    continue
+
+                self.long_wait_mask &= ~bit
+                if self.down_mask & bit:
+                    self.down_mask &= ~bit
+                    self.buttons_release_callback(i)
+                if self.chord_mask & bit:
+                    self.chord_mask &= ~bit
+                    continue
+                if utime.ticks_diff(now,
+                                    self.pressed_time[i]) >= self.long_thr[i]:
+                    continue
+
+                if self.short_wait_mask & bit:
+                    self.short_wait_mask &= ~bit
+                    self.buttons_double_callback(i)
+                elif self.double_mask & bit:
+                    # Wait for a second click before calling it short
+                    self.short_wait_mask |= bit
+                    self.released_time[i] = now
                 else:
-                    press_duration = utime.ticks_ms(
-                    ) - button_config["pressed_time"]
-                    if press_duration >= button_config[
-                            "LONG_THR"] and not button_config.get(
-                                "long_pressed", False):
-                        # print("long_press:", press_duration, "(ms)")
-                        self.buttons_long_callback(i)
-                        button_config["long_pressed"] = True
+                    self.buttons_short_callback(i)
+
+        if self.long_wait_mask != 0:
+            for i in range(BUTTON_NUM):
+                bit = 1 << i
+                if self.long_wait_mask & bit and utime.ticks_diff(
+                        now, self.pressed_time[i]) >= self.long_thr[i]:
+                    self.long_wait_mask &= ~bit
+                    self.buttons_long_callback(i)
+
+        if self.short_wait_mask != 0:
+            for i in range(BUTTON_NUM):
+                bit = 1 << i
+                if self.short_wait_mask & bit and utime.ticks_diff(
+                        now, self.released_time[i]) > self.double_thr:
+                    self.short_wait_mask &= ~bit
+                    self.buttons_short_callback(i)
+
+    def _chord_start(self, mask):
+        # The chord replaces the single key events of its buttons. Buttons
+        # whose press down was reported before still get their release.
+        self.chord_mask = mask
+        self.long_wait_mask &= ~mask
+        self.short_wait_mask &= ~mask
+
+
+ANALOG_CH_NUM = 6
+ANALOG_EQUAL = 0
+ANALOG_BELOW = 1
+ANALOG_ABOVE = 2
+
+
+class AnalogCrossDetector:
+    """
+    A class to track the position of each stick relative to its centre.
+
+    The state of every channel (ANALOG_EQUAL, ANALOG_BELOW or ANALOG_ABOVE)
+    is packed into one int, two bits per channel. A channel leaves the
+    centre only once it is past its hysteresis band and returns only once
+    it is back in the deadzone. A new state must be held for the dwell time
+    before it is reported, so a stick jittering at the deadzone edge does
+    not fire a burst of events.
+    """
+
+    def __init__(self, ch_num=ANALOG_CH_NUM):
+        """
+        Initializes the AnalogCrossDetector instance.
+
+        Args:
+            ch_num (int): Number of analog channels.
+        """
+        self.ch_num = ch_num
+        self.hysteresis = array('l', [ANALOG_HYSTERESIS_DEFAULT] * ch_num)
+        self.dwell = array('l', [ANALOG_DWELL_DEFAULT] * ch_num)
+        self.pending_time = array('l', [0] * ch_num)
+        self.state = 0
+        self.pending = 0
+        self.pending_mask = 0
+
+    def set_hysteresis(self, ch_idx, band):
+        """
+        Sets the hysteresis band of a channel.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            band (int): Distance from centre, in normalized units \
+                (-2048 to 2048), a stick must pass to leave the centre.
+        """
+        self.hysteresis[ch_idx] = band if band > 0 else 0
+
+    def set_dwell(self, ch_idx, dwell_ms):
+        """
+        Sets the time a new state must be held before it is reported.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            dwell_ms (int): Dwell time in milliseconds (ms).
+        """
+        self.dwell[ch_idx] = dwell_ms if dwell_ms > 0 else 0
+
+    def get_state(self, ch_idx):
+        """
+        Gets the reported state of a channel.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+
+        Returns:
+            int: ANALOG_EQUAL, ANALOG_BELOW or ANALOG_ABOVE.
+        """
+        return (self.state >> (ch_idx << 1)) & 3
+
+    def reset(self):
+        """
+        Returns all channels to ANALOG_EQUAL without reporting it.
+        """
+        self.state = 0
+        self.pending = 0
+        self.pending_mask = 0
+
+    def update(self, values):
+        """
+        Feeds the normalized values of a frame.
+
+        Args:
+            values (list): Normalized values, 0 inside the deadzone.
+
+        Returns:
+            int: Change mask, the two bits of every channel whose \
+                reported state changed are set.
+        """
+        state = self.state
+        cand = 0
+        for ch_idx in range(self.ch_num):
+            shift = ch_idx << 1
+            value = values[ch_idx]
+            band = self.hysteresis[ch_idx]
+            if value > band:
+                cand |= ANALOG_ABOVE << shift
+            elif value < -band:
+                cand |= ANALOG_BELOW << shift
+            elif value != 0:
+                # Inside the band: keep the reported state
+                cand |= state & (3 << shift)
+
+        diff = cand ^ state
+        if diff == 0 and self.pending_mask == 0:
+            return 0
+
+        now = utime.ticks_ms()
+        changed = 0
+        for ch_idx in range(self.ch_num):
+            mask = 3 << (ch_idx << 1)
+            if diff & mask == 0:
+                self.pending_mask &= ~mask
+                continue
+
+            new = cand & mask
+            if self.pending_mask & mask == 0 or self.pending & mask != new:
+                self.pending = (self.pending & ~mask) | new
+                self.pending_mask |= mask
+                self.pending_time[ch_idx] = now
+
+            if utime.ticks_diff(now, self.pending_time[ch_idx]) >= \
+                    self.dwell[ch_idx]:
+                state = (state & ~mask) | new
+                self.pending_mask &= ~mask
+                changed |= mask
+
+        self.state = state
+        return changed
+
+
+class AnalogZoneDetector:
+    """
+    A class to resolve the zone of each stick against a sorted threshold table.
+
+    The zone of a channel is the number of its thresholds at or below the
+    current value. It is found by binary search, so the cost per frame
+    grows with the log of the number of thresholds, and only the zone index
+    is compared against the previous frame.
+    """
+
+    def __init__(self, ch_num=ANALOG_CH_NUM):
+        """
+        Initializes the AnalogZoneDetector instance.
+
+        Args:
+            ch_num (int): Number of analog channels.
+        """
+        self.ch_num = ch_num
+        self.thresholds = [array('h') for _ in range(ch_num)]
+        self.zone = bytearray(ch_num)
+        self.last_zone = bytearray(ch_num)
+
+    def set_thresholds(self, ch_idx, thresholds):
+        """
+        Sets the thresholds of a channel. The channel starts in the zone \
+            of the stick centre, so no event fires for a centred stick.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            thresholds (list): Thresholds in normalized units \
+                (-2048 to 2048).
+        """
+        self.thresholds[ch_idx] = array('h', sorted(thresholds))
+        self.zone[ch_idx] = self.find_zone(ch_idx, 0)
+        self.last_zone[ch_idx] = self.zone[ch_idx]
+
+    def find_zone(self, ch_idx, value):
+        """
+        Gets the zone of a value.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            value (int): Normalized value.
+
+        Returns:
+            int: Number of thresholds at or below the value.
+        """
+        thresholds = self.thresholds[ch_idx]
+        lo = 0
+        hi = len(thresholds)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if thresholds[mid] <= value:
+                lo = mid + 1
             else:
-                if "pressed_time" in button_config:
-                    # Calculate the duration of key presses
-                    press_duration = utime.ticks_ms(
-                    ) - button_config["pressed_time"]
-                    # print("press release")
-                    self.buttons_release_callback(i)
-                    del button_config["pressed_time"]
-                    # Reset long press status
-                    button_config["long_pressed"] = False
+                hi = mid
+        return lo
 
-                    # Check if it is a long press event
-                    if press_duration >= button_config["LONG_THR"]:
-                        pass
-                    else:
-                        # print("short_press_callback")
-                        self.buttons_short_callback(i)
+    def update(self, values):
+        """
+        Feeds the normalized values of a frame.
+
+        Args:
+            values (list): Normalized values.
+
+        Returns:
+            int: Change mask, bit n is set when channel n changed zone. \
+                The previous zone is kept in last_zone.
+        """
+        changed = 0
+        for ch_idx in range(self.ch_num):
+            if len(self.thresholds[ch_idx]) == 0:
+                continue
+            zone = self.find_zone(ch_idx, values[ch_idx])
+            if zone != self.zone[ch_idx]:
+                self.last_zone[ch_idx] = self.zone[ch_idx]
+                self.zone[ch_idx] = zone
+                changed |= 1 << ch_idx
+        return changed
+
+
+FILTER_NONE = 0
+FILTER_IIR = 1
+FILTER_MEDIAN = 2
+FILTER_RATE = 3
+FILTER_NAMES = ("none", "iir", "median", "rate")
+FILTER_IIR_FRAC = 8  # Fraction bits kept in the low pass state
+FILTER_TICK_MS = 10  # Time step of the IIR and rate filters
+FILTER_MAX_TICKS = 16  # Steps caught up at most after a long gap
+
+
+class AnalogInputFilter:
+    """
+    A class to clean up the raw stick values before they are normalized.
+
+    Every channel runs one filter, with all state preallocated:
+    FILTER_IIR is a first order low pass, y += (x - y) >> param, with
+    FILTER_IIR_FRAC fraction bits kept in the state. FILTER_MEDIAN takes
+    the median of the last three frames and drops single frame spikes.
+    FILTER_RATE moves the value by at most param per step.
+
+    The control frame period changes with the input activity, so the low
+    pass and the rate limit step once per FILTER_TICK_MS of elapsed time
+    rather than once per frame. Their time constant and slew rate are the
+    same at any frame rate. The median works on frames, as spikes come
+    per frame.
+    """
+
+    def __init__(self, ch_num=ANALOG_CH_NUM):
+        """
+        Initializes the AnalogInputFilter instance.
+
+        Args:
+            ch_num (int): Number of analog channels.
+        """
+        self.ch_num = ch_num
+        self.kind = bytearray(ch_num)
+        self.param = array('l', [0] * ch_num)
+        # Low pass accumulator or last output
+        self.state = array('l', [0] * ch_num)
+        # Two previous raw values per channel for the median
+        self.hist = array('l', [0] * (ch_num * 2))
+        self.primed = 0
+        # Time of the last update and the part of a step left over
+        self.tick = 0
+        self.rem_ms = 0
+
+    def set_filter(self, ch_idx, kind, param=0):
+        """
+        Sets the filter of a channel and restarts it from the next value.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            kind (int): FILTER_NONE, FILTER_IIR, FILTER_MEDIAN or \
+                FILTER_RATE.
+            param (int): Shift of FILTER_IIR (1 to 8) or the step of \
+                FILTER_RATE in ADC counts per FILTER_TICK_MS.
+        """
+        if kind == FILTER_IIR:
+            param = min(max(param, 1), FILTER_IIR_FRAC)
+        elif kind == FILTER_RATE and param <= 0:
+            kind = FILTER_NONE
+        self.kind[ch_idx] = kind
+        self.param[ch_idx] = param
+        self.primed &= ~(1 << ch_idx)
+
+    def reset(self):
+        """
+        Restarts all filters from the next value.
+        """
+        self.primed = 0
+
+    def update(self, values):
+        """
+        Filters the raw values of a frame in place.
+
+        Args:
+            values (list): Raw ADC values, the first ch_num are filtered.
+        """
+        now = utime.ticks_ms()
+        elapsed = utime.ticks_diff(now, self.tick) + self.rem_ms
+        self.tick = now
+        steps = elapsed // FILTER_TICK_MS
+        if steps > FILTER_MAX_TICKS:
+            steps = FILTER_MAX_TICKS
+            self.rem_ms = 0
+        else:
+            self.rem_ms = elapsed - steps * FILTER_TICK_MS
+
+        for ch_idx in range(self.ch_num):
+            kind = self.kind[ch_idx]
+            if kind == FILTER_NONE:
+                continue
+
+            x = values[ch_idx]
+            bit = 1 << ch_idx
+            if self.primed & bit == 0:
+                self.primed |= bit
+                self.state[ch_idx] = x << FILTER_IIR_FRAC \
+                    if kind == FILTER_IIR else x
+                self.hist[ch_idx << 1] = x
+                self.hist[(ch_idx << 1) + 1] = x
+                continue
+
+            if kind == FILTER_IIR:
+                acc = self.state[ch_idx]
+                target = x << FILTER_IIR_FRAC
+                shift = self.param[ch_idx]
+                for _ in range(steps):
+                    acc += (target - acc) >> shift
+                self.state[ch_idx] = acc
+                values[ch_idx] = (acc + (1 << (FILTER_IIR_FRAC - 1))) >> \
+                    FILTER_IIR_FRAC
+            elif kind == FILTER_MEDIAN:
+                h = ch_idx << 1
+                a = self.hist[h]
+                b = self.hist[h + 1]
+                self.hist[h] = b
+                self.hist[h + 1] = x
+                if a > b:
+                    a, b = b, a
+                # Median of a <= b and x
+                values[ch_idx] = a if x < a else (b if x > b else x)
+            else:
+                y = self.state[ch_idx]
+                step = self.param[ch_idx] * steps
+                if x > y + step:
+                    y += step
+                elif x < y - step:
+                    y -= step
+                else:
+                    y = x
+                self.state[ch_idx] = y
+                values[ch_idx] = y
+
+CAL_OFF = 0
+CAL_PROPOSE = 1
+CAL_APPLY = 2
+CAL_MODE_NAMES = ("off", "propose", "apply")
+CAL_WINDOW_MS = 1280  # Length of a window, 64 frames at 20ms
+CAL_MIN_FRAMES = 8  # Fewer frames in a window give no result
+CAL_REST_SPAN = 64  # Largest spread of a resting stick in ADC counts
+CAL_SIGMA_K = 4
+CAL_DZ_MARGIN = 8
+CAL_DZ_MIN = 16
+CAL_DZ_MAX = 400
+
+
+class StickCalibrator:
+    """
+    A class to work out the centre and deadzone of each stick at rest.
+
+    The raw values are collected over windows of CAL_WINDOW_MS as integer
+    sums of the offset from the first value and of its square. The window
+    is timed rather than counted in frames, so it lasts as long at the
+    fast and at the idle frame rate. A channel whose spread stays within CAL_REST_SPAN and whose
+    mean is inside the configured deadzone around the configured centre
+    was at rest, a stick held still while deflected is not learned: its
+    centre becomes the mean and its deadzone the larger of CAL_SIGMA_K
+    standard deviations and the largest deviation seen, plus
+    CAL_DZ_MARGIN. A channel that moved is skipped until the next window.
+    """
+
+    def __init__(self, ch_num=ANALOG_CH_NUM):
+        """
+        Initializes the StickCalibrator instance.
+
+        Args:
+            ch_num (int): Number of analog channels.
+        """
+        self.ch_num = ch_num
+        self.mode = CAL_OFF
+        self.count = 0
+        self.start = 0
+        self.moved = 0
+        self.ref = array('l', [0] * ch_num)
+        self.sum = array('l', [0] * ch_num)
+        self.sum_sq = array('l', [0] * ch_num)
+        self.lo = array('l', [0] * ch_num)
+        self.hi = array('l', [0] * ch_num)
+        self.config_mid = array('l', [2048] * ch_num)
+        self.config_deadzone = array('l', [0] * ch_num)
+        # Latest result of every channel
+        self.mid = array('l', [2048] * ch_num)
+        self.deadzone = array('l', [0] * ch_num)
+        self.valid = 0
+
+    def set_mode(self, mode):
+        """
+        Sets the mode and restarts the window.
+
+        Args:
+            mode (int): CAL_OFF, CAL_PROPOSE or CAL_APPLY.
+        """
+        self.mode = mode
+        self.count = 0
+        self.valid = 0
+
+    def set_config(self, ch_idx, mid, deadzone):
+        """
+        Sets the configured centre and deadzone a rest centre must lie in.
+
+        Args:
+            ch_idx (int): Index of the channel (0 to 5).
+            mid (int): Centre from the config in ADC counts.
+            deadzone (int): Deadzone from the config in ADC counts.
+        """
+        self.config_mid[ch_idx] = mid
+        self.config_deadzone[ch_idx] = deadzone
+
+    def update(self, values):
+        """
+        Feeds the raw values of a frame.
+
+        Args:
+            values (list): Raw ADC values.
+
+        Returns:
+            int: Mask of the channels with a new centre or deadzone, \
+                only set on the last frame of a window.
+        """
+        now = utime.ticks_ms()
+        if self.count == 0:
+            self.start = now
+            self.moved = 0
+            for ch_idx in range(self.ch_num):
+                x = values[ch_idx]
+                self.ref[ch_idx] = x
+                self.lo[ch_idx] = x
+                self.hi[ch_idx] = x
+                self.sum[ch_idx] = 0
+                self.sum_sq[ch_idx] = 0
+        else:
+            for ch_idx in range(self.ch_num):
+                bit = 1 << ch_idx
+                if self.moved & bit:
+                    continue
+                x = values[ch_idx]
+                if x < self.lo[ch_idx]:
+                    self.lo[ch_idx] = x
+                elif x > self.hi[ch_idx]:
+                    self.hi[ch_idx] = x
+                if self.hi[ch_idx] - self.lo[ch_idx] > CAL_REST_SPAN:
+                    # Also keeps the sums within a small int
+                    self.moved |= bit
+                    continue
+                d = x - self.ref[ch_idx]
+                self.sum[ch_idx] += d
+                self.sum_sq[ch_idx] += d * d
+
+        self.count += 1
+        if utime.ticks_diff(now, self.start) < CAL_WINDOW_MS:
+            return 0
+        n = self.count
+        self.count = 0
+        if n < CAL_MIN_FRAMES:
+            return 0
+
+        changed = 0
+        for ch_idx in range(self.ch_num):
+            bit = 1 << ch_idx
+            if self.moved & bit:
+                continue
+            s = self.sum[ch_idx]
+            mean = self.ref[ch_idx] + div_round(s, n)
+            if abs(mean - self.config_mid[ch_idx]) > \
+                    self.config_deadzone[ch_idx]:
+                continue
+
+            var = (self.sum_sq[ch_idx] * n - s * s) // (n * n)
+            peak = max(self.hi[ch_idx] - mean, mean - self.lo[ch_idx])
+            dz = max(CAL_SIGMA_K * isqrt(var), peak) + CAL_DZ_MARGIN
+            dz = min(max(dz, CAL_DZ_MIN), CAL_DZ_MAX)
+
+            # Ignore the last count of noise on the result itself
+            if self.valid & bit and \
+                    abs(mean - self.mid[ch_idx]) <= 1 and \
+                    abs(dz - self.deadzone[ch_idx]) <= 2:
+                continue
+            self.mid[ch_idx] = mean
+            self.deadzone[ch_idx] = dz
+            self.valid |= bit
+            changed |= bit
+        return changed
+
+
+PERMISSION_NONE = -1
 
 
 class PermissionManager:
+    """
+    A singleton class to arbitrate which source drives a device.
+
+    Permission names are interned as small integers and the current level of
+    every device is held in an array, so the per-frame check through
+    request() is a single compare. The string based methods are kept for
+    callers outside the control loop.
+    """
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -163,10 +783,42 @@ class PermissionManager:
 
     def __init__(self, logger=print):
         if not hasattr(self, '_initialized'):
-            self.devices: dict[str, dict] = {}
+            self.devices: dict[str, int] = {}
+            self.permissions: dict[str, int] = {}
+            self.permission_names: List[str] = []
+            self.device_orders: List[List[int]] = []
+            self.current = array('b')
             self.logger = logger  # Logger for output messages
             self._initialized = True  # Mark the instance as initialized
 
+    def _log(self, msg, *args):
+        # Only format when there is someone to read it
+        if self.logger is not None:
+            self.logger(msg % args)
+
+    def permission_id(self, permission: str) -> int:
+        """
+        Get the integer of a permission level, interning it if needed.
+
+        :param permission: Permission level.
+        :return: The interned permission level.
+        """
+        perm_id = self.permissions.get(permission, PERMISSION_NONE)
+        if perm_id == PERMISSION_NONE:
+            perm_id = len(self.permission_names)
+            self.permissions[permission] = perm_id
+            self.permission_names.append(permission)
+        return perm_id
+
+    def device_id(self, device_name: str) -> int:
+        """
+        Get the integer of a registered device.
+
+        :param device_name: Name of the device.
+        :return: The device index, or PERMISSION_NONE if not registered.
+        """
+        return self.devices.get(device_name, PERMISSION_NONE)
+
     def add_permission(self, device_name: str, permission: str) -> bool:
         """
         Add a new permission level to a specific device.
@@ -176,15 +828,17 @@ class PermissionManager:
         :return: True if the permission is added successfully,
                  False if it already exists.
         """
-        if device_name not in self.devices:
-            self.logger(f"Device '{device_name}' not registered.")
+        dev_id = self.device_id(device_name)
+        if dev_id == PERMISSION_NONE:
+            self._log("Device '%s' not registered.", device_name)
             return False
 
-        device_permissions = self.devices[device_name]['permissions']
-        if permission in device_permissions:
-            self.logger(f"'{permission}' already exists in '{device_name}'.")
+        perm_id = self.permission_id(permission)
+        device_permissions = self.device_orders[dev_id]
+        if perm_id in device_permissions:
+            self._log("'%s' already exists in '%s'.", permission, device_name)
             return False
-        device_permissions.append(permission)
+        device_permissions.append(perm_id)
         return True
 
     def set_permission_order(self, device_name: str,
@@ -196,16 +850,18 @@ class PermissionManager:
         :param permissions: List of permission levels in desired order.
         :return: True if order is set successfully, False otherwise.
         """
-        if device_name not in self.devices:
-            self.logger(f"Device '{device_name}' not registered.")
+        dev_id = self.device_id(device_name)
+        if dev_id == PERMISSION_NONE:
+            self._log("Device '%s' not registered.", device_name)
             return False
 
         if len(permissions) < 1:
-            self.logger("Permission levels cannot be empty.")
+            self._log("Permission levels cannot be empty.")
             return False
 
-        self.devices[device_name]['permissions'] = permissions
-        self.logger(f"Order for device '{device_name}' to {permissions}.")
+        self.device_orders[dev_id] = [self.permission_id(p)
+                                      for p in permissions]
+        self._log("Order for device '%s' to %s.", device_name, permissions)
         return True
 
     def register_device(self, device_name: str,
@@ -219,14 +875,32 @@ class PermissionManager:
         :return: True if registration is successful, False otherwise.
         """
         if device_name in self.devices:
-            self.logger(f"Device '{device_name}' already registered.")
+            self._log("Device '%s' already registered.", device_name)
             return False
 
-        self.devices[device_name] = {
-            'permissions': [initial_permission],
-            'current_permission': initial_permission
-        }
-        self.logger(f"'{device_name}' registered '{initial_permission}'.")
+        perm_id = self.permission_id(initial_permission)
+        self.devices[device_name] = len(self.device_orders)
+        self.device_orders.append([perm_id])
+        self.current.append(perm_id)
+        self._log("'%s' registered '%s'.", device_name, initial_permission)
+        return True
+
+    def set_level(self, dev_id: int, perm_id: int) -> bool:
+        """
+        Set the permission level of a device by integers.
+
+        :param dev_id: Device index from device_id().
+        :param perm_id: Permission level from permission_id().
+        :return: True if permission is set successfully, False otherwise.
+        """
+        if perm_id not in self.device_orders[dev_id]:
+            self._log("Invalid permission %d for device %d.", perm_id, dev_id)
+            return False
+
+        if self.current[dev_id] != perm_id:
+            self.current[dev_id] = perm_id
+            self._log("Device %d set to '%s'.", dev_id,
+                      self.permission_names[perm_id])
         return True
 
     def set_device_permission(self, device_name: str, permission: str) -> bool:
@@ -237,16 +911,15 @@ class PermissionManager:
         :param permission: Permission level to set.
         :return: True if permission is set successfully, False otherwise.
         """
-        if device_name not in self.devices:
-            self.logger(f"Device '{device_name}' not registered.")
+        dev_id = self.device_id(device_name)
+        if dev_id == PERMISSION_NONE:
+            self._log("Device '%s' not registered.", device_name)
             return False
-        if permission not in self.devices[device_name]['permissions']:
-            self.logger(f"Invalid '{permission}' for device '{device_name}'.")
+        perm_id = self.permissions.get(permission, PERMISSION_NONE)
+        if perm_id == PERMISSION_NONE:
+            self._log("Invalid '%s' for device '%s'.", permission, device_name)
             return False
-
-        self.devices[device_name]['current_permission'] = permission
-        self.logger(f"'{device_name}' set to '{permission}'.")
-        return True
+        return self.set_level(dev_id, perm_id)
 
     def get_device_permission(self, device_name: str) -> str:
         """
@@ -255,10 +928,21 @@ class PermissionManager:
         :param device_name: Name of the device.
         :return: Permission level of the device, or None if not registered.
         """
-        if device_name not in self.devices:
-            self.logger(f"Device '{device_name}' not registered.")
+        dev_id = self.device_id(device_name)
+        if dev_id == PERMISSION_NONE:
+            self._log("Device '%s' not registered.", device_name)
             return None
-        return self.devices[device_name]['current_permission']
+        return self.permission_names[self.current[dev_id]]
+
+    def request(self, dev_id: int, perm_id: int) -> bool:
+        """
+        Check by integers whether a permission level currently drives a device.
+
+        :param dev_id: Device index from device_id().
+        :param perm_id: Permission level from permission_id().
+        :return: True if the requested permission is the current one.
+        """
+        return self.current[dev_id] == perm_id
 
     def request_permission(self, device_name: str, permission: str) -> bool:
         """
@@ -266,94 +950,412 @@ class PermissionManager:
 
         :param device_name: Name of the device.
         :param permission: Permission level to request.
-        :return: True if the requested permission is higher than the current
+        :return: True if the requested permission is the current one.
         """
-        if device_name not in self.devices:
-            self.logger(f"Device '{device_name}' not registered.")
+        dev_id = self.device_id(device_name)
+        if dev_id == PERMISSION_NONE:
+            self._log("Device '%s' not registered.", device_name)
             return False
-        if permission not in self.devices[device_name]['permissions']:
-            self.logger(f"Invalid '{permission}' for device '{device_name}'.")
+        perm_id = self.permissions.get(permission, PERMISSION_NONE)
+        if perm_id not in self.device_orders[dev_id]:
+            self._log("Invalid '%s' for device '%s'.", permission, device_name)
             return False
+        return self.current[dev_id] == perm_id
 
-        cur_p = self.devices[device_name]['current_permission']
-        current_index = self.devices[device_name]['permissions'].index(cur_p)
-        req_idx = self.devices[device_name]['permissions'].index(permission)
 
-        # Return True if requested permission is greater than the current one
-        return req_idx == current_index
+KEY_EVENTS = ("short", "long", "down", "release", "double")
+KEY_SHORT = 0
+KEY_LONG = 1
+KEY_DOWN = 2
+KEY_RELEASE = 3
+KEY_DOUBLE = 4
+ANALOG_EVENTS = ("equal_mid", "below_mid", "above_mid")
+EFFECT_NONE = -1
 
 
-class CycleList:
+class EffectStore:
     """
-    A class to manage a list of items in a cyclic manner.
-    Attributes:
-        items_list (list): A list of lists containing items to cycle through.
-        index_list (list): A list of indices corresponding to each list
-        in items_list.
+    A class to cycle through the effects configured for each event.
+
+    All effect IDs are kept in one flat array built at config load. Each
+    (source, event type) pair owns a group of slots, one per configured
+    actuator entry, and every slot has an offset, a length and a cursor into
+    the flat array. Triggering an event only bumps the cursors of its slots.
     """
 
-    def __init__(self,
-                 items1=[],
-                 items2=[],
-                 items3=[],
-                 items4=[],
-                 items5=[],
-                 items6=[],
-                 items7=[],
-                 items8=[]):
-        self.items_list = [
-            items1, items2, items3, items4, items5, items6, items7, items8
-        ]
-        self.index_list = [0, 0, 0, 0, 0, 0, 0, 0]
+    def __init__(self):
+        """
+        Initializes the EffectStore instance.
+        """
+        self.clear()
 
-    def get_next_item(self, index):
-        if not isinstance(index, int) or index < 0 or index >= len(
-                self.items_list):
-            logger.warn("[CTRL]Index out of range")
-            return 0
-        if self.items_list[index] == []:  # Avoid setting values to empty
-            logger.warn("[CTRL]Items may be a non-empty list")
+    def clear(self):
+        """
+        Removes all groups.
+        """
+        self.effects = array('l')
+        self.slot_offset = array('H')
+        self.slot_len = array('H')
+        self.slot_cursor = array('H')
+        self.group_start = array('H')
+        self.group_len = array('H')
+
+    def add_group(self, effects):
+        """
+        Adds the effects of an event.
+
+        Args:
+            effects (list): One list of effect IDs per actuator entry.
+
+        Returns:
+            int: The group index, or EFFECT_NONE if there is no effect.
+        """
+        group_start = len(self.slot_offset)
+        for items in effects:
+            offset = len(self.effects)
+            for effect in items:
+                if isinstance(effect, int):
+                    self.effects.append(effect)
+            if len(self.effects) > offset:
+                self.slot_offset.append(offset)
+                self.slot_len.append(len(self.effects) - offset)
+                self.slot_cursor.append(0)
+
+        if len(self.slot_offset) == group_start:
+            return EFFECT_NONE
+        self.group_start.append(group_start)
+        self.group_len.append(len(self.slot_offset) - group_start)
+        return len(self.group_start) - 1
+
+    def next_effect(self, slot):
+        """
+        Gets the current effect of a slot and moves its cursor on.
+
+        Args:
+            slot (int): The slot index.
+
+        Returns:
+            int: The effect ID.
+        """
+        cursor = self.slot_cursor[slot]
+        effect = self.effects[self.slot_offset[slot] + cursor]
+        cursor += 1
+        self.slot_cursor[slot] = 0 if cursor >= self.slot_len[slot] else cursor
+        return effect
+
+
+LED_KEYS = ("led1", "led2")
+
+MIX_IN_NUM = 6
+MIX_OUT_NUM = 6  # MOTOR1, MOTOR2, PWM1 to PWM4
+MIX_OUT_NONE = 0
+MIX_OUT_SPEED = 1
+MIX_OUT_ANGLE = 2
+
+
+def div_round(n, d):
+    """
+    Divides by a positive integer, rounding half away from zero.
+    """
+    if n >= 0:
+        return (n + (d >> 1)) // d
+    return -((-n + (d >> 1)) // d)
+
+
+def isqrt(n):
+    """
+    Gets the integer square root, rounded down, of a non-negative integer.
+    """
+    if n <= 0:
+        return 0
+    x = n
+    y = (x + 1) >> 1
+    while y < x:
+        x = y
+        y = (x + n // x) >> 1
+    return x
+
+
+class Mixer:
+    """
+    A class to mix the analog inputs into the actuator outputs.
+
+    The weights form a 6x6 integer matrix in percent, one row per output in
+    mailbox slot order, built by DataParser from the channel controls. Each
+    input is shaped by its expo curve first. Each output row is then summed
+    and passed through an integer stage: an offset, a gain for each sign, a
+    rounding division, a post offset and a clamp.
+    """
+
+    def __init__(self):
+        """
+        Initializes the Mixer instance.
+        """
+        self.weights = array('h', [0] * (MIX_IN_NUM * MIX_OUT_NUM))
+        self.expo = array('h', [0] * MIX_IN_NUM)
+        self.active = 0  # Bit per output with at least one weight
+        self.kind = bytearray(MIX_OUT_NUM)
+        self.pre = array('l', [0] * MIX_OUT_NUM)
+        self.gain_pos = array('l', [0] * MIX_OUT_NUM)
+        self.gain_neg = array('l', [0] * MIX_OUT_NUM)
+        self.div = array('l', [1] * MIX_OUT_NUM)
+        self.post = array('l', [0] * MIX_OUT_NUM)
+        self.lo = array('l', [0] * MIX_OUT_NUM)
+        self.hi = array('l', [0] * MIX_OUT_NUM)
+        self.shaped = array('l', [0] * MIX_IN_NUM)
+        self.out = array('l', [0] * MIX_OUT_NUM)
+
+    def set_output(self, out_idx, kind, pre, gain_pos, gain_neg, div, post,
+                   lo, hi):
+        """
+        Sets the output stage of a row.
+
+        The output is clamp(div_round((mix + pre) * gain + post, div)),
+        with gain_pos for a non-negative (mix + pre) and gain_neg otherwise.
+
+        Args:
+            out_idx (int): Output row, 0 and 1 for the motors, 2 to 5 for
+                PWM1 to PWM4.
+            kind (int): MIX_OUT_SPEED or MIX_OUT_ANGLE, MIX_OUT_NONE to
+                leave the output to effects.
+        """
+        self.kind[out_idx] = kind
+        self.pre[out_idx] = int(pre)
+        self.gain_pos[out_idx] = int(gain_pos)
+        self.gain_neg[out_idx] = int(gain_neg)
+        self.div[out_idx] = int(div) if div > 0 else 1
+        self.post[out_idx] = int(post)
+        self.lo[out_idx] = int(lo)
+        self.hi[out_idx] = int(hi)
+
+    def load(self, sender, recv_info):
+        """
+        Loads the matrix and the output stages from a parsed setting.
+
+        Args:
+            sender (dict): The sender section with "mix" and "expo".
+            recv_info (dict): The receiver section with "motor" and "pwm".
+        """
+        weights = sender.get("mix", [])
+        expo = sender.get("expo", [])
+        for i in range(MIX_IN_NUM * MIX_OUT_NUM):
+            self.weights[i] = int(weights[i]) if i < len(weights) else 0
+        for i in range(MIX_IN_NUM):
+            self.expo[i] = min(max(int(expo[i]), 0), 100) \
+                if i < len(expo) else 0
+
+        motors = recv_info.get("motor", [])
+        for i in range(2):
+            if i < len(motors):
+                offset, min_val, max_val = motors[i][:3]
+                self.set_output(i, MIX_OUT_SPEED,
+                                div_round(int(offset * 2048), 100),
+                                max_val, min_val, 100, 0, -2047, 2047)
+            else:
+                self.set_output(i, MIX_OUT_NONE, 0, 0, 0, 1, 0, 0, 0)
+
+        pwms = recv_info.get("pwm", [])
+        for i in range(4):
+            pwm = pwms[i] if i < len(pwms) else []
+            pwm_type = pwm[4] if len(pwm) > 4 else ""
+            if pwm_type == "speed":
+                self.set_output(i + 2, MIX_OUT_SPEED, 0, pwm[3], pwm[2], 2048,
+                                0, -100, 100)
+            elif pwm_type == "angle":
+                span = pwm[3] - pwm[2]
+                self.set_output(i + 2, MIX_OUT_ANGLE, 0, span, span, 4096,
+                                (pwm[3] + pwm[2]) * 2048, 0, 180)
+            else:
+                self.set_output(i + 2, MIX_OUT_NONE, 0, 0, 0, 1, 0, 0, 0)
+
+        self.active = 0
+        for o in range(MIX_OUT_NUM):
+            if self.kind[o] == MIX_OUT_NONE:
+                continue
+            for i in range(MIX_IN_NUM):
+                if self.weights[o * MIX_IN_NUM + i]:
+                    self.active |= 1 << o
+                    break
+
+    def evaluate(self, inputs):
+        """
+        Mixes one frame of inputs into self.out.
+
+        Args:
+            inputs (list): At least 6 inputs in the range -2048 to 2048.
+
+        Returns:
+            int: Bit mask of the outputs driven by the mix.
+        """
+        active = self.active
+        if not active:
             return 0
 
-        item = self.items_list[index][self.index_list[index]]
-        self.index_list[index] = (self.index_list[index] + 1) % len(
-            self.items_list[index])
-        return item
-
-    def get_items(self, index):
-        if not isinstance(index, int) or index < 0 or index >= len(
-                self.items_list):
-            logger.warn("[CTRL]Index out of range")
-            return []
-        return self.items_list[index]
-
-    def set_items(self, index, items):
-        if not isinstance(index, int) or index < 0 or index >= len(
-                self.items_list):
-            logger.warn("[CTRL]Index out of range")
-            return
-        # if not isinstance(items, list) or not items:
-        #     print("[CTRL]Items must be a non-empty list")
-        #     return
+        shaped = self.shaped
+        for i in range(MIX_IN_NUM):
+            x = int(inputs[i])
+            e = self.expo[i]
+            if e:
+                # x * (1 - e) + x^3 * e, with x^3 scaled back to +-2048
+                x3 = (x * x >> 11) * x >> 11
+                x = div_round(x * (100 - e) + x3 * e, 100)
+            shaped[i] = x
+
+        weights = self.weights
+        for o in range(MIX_OUT_NUM):
+            if not active & (1 << o):
+                continue
+            acc = 0
+            base = o * MIX_IN_NUM
+            for i in range(MIX_IN_NUM):
+                w = weights[base + i]
+                if w:
+                    acc += w * shaped[i]
+            v = div_round(acc, 100) + self.pre[o]
+            v = v * (self.gain_pos[o] if v >= 0 else self.gain_neg[o])
+            v = div_round(v + self.post[o], self.div[o])
+            if v < self.lo[o]:
+                v = self.lo[o]
+            elif v > self.hi[o]:
+                v = self.hi[o]
+            self.out[o] = v
+        return active
+
+
+MAILBOX_SLOT_NUM = 6  # MOTOR1, MOTOR2, PWM1 to PWM4
+CMD_STOP = 0
+CMD_SPEED = 1
+CMD_ANGLE = 2
+CMD_STEP = 3
+CMD_DUTY = 4
+PRIO_NONE = -1
+PRIO_BEHAVIOR = 0
+PRIO_EVENT = 1
+PRIO_EXEC = 2
+PRIO_BOARD = 3
+
+
+class ActuatorMailbox:
+    """
+    A singleton class collecting the actuator commands of one control tick.
+
+    Every motor and servo has one preallocated slot holding a command, its
+    value and the priority of the source. All sources (remote
+    control, simulation, user code and the board key) post into the slots
+    and commit() pushes the winning command of each slot to the hardware
+    once per tick. A higher priority wins; between equal priorities the last
+    writer wins.
+    """
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(ActuatorMailbox, cls).__new__(cls)
+        return cls._instance
 
-        self.items_list[index] = items
-        self.index_list[index] = 0  # Reset index when setting new items
+    def __init__(self, motors=None, servos=None):
+        """
+        Initializes the ActuatorMailbox instance.
 
-    def set_index(self, index, list_index):
-        if not isinstance(index, int) or index < 0 or index >= len(
-                self.items_list):
-            logger.warn("[CTRL]Index out of range")
-            return
-        if not isinstance(list_index,
-                          int) or list_index < 0 or list_index >= len(
-                              self.items_list[index]):
-            logger.warn("[CTRL]List index out of range")
+        Args:
+            motors (MotorsController): Motors driven by the slots 0 and 1.
+            servos (ServosController): Servos driven by the slots 2 to 5.
+        """
+        if not hasattr(self, '_initialized'):
+            self.cmd = bytearray(MAILBOX_SLOT_NUM)
+            self.value = array('l', [0] * MAILBOX_SLOT_NUM)
+            self.prio = array('b', [PRIO_NONE] * MAILBOX_SLOT_NUM)
+            self.motors = None
+            self.servos = None
+            self._initialized = True
+        if motors is not None:
+            self.motors = motors
+        if servos is not None:
+            self.servos = servos
+
+    def post_motor(self, motor_idx, cmd, value, prio):
+        """
+        Posts a motor command.
+
+        Args:
+            motor_idx (int): Index of the motor (1 or 2).
+            cmd (int): CMD_STOP or CMD_SPEED.
+            value (int): Speed, from -2048 to 2048.
+            prio (int): Priority of the source.
+        """
+        if 1 <= motor_idx <= 2:
+            self._post(motor_idx - 1, cmd, value, prio)
+
+    def post_servo(self, servo_idx, cmd, value, prio):
+        """
+        Posts a servo command.
+
+        Args:
+            servo_idx (int): Index of the servo (1 to 4).
+            cmd (int): CMD_STOP, CMD_SPEED, CMD_ANGLE, CMD_STEP or CMD_DUTY.
+            value (int): Speed percentage, angle or duty, matching cmd.
+            prio (int): Priority of the source.
+        """
+        if 1 <= servo_idx <= 4:
+            self._post(servo_idx + 1, cmd, value, prio)
+
+    def _post(self, slot, cmd, value, prio):
+        if prio < self.prio[slot]:
             return
+        self.cmd[slot] = cmd
+        self.value[slot] = int(value)
+        self.prio[slot] = prio
+
+    def clear(self):
+        """
+        Drops all pending commands.
+        """
+        for slot in range(MAILBOX_SLOT_NUM):
+            self.prio[slot] = PRIO_NONE
 
-        self.index_list[index] = list_index % len(self.items_list[index])
+    def commit(self):
+        """
+        Pushes the pending command of every slot to the hardware.
+        """
+        for slot in range(MAILBOX_SLOT_NUM):
+            if self.prio[slot] == PRIO_NONE:
+                continue
+            self.prio[slot] = PRIO_NONE
+            cmd = self.cmd[slot]
+            value = self.value[slot]
+            if slot < 2:
+                if cmd == CMD_STOP:
+                    self.motors.stop(slot + 1)
+                else:
+                    self.motors.set_speed(slot + 1, value)
+                continue
+
+            servo_idx = slot - 1
+            if cmd == CMD_STOP:
+                self.servos.stop(servo_idx)
+            elif cmd == CMD_SPEED:
+                self.servos.set_speed(servo_idx, value)
+            elif cmd == CMD_ANGLE:
+                self.servos.set_angle(servo_idx, value)
+            elif cmd == CMD_STEP:
+                self.servos.set_angle_stepping(servo_idx, value)
+            else:
+                self.servos.set_duty(servo_idx, value)
 
 
 class ServosControllerExecMapper(ServosController):
+    """
+    The servos as seen by user scripts.
+
+    Angle, speed, duty and stop commands are posted to the mailbox at
+    PRIO_EXEC. The settings (refresh rate, calibration, profile and step
+    speed), move_group() and reset_info() go straight to the servos of the
+    mailbox: they either change how later commands move a servo or start
+    a motion over several servos, neither fits a single-value slot. The
+    motion calls still take the EXEC permission first, which keeps the
+    remote and simulation from posting to the servos, and a board command
+    posted in the same tick overrides them at commit().
+    """
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -362,8 +1364,12 @@ class ServosControllerExecMapper(ServosController):
         return cls._instance
 
     def __init__(self):
-        super().__init__()
-        self.singleton = ServosController()
+        # The mapper owns no PWMs, every call ends up on the servos of the
+        # mailbox. Scripts construct it again on every run.
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+        self._initialized = True
+        self.mailbox = ActuatorMailbox()
         self.dev_manager = PermissionManager(logger.debug)
         self._has_permission = False
 
@@ -375,31 +1381,57 @@ class ServosControllerExecMapper(ServosController):
 
     def set_angle(self, servo_idx, angle):
         self._permission_handle()
-        return self.singleton.set_angle(servo_idx, angle)
+        self.mailbox.post_servo(servo_idx, CMD_ANGLE, angle, PRIO_EXEC)
 
     def set_angle_stepping(self, servo_idx, angle, step_speed=None):
         self._permission_handle()
-        return self.singleton.set_angle_stepping(servo_idx, angle, step_speed)
+        if step_speed is not None:
+            self.mailbox.servos.set_angle_step(servo_idx, step_speed)
+        self.mailbox.post_servo(servo_idx, CMD_STEP, angle, PRIO_EXEC)
 
     def set_angle_step(self, servo_idx, step_speed=100):
         self._permission_handle()
-        return self.singleton.set_angle_step(servo_idx, step_speed)
+        return self.mailbox.servos.set_angle_step(servo_idx, step_speed)
+
+    def move_group(self, targets, duration_ms):
+        self._permission_handle()
+        return self.mailbox.servos.move_group(targets, duration_ms)
 
-    def reset_info(self, servo_idx, angle, radPSec=4, call_freq=100):
+    def reset_info(self, servo_idx, angle, radPSec=4, call_freq=None):
         self._permission_handle()
-        return self.singleton.reset_info(servo_idx, angle, radPSec, call_freq)
+        return self.mailbox.servos.reset_info(servo_idx, angle, radPSec,
+                                              call_freq)
+
+    def set_refresh_rate(self, servo_idx, freq=50):
+        return self.mailbox.servos.set_refresh_rate(servo_idx, freq)
+
+    def set_calibration(self, servo_idx, min_us=PULSE_MIN_DEFAULT,
+                        max_us=PULSE_MAX_DEFAULT, center_us=None):
+        return self.mailbox.servos.set_calibration(servo_idx, min_us, max_us,
+                                                   center_us)
+
+    def set_motion_profile(self, servo_idx, profile="constant", accel=0):
+        return self.mailbox.servos.set_motion_profile(servo_idx, profile,
+                                                      accel)
+
+    def get_write_stats(self):
+        return self.mailbox.servos.get_write_stats()
+
+    def reset_write_stats(self):
+        return self.mailbox.servos.reset_write_stats()
 
     def set_speed(self, servo_idx, speed_percentage):
         self._permission_handle()
-        return self.singleton.set_speed(servo_idx, speed_percentage)
+        self.mailbox.post_servo(servo_idx, CMD_SPEED, speed_percentage,
+                                PRIO_EXEC)
 
     def set_duty(self, servo_idx, duty):
         self._permission_handle()
-        return self.singleton.set_duty(servo_idx, duty)
+        self.mailbox.post_servo(servo_idx, CMD_DUTY, duty, PRIO_EXEC)
 
     def stop(self, servo_idx):
         self._permission_handle()
-        return self.singleton.stop(servo_idx)
+        self.mailbox.post_servo(servo_idx, CMD_STOP, 0, PRIO_EXEC)
 
 
 class MotorsControllerExecMapper(MotorsController):
@@ -411,8 +1443,11 @@ class MotorsControllerExecMapper(MotorsController):
         return cls._instance
 
     def __init__(self):
+        if hasattr(self, '_initialized') and self._initialized:
+            return
         super().__init__()
         self.singleton = MotorsController()
+        self.mailbox = ActuatorMailbox()
         self.dev_manager = PermissionManager(logger.debug)
         self._has_permission = False
 
@@ -420,13 +1455,13 @@ class MotorsControllerExecMapper(MotorsController):
         if self._has_permission is False:
             self.dev_manager.set_device_permission('MOTOR', 'EXEC')
             self._has_permission = True
-        return self.singleton.set_speed(motor_idx, speed)
+        self.mailbox.post_motor(motor_idx, CMD_SPEED, speed, PRIO_EXEC)
 
     def stop(self, motor_idx):
         if self._has_permission is False:
             self.dev_manager.set_device_permission('MOTOR', 'EXEC')
             self._has_permission = True
-        return self.singleton.stop(motor_idx)
+        self.mailbox.post_motor(motor_idx, CMD_STOP, 0, PRIO_EXEC)
 
     def set_forward_rate(self, motor_idx, val):
         return self.singleton.set_forward_rate(motor_idx, val)
@@ -455,6 +1490,7 @@ class BBL_Controller:
         self.motors_mapper = MotorsControllerExecMapper()
         self.servos = ServosController()
         self.motors = MotorsController()
+        self.mailbox = ActuatorMailbox(self.motors, self.servos)
         self.button_handler = ButtonHandler()
         self.led1 = LEDController("LED1")
         self.led2 = LEDController("LED2")
@@ -473,6 +1509,10 @@ class BBL_Controller:
                                               ['EXEC', 'EVENT', 'BEHAVIOR'])
         self.dev_manager.set_permission_order('SERVO',
                                               ['EXEC', 'EVENT', 'BEHAVIOR'])
+        self.motor_dev = self.dev_manager.device_id('MOTOR')
+        self.servo_dev = self.dev_manager.device_id('SERVO')
+        self.perm_event = self.dev_manager.permission_id('EVENT')
+        self.perm_behavior = self.dev_manager.permission_id('BEHAVIOR')
 
 
         code_exec_danger_cmds = [
@@ -496,23 +1536,40 @@ class BBL_Controller:
         self.executor.register_default_cmds(code_exec_default_cmds)
         self.executor.register_remap_rules(code_exec_remap_rules)
         self.executor.register_final_cb(self._executor_final_cb)
+        # Executor collections wait for the slack after a control frame,
+        # except the one before a script is compiled
+        gc_policy = GCPolicy()
+        self.executor.register_gc_cb(gc_policy.request, gc_policy.collect)
 
         self.d_ch_map = [None] * 2  # LED or Buzzer channel map
 
         self.setting = {}
+        self.recv_info = {}
         self.receiver_index = 0
+        self.id_multiplier = Devices.get_base_multiplier()
         self.enable_advanced_motor_control = [False] * 2
 
-        self.tracker_accel_default_value = [1] * 2
+        # Tracker slope in 1/1000 and low speed zone in percent
+        self.tracker_accel_default_value = [1000] * 2
         self.tracker_low_speed_zone_pctg = [0] * 2
-        self.tracker_high_speed_zone_pctg = [0] * 2
-        self.high_speed_duration = [1] * 2
 
         self.servos_effect_data_list = [0] * 4
         self.motors_effect_speed_list = [0] * 2
 
         self.adc_deadzone_list = [200] * 6
         self.adc_mid_list = [2048] * 6
+        # Frame being handled and the previous one, an unchanged frame
+        # only runs the timed parts
+        self.frame = [0] * 10
+        self.last_raw = [0] * 10
+        self.last_norm = array('l', [0] * 6)
+        self.last_perm = -1
+        self._force_frame = True
+        self._outputs_stopped = False
+        self.analog_detector = AnalogCrossDetector()
+        self.zone_detector = AnalogZoneDetector()
+        self.input_filter = AnalogInputFilter()
+        self.calibrator = StickCalibrator()
 
         self._timer_init()
 
@@ -520,35 +1577,34 @@ class BBL_Controller:
         self.button_handler.short_callback_register(self._button_short_cb)
         self.button_handler.press_down_callback_register(self._button_press_cb)
         self.button_handler.release_callback_register(self._button_up_cb)
-
-        self.key_short_effects_list = [CycleList()] * 4
-        self.key_long_effects_list = [CycleList()] * 4
-        self.key_down_effects_list = [CycleList()] * 4
-        self.key_up_effects_list = [CycleList()] * 4
-        self.adc_equal_effects_list = [CycleList()] * 6
-        self.adc_above_effects_list = [CycleList()] * 6
-        self.adc_below_effects_list = [CycleList()] * 6
-        # 6 ADC control lever channels: items:"equal", "above", "below"
-        self.analog_cmp_mid = ["equal"] * 6
-
-        self.adv_ctrl_elapsed_time = [0] * 6
-        self.adv_ctrl_last_tar_speed = [0] * 6
-        self.adv_last_rc_data = [0] * 6
-        self.adv_cur_rc_data = [2048] * 6
-        self.cycle_time = 0.02
-        self.updata_tar_speed_threadhold = 200
+        self.button_handler.double_callback_register(self._button_double_cb)
+        self.button_handler.chord_callback_register(self._chord_cb)
+
+        # Effect groups, EFFECT_NONE when an event has no effect
+        self.effect_store = EffectStore()
+        self.key_effect_groups = array('h', [EFFECT_NONE] *
+                                       (4 * len(KEY_EVENTS)))
+        self.adc_effect_groups = array('h', [EFFECT_NONE] *
+                                       (6 * len(ANALOG_EVENTS)))
+        # Rising and falling group of each threshold, interleaved
+        self.adc_zone_effect_groups = [array('h') for _ in range(6)]
+        self.chord_effect_groups = array('h')
+        self.mixer = Mixer()
 
         self.en_simulation_time = 0
         self.motors_simulation_speed = [0] * 2
         self.servo_simulation_data = [0] * 4
 
         self.board_key = Pin(9, Pin.IN)
+        self.board_key_held = False
 
     def update_setting(self, setting):
         self.setting = setting
+        self._force_frame = True
         self._update_advanced_config()
 
         recv_info = self.setting.get(f"receiver_{self.receiver_index}", {})
+        self.recv_info = recv_info
         if recv_info is {}:
             return
 
@@ -572,19 +1628,30 @@ class BBL_Controller:
             pwm_info = None
             pwms_info = recv_info.get("pwm", [[], [], [], []])
             pwm_info = pwms_info[i]
+            if len(pwm_info) > 10:
+                self.servos.set_refresh_rate(i+1, pwm_info[10])
+                self.servos.set_calibration(i+1, pwm_info[7], pwm_info[8],
+                                            pwm_info[9])
             if len(pwm_info) > 1:
                 self.servos.reset_info(i+1, pwm_info[0])
                 self.servos.set_angle_step(i+1, pwm_info[1])
+                if len(pwm_info) > 6:
+                    self.servos.set_motion_profile(i+1, pwm_info[5],
+                                                   pwm_info[6])
 
         try:
             for i in range(2):
-                offset, min_val, max_val = recv_info.get("motor", [])[i]
+                offset, min_val, max_val = recv_info.get("motor", [])[i][:3]
                 self.motors.set_forward_rate(i+1, max_val)
                 self.motors.set_reverse_rate(i+1, min_val)
                 self.motors.set_offset(i+1, offset)
+                if len(recv_info["motor"][i]) > 3:
+                    self.motors.set_modulation(i+1, recv_info["motor"][i][3])
         except (Exception) as e:
             logger.warn(f"[CTRL]UPDATA MOTORS PARAM: {e}")
 
+        self.mixer.load(self.setting.get("sender", {}), recv_info)
+
         for i in range(6):
             self.adc_mid_list[i] = self.setting.get("sender", {}).get(
                 "mid_values", []
@@ -595,6 +1662,67 @@ class BBL_Controller:
             )[i] if "sender" in self.setting and "deadzones" in self.setting[
                 "sender"] else self.adc_deadzone_list[i]
 
+        sender = self.setting.get("sender", {})
+        hysteresis = sender.get("hysteresis", [])
+        dwell = sender.get("dwell", [])
+        for i in range(len(hysteresis)):
+            self.analog_detector.set_hysteresis(i, hysteresis[i])
+        for i in range(len(dwell)):
+            self.analog_detector.set_dwell(i, dwell[i])
+        mode = sender.get("auto_calibrate", "off")
+        self.calibrator.set_mode(CAL_MODE_NAMES.index(mode)
+                                 if mode in CAL_MODE_NAMES else CAL_OFF)
+        for i in range(6):
+            self.calibrator.set_config(i, self.adc_mid_list[i],
+                                       self.adc_deadzone_list[i])
+
+        filters = sender.get("filters", [])
+        for i in range(len(filters)):
+            name, param = filters[i]
+            kind = FILTER_NAMES.index(name) if name in FILTER_NAMES \
+                else FILTER_NONE
+            self.input_filter.set_filter(i, kind, param)
+
+        self._build_effect_store(sender)
+
+    def _build_effect_store(self, sender):
+        store = self.effect_store
+        store.clear()
+
+        for i in range(4):
+            key = sender.get(f"key{i + 1}", None)
+            for j in range(len(KEY_EVENTS)):
+                effects = key.get(KEY_EVENTS[j], []) if key else []
+                self.key_effect_groups[i * len(KEY_EVENTS) + j] = \
+                    store.add_group(effects)
+
+        double_mask = 0
+        for i in range(4):
+            if self.key_effect_groups[i * len(KEY_EVENTS) +
+                                      KEY_DOUBLE] != EFFECT_NONE:
+                double_mask |= 1 << i
+        self.button_handler.set_double_mask(double_mask)
+
+        for i in range(6):
+            adc_ch = sender.get(f"adc_ch{i + 1}", None)
+            for j in range(len(ANALOG_EVENTS)):
+                effects = adc_ch.get(ANALOG_EVENTS[j], []) if adc_ch else []
+                self.adc_effect_groups[i * len(ANALOG_EVENTS) + j] = \
+                    store.add_group(effects)
+
+            zones = adc_ch.get("zones", []) if adc_ch else []
+            self.zone_detector.set_thresholds(i, [zone[0] for zone in zones])
+            groups = array('h', [EFFECT_NONE] * (2 * len(zones)))
+            for j in range(len(zones)):
+                groups[2 * j] = store.add_group(zones[j][1])
+                groups[2 * j + 1] = store.add_group(zones[j][2])
+            self.adc_zone_effect_groups[i] = groups
+
+        chords = sender.get("chords", [])
+        self.button_handler.set_chords([chord[0] for chord in chords])
+        self.chord_effect_groups = array(
+            'h', [store.add_group(chord[1]) for chord in chords])
+
     def set_slaver_idx(self, idx):
         self.receiver_index = idx
 
@@ -603,23 +1731,22 @@ class BBL_Controller:
         self.timer0.init(period=1,
                          mode=Timer.PERIODIC,
                          callback=self.timer0_callback)
-        self.tim0_div_cnt = 0
 
     def adc_value_deal(self, x, max=4096, mid=2048, dz=200):
-
-        def convert(x, i_min, i_max, o_min, o_max):
-            return (x - i_min) * (o_max - o_min) / (i_max - i_min) + o_min
-
+        # Map [0, mid - dz] to [-max / 2, 0] and [mid + dz, max] to
+        # [0, max / 2], all in integers
         if mid - dz <= x <= mid + dz:
             return 0
 
-        m_mid = max / 2
+        m_mid = max >> 1
 
         if x <= mid:
-            x = convert(x, 0, mid - dz, -m_mid, 0)
-        elif x > mid:
-            x = convert(x, mid + dz, max, 0, m_mid)
-        return x
+            if mid - dz <= 0:
+                return -m_mid
+            return div_round(x * m_mid, mid - dz) - m_mid
+        if max - mid - dz <= 0:
+            return m_mid
+        return div_round((x - mid - dz) * m_mid, max - mid - dz)
 
     def _handle_effect(self, effect, setting, mode="normal", recv=None):
         logger.info(f"[CTRL][{mode.upper()}]EFFECT: {effect}")
@@ -630,25 +1757,32 @@ class BBL_Controller:
             logger.error(f"[CTRL][{mode.upper()}] Type error, need int")
             return
 
-        event_dic = self.parser.parse_event_id(effect)
-        effect_actor_idx = event_dic["actuator"]
-        effect_actor_val = event_dic["value"]
+        if setting is self.setting and recv_idx == self.receiver_index:
+            recv_info = self.recv_info
+        else:
+            recv_info = setting.get(f"receiver_{recv_idx}", {})
+
+        effect_actor_idx = effect % self.id_multiplier
+        effect_actor_val = effect // self.id_multiplier
 
         # MOTORS
-        if effect_actor_idx in [Devices.MOTOR_1, Devices.MOTOR_2]:
+        if Devices.MOTOR_1 <= effect_actor_idx <= Devices.MOTOR_2:
             motor_idx = effect_actor_idx
             effect_value = effect_actor_val
             if mode == "simulation":
-                self.motors_simulation_speed[motor_idx - 1] = 2047 * effect_value / 100
-                self._en_simulation_loop('MOTOR', True)
+                self.motors_simulation_speed[motor_idx - 1] = div_round(
+                    2047 * effect_value, 100)
+                self._en_simulation_loop(self.motor_dev, True)
             else:
-                self.motors_effect_speed_list[motor_idx - 1] = 2047 * effect_value / 100
+                self.motors_effect_speed_list[motor_idx - 1] = div_round(
+                    2047 * effect_value, 100)
+                self._force_frame = True
 
         # LEDS
-        elif effect_actor_idx in [Devices.LED_1, Devices.LED_2]:
+        elif Devices.LED_1 <= effect_actor_idx <= Devices.LED_2:
             number = effect_actor_idx - 2
             effect_value = effect_actor_val
-            led_events = setting[f"receiver_{recv_idx}"].get(f"led{number}", [])
+            led_events = recv_info.get(LED_KEYS[number - 1], [])
 
             for effect, sequence_number, mode, rgb_value, repeat_times, time in led_events:
                 if effect == effect_value:
@@ -658,10 +1792,10 @@ class BBL_Controller:
         # SERVOS
         elif Devices.PWM_1 <= effect_actor_idx <= Devices.PWM_4:
             pwm_idx = effect_actor_idx - 4
-            pwm_config = setting.get(f"receiver_{recv_idx}", {}).get("pwm", [])
+            pwm_config = recv_info.get("pwm", [])
 
             if pwm_idx - 1 < len(pwm_config):
-                bias, vel, min_value, max_value, pwm_type = pwm_config[pwm_idx - 1]
+                bias, vel, min_value, max_value, pwm_type = pwm_config[pwm_idx - 1][:5]
             else:
                 raise IndexError(f"pwm_idx {pwm_idx} is out of range for receiver_{recv_idx}.")
 
@@ -673,9 +1807,10 @@ class BBL_Controller:
 
             if mode == "simulation":
                 self.servo_simulation_data[pwm_idx - 1] = effect_value
-                self._en_simulation_loop('SERVO', True)
+                self._en_simulation_loop(self.servo_dev, True)
             else:
                 self.servos_effect_data_list[pwm_idx - 1] = effect_value
+                self._force_frame = True
 
         # BUZZERS
         elif effect_actor_idx in [Devices.BUZZER_1, Devices.BUZZER_2]:
@@ -686,77 +1821,58 @@ class BBL_Controller:
         elif effect_actor_idx == Devices.CODE_EXEC:
             self._code_effect_trig(effect_actor_val, setting)
 
-    def analog_effect_cb(self, index, effect_type):
-        try:
-            effects = self.setting["sender"][f"adc_ch{index + 1}"][effect_type]
-            if effects:
-                logger.info(f"[CTRL]ANALOG_CH:{index} {effect_type}:{effects}")
-        except Exception:
-            return
-
-        effect_list_map = {
-            "equal_mid": self.adc_equal_effects_list,
-            "above_mid": self.adc_above_effects_list,
-            "below_mid": self.adc_below_effects_list
-        }
-
-        effect_list = effect_list_map.get(effect_type)
-        if not effect_list:
-            return
-
-        for effects_index, effect_arr in enumerate(effects):
-            org_effect = effect_list[index].get_items(effects_index)
-            if org_effect != effect_arr:
-                effect_list[index].set_items(effects_index, effect_arr)
-            effect = effect_list[index].get_next_item(effects_index)
-            self._handle_effect(effect, self.setting)
+    def _trigger_effects(self, group):
+        store = self.effect_store
+        start = store.group_start[group]
+        for slot in range(start, start + store.group_len[group]):
+            self._handle_effect(store.next_effect(slot), self.setting)
 
-    def _analog_equal_mid_cb(self, index):
-        self.analog_effect_cb(index, "equal_mid")
-
-    def _analog_above_mid_cb(self, index):
-        self.analog_effect_cb(index, "above_mid")
-
-    def _analog_below_mid_cb(self, index):
-        self.analog_effect_cb(index, "below_mid")
+    def analog_effect_cb(self, index, effect_type):
+        group = self.adc_effect_groups[index * len(ANALOG_EVENTS) +
+                                       effect_type]
+        if group != EFFECT_NONE:
+            logger.info(f"[CTRL]ANALOG_CH:{index} {ANALOG_EVENTS[effect_type]}")
+            self._trigger_effects(group)
+
+    def _analog_zone_cb(self, index):
+        last_zone = self.zone_detector.last_zone[index]
+        zone = self.zone_detector.zone[index]
+        # Rising fires the highest threshold passed, falling the lowest one
+        if zone > last_zone:
+            group = self.adc_zone_effect_groups[index][2 * (zone - 1)]
+        else:
+            group = self.adc_zone_effect_groups[index][2 * zone + 1]
+        if group != EFFECT_NONE:
+            logger.info(f"[CTRL]ANALOG_CH:{index} ZONE:{last_zone}->{zone}")
+            self._trigger_effects(group)
 
     def _button_effect_cb(self, btn_idx, effect_type):
-        try:
-            effects = self.setting["sender"][f"key{btn_idx + 1}"][effect_type]
-            if effects:
-                logger.info(f"[CTRL]BTN:{btn_idx} {effect_type}:{effects}")
-        except Exception:
-            return
-
-        effect_list_map = {
-            "long": self.key_long_effects_list,
-            "short": self.key_short_effects_list,
-            "down": self.key_down_effects_list,
-            "release": self.key_up_effects_list
-        }
-
-        effect_list = effect_list_map.get(effect_type)
-        if not effect_list:
-            return
-
-        for effects_index, effect_arr in enumerate(effects):
-            org_effect = effect_list[btn_idx].get_items(effects_index)
-            if org_effect != effect_arr:
-                effect_list[btn_idx].set_items(effects_index, effect_arr)
-            effect = effect_list[btn_idx].get_next_item(effects_index)
-            self._handle_effect(effect, self.setting)
+        group = self.key_effect_groups[btn_idx * len(KEY_EVENTS) +
+                                       effect_type]
+        if group != EFFECT_NONE:
+            logger.info(f"[CTRL]BTN:{btn_idx} {KEY_EVENTS[effect_type]}")
+            self._trigger_effects(group)
 
     def _button_long_cb(self, btn_idx):
-        self._button_effect_cb(btn_idx, "long")
+        self._button_effect_cb(btn_idx, KEY_LONG)
 
     def _button_short_cb(self, btn_idx):
-        self._button_effect_cb(btn_idx, "short")
+        self._button_effect_cb(btn_idx, KEY_SHORT)
 
     def _button_press_cb(self, btn_idx):
-        self._button_effect_cb(btn_idx, "down")
+        self._button_effect_cb(btn_idx, KEY_DOWN)
 
     def _button_up_cb(self, btn_idx):
-        self._button_effect_cb(btn_idx, "release")
+        self._button_effect_cb(btn_idx, KEY_RELEASE)
+
+    def _button_double_cb(self, btn_idx):
+        self._button_effect_cb(btn_idx, KEY_DOUBLE)
+
+    def _chord_cb(self, chord_idx):
+        group = self.chord_effect_groups[chord_idx]
+        if group != EFFECT_NONE:
+            logger.info(f"[CTRL]CHORD:{chord_idx}")
+            self._trigger_effects(group)
 
     def _update_advanced_config(self):
         """
@@ -769,107 +1885,31 @@ class BBL_Controller:
             return
 
         for item in adv_config_list:
-            if len(item) != 6:
+            if len(item) < 6:
                 logger.error("[CTRL]Invalid item in config_list.")
                 return
 
             (num, en, tracker_accel, tracker_low_speed_zone_pctg,
-             tracker_high_speed_zone_pctg, high_speed_duration) = item
-            if en and (1 <= num <= 2):
+             tracker_high_speed_zone_pctg, high_speed_duration) = item[:6]
+            if not 1 <= num <= 2:
+                continue
+            if en:
                 self.tracker_accel_default_value[num - 1] = \
-                    tracker_accel
+                    int(tracker_accel * 1000)
                 self.tracker_low_speed_zone_pctg[num - 1] = \
-                    tracker_low_speed_zone_pctg
-                self.tracker_high_speed_zone_pctg[num - 1] = \
-                    tracker_high_speed_zone_pctg
-                self.high_speed_duration[num - 1] = \
-                    high_speed_duration
+                    int(tracker_low_speed_zone_pctg)
                 self.enable_advanced_motor_control[num - 1] = True
+                # The high speed zone is crossed in high_speed_duration
+                # seconds, speeds below it are reached at once
+                zone = 2048 * tracker_high_speed_zone_pctg // 100
+                accel = int(zone / high_speed_duration) \
+                    if zone > 0 and high_speed_duration > 0 else 0
+                decel_time = item[6] if len(item) > 6 else 0
+                decel = int(2048 / decel_time) if decel_time > 0 else 0
+                self.motors.set_slew(num, accel, decel, 2048 - zone)
             else:
-                if (num == 1):
-                    self.enable_advanced_motor_control[0] = False
-                elif (num == 2):
-                    self.enable_advanced_motor_control[1] = False
-
-    def motor_speed_calculate(self, rc_data, motor_index):
-        if self.setting is None or rc_data is None:
-            logger.warn("[CTRL]Settings or RC data cannot be None")
-            return 0
-
-        bias = self.motors.get_offset(motor_index)
-        min_value = self.motors.get_reverse_rate(motor_index)
-        max_value = self.motors.get_forward_rate(motor_index)
-
-        bias = bias * 2048 / 100
-        motors_control = self.setting["sender"].get(f"m{motor_index}", [])
-
-        if motors_control is [] or not isinstance(motors_control, list):
-            return 0
-
-        rc_value = 0
-        for channel, direction in motors_control:
-            # advance control (hign zone)
-            if self.enable_advanced_motor_control[motor_index - 1] is True:
-                if abs(rc_data[channel]) <= abs(
-                        self.adv_last_rc_data[channel]):
-                    lite_rc_data = rc_data[channel]
-                else:
-                    lite_rc_data = self.adv_last_rc_data[channel]
-                self.adv_cur_rc_data[channel], \
-                    self.adv_ctrl_last_tar_speed[channel], \
-                    self.adv_ctrl_elapsed_time[channel] = \
-                    self.high_speed_zone_map_handler(
-                        motor_index - 1,
-                        self.adv_cur_rc_data[channel],
-                        lite_rc_data,
-                        self.adv_ctrl_last_tar_speed[channel],
-                        self.adv_ctrl_elapsed_time[channel],
-                        True)
-
-                self.adv_last_rc_data[channel] = rc_data[channel]
-                rc_value += self.adv_cur_rc_data[channel] * direction
-            else:
-                rc_value += rc_data[channel] * direction
-
-        if (rc_value + bias >= 0):
-            motor_speed = (int)((rc_value + bias) * max_value / 100)
-            motor_speed = self.get_valid_value(motor_speed, -2047, 2047)
-            return int(abs(motor_speed))
-        else:
-            motor_speed = (int)((rc_value + bias) * min_value / 100)
-            motor_speed = self.get_valid_value(motor_speed, -2047, 2047)
-            return int(-abs(motor_speed))
-
-    def _servo_handler(self, rc_data, pwm_index):
-        bias, speed, min_value, max_value, pwm_type = self.setting[
-            f"receiver_{self.receiver_index}"]["pwm"][pwm_index - 1]
-
-        # bias = bias * 2048 / 100
-
-        pwm_control = self.setting["sender"][f"p{pwm_index}"]
-
-        if pwm_control == []:  # is angle servo
-            return self.servos_effect_data_list[pwm_index - 1]
-        if rc_data is None or self.setting is None:  # is speed servo
-            return 0
-
-        rc_value = 0
-        for channel, direction in pwm_control:
-            rc_value += rc_data[channel] * direction
-
-        if pwm_type == "speed":
-            if rc_value <= 0:
-                rc_value = rc_value * min_value / 2048
-            else:
-                rc_value = rc_value * max_value / 2048
-            rc_value = self.get_valid_value(rc_value, -100, 100)
-            rc_value = (round(rc_value)) * 10 + 0
-        elif pwm_type == "angle":
-            rc_value = (rc_value * (max_value - min_value) /
-                        4096) + (max_value + min_value) / 2
-            rc_value = self.get_valid_value(rc_value, 0, 180)
-            rc_value = (round(rc_value)) * 10 + 1
-        return int(rc_value)
+                self.enable_advanced_motor_control[num - 1] = False
+                self.motors.set_slew(num)
 
     def _buzzer_effect_trig(self, buzzer_idx, song_idx, setting):
         if not 1 <= buzzer_idx < 3:
@@ -898,107 +1938,200 @@ class BBL_Controller:
                 self.executor.run(cmd)
                 return
 
+    def _calibration_cb(self, changed):
+        calibrator = self.calibrator
+        for ch_idx in range(6):
+            if changed & (1 << ch_idx) == 0:
+                continue
+            mid = calibrator.mid[ch_idx]
+            dz = calibrator.deadzone[ch_idx]
+            logger.info(f"[CTRL]CALIB CH{ch_idx + 1}: MID {mid} DZ {dz}")
+            if calibrator.mode == CAL_APPLY:
+                self.adc_mid_list[ch_idx] = mid
+                self.adc_deadzone_list[ch_idx] = dz
+                self._force_frame = True
+
+    def _analog_cross_events(self, changed):
+        for ch_idx in range(6):
+            if changed & (3 << (ch_idx << 1)):
+                # ANALOG_EVENTS follows the order of the detector states
+                self.analog_effect_cb(
+                    ch_idx, self.analog_detector.get_state(ch_idx))
+
     def handler(self, setting, index, remote_data):
         if index == 0:
             logger.error(f"[CTRL]KeyError: receiver_{index}")
             return
-        self.receiver_index = index
-
-        if setting == {} or (not isinstance(setting, dict)):
+        if not setting or (not isinstance(setting, dict)):
             return
+        self._outputs_stopped = False
 
-        if setting != self.setting:
+        # The parser hands over a new dict on every config load
+        if setting is not self.setting or index != self.receiver_index:
+            self.receiver_index = index
             self.update_setting(setting)
 
+        # Work on a copy, the caller's frame stays raw
+        frame = self.frame
+        frame[:] = remote_data
+
+        # Filtered values are compared, so a settling filter keeps running
+        self.input_filter.update(frame)
+        if self.calibrator.mode != CAL_OFF:
+            changed = self.calibrator.update(frame)
+            if changed != 0:
+                self._calibration_cb(changed)
+
+        current = self.dev_manager.current
+        perm = current[self.motor_dev] << 8 | current[self.servo_dev]
+        if not self._force_frame and perm == self.last_perm and \
+                frame == self.last_raw:
+            # The outputs hold their last command, only timers can fire
+            if self.analog_detector.pending_mask != 0:
+                changed = self.analog_detector.update(self.last_norm)
+                if changed != 0:
+                    self._analog_cross_events(changed)
+            self.button_handler.check_buttons(frame, 6)
+            return
+        self._force_frame = False
+        self.last_perm = perm
+        self.last_raw[:] = frame
+
         for i in range(6):
-            remote_data[i] = self.adc_value_deal(
-                remote_data[i],
+            frame[i] = self.adc_value_deal(
+                frame[i],
                 4096,
                 self.adc_mid_list[i],
                 self.adc_deadzone_list[i]
             )
+            self.last_norm[i] = frame[i]
 
         # Trigger median event
-        for ch_idx in range(6):
-            if remote_data[ch_idx] == 0 and self.analog_cmp_mid[
-                    ch_idx] != "equal":
-                self._analog_equal_mid_cb(ch_idx)
-                self.analog_cmp_mid[ch_idx] = "equal"
-            elif remote_data[ch_idx] < 0 and self.analog_cmp_mid[
-                    ch_idx] != "below":
-                self._analog_below_mid_cb(ch_idx)
-                self.analog_cmp_mid[ch_idx] = "below"
-            elif remote_data[ch_idx] > 0 and self.analog_cmp_mid[
-                    ch_idx] != "above":
-                self._analog_above_mid_cb(ch_idx)
-                self.analog_cmp_mid[ch_idx] = "above"
-
-        if self.dev_manager.request_permission('MOTOR', 'BEHAVIOR'):
+        changed = self.analog_detector.update(frame)
+        if changed != 0:
+            self._analog_cross_events(changed)
+
+        # Trigger threshold events
+        changed = self.zone_detector.update(frame)
+        if changed != 0:
+            for ch_idx in range(6):
+                if changed & (1 << ch_idx):
+                    self._analog_zone_cb(ch_idx)
+
+        mixer = self.mixer
+        mixed = mixer.evaluate(frame)
+
+        if self.dev_manager.request(self.motor_dev, self.perm_behavior):
             for motor_idx in range(1, 3):
-                res_speed = 0
-                if self.setting["sender"][f"m{motor_idx}"] == []:
-                    # If it is not for behavioral control
-                    res_speed = self.motors_effect_speed_list[motor_idx - 1]
-                else:
+                if mixed & (1 << (motor_idx - 1)):
                     # If it's behavioral control
-                    _speed = self.motor_speed_calculate(remote_data, motor_idx)
+                    res_speed = mixer.out[motor_idx - 1]
                     if self.enable_advanced_motor_control[motor_idx-1] is True:
                         res_speed = self.nonlinear_map(
-                            _speed, 0,
-                            self.tracker_low_speed_zone_pctg[motor_idx-1]/100,
+                            res_speed, 0,
+                            self.tracker_low_speed_zone_pctg[motor_idx-1],
                             self.tracker_accel_default_value[motor_idx-1])
-                    else:
-                        res_speed = _speed
-                self.motors.set_speed(motor_idx, res_speed)
+                else:
+                    # If it is not for behavioral control
+                    res_speed = self.motors_effect_speed_list[motor_idx - 1]
+                self.mailbox.post_motor(motor_idx, CMD_SPEED, res_speed,
+                                        PRIO_BEHAVIOR)
 
-        if self.dev_manager.request_permission('SERVO', 'BEHAVIOR'):
+        if self.dev_manager.request(self.servo_dev, self.perm_behavior):
             for i in range(1, 5):
-                effect = self._servo_handler(remote_data, i)
+                if mixed & (1 << (i + 1)):
+                    if mixer.kind[i + 1] == MIX_OUT_ANGLE:
+                        self.mailbox.post_servo(i, CMD_STEP, mixer.out[i + 1],
+                                                PRIO_BEHAVIOR)
+                    else:
+                        self.mailbox.post_servo(i, CMD_SPEED,
+                                                mixer.out[i + 1],
+                                                PRIO_BEHAVIOR)
+                    continue
+                effect = self.servos_effect_data_list[i - 1]
                 is_angle_servo = effect % 10
                 if is_angle_servo == 1:
-                    self.servos.set_angle_stepping(i, (int)(effect / 10))
+                    self.mailbox.post_servo(i, CMD_STEP, effect // 10,
+                                            PRIO_BEHAVIOR)
                 elif is_angle_servo == 0:
-                    self.servos.set_speed(i, (int)(effect / 10))
+                    self.mailbox.post_servo(i, CMD_SPEED, effect // 10,
+                                            PRIO_BEHAVIOR)
 
-        self.button_handler.check_buttons(remote_data[6:])
+        self.button_handler.check_buttons(frame, 6)
 
     def stop(self, permission=None):
+        self._force_frame = True
         if permission is None:
             self.servos_effect_data_list = [0] * 4
             self.motors_effect_speed_list = [0] * 2
 
+            self.mailbox.clear()
             for i in range(1, 3):
                 self.motors.stop(i)
             for i in range(1, 5):
                 self.servos.stop(i)
             return
 
-        if self.dev_manager.request_permission('MOTOR', permission):
-            speed_map = {
-                'BEHAVIOR': self.motors_effect_speed_list,
-                'EVENT': self.motors_simulation_speed
-            }
+        perm_id = self.dev_manager.permissions.get(permission,
+                                                   PERMISSION_NONE)
+        if self.dev_manager.request(self.motor_dev, perm_id):
+            if perm_id == self.perm_behavior:
+                speed_list = self.motors_effect_speed_list
+            else:
+                speed_list = self.motors_simulation_speed
+            prio = PRIO_BEHAVIOR if perm_id == self.perm_behavior \
+                else PRIO_EVENT
             for i in range(1, 3):
-                speed_map[permission][i-1] = 0
-                self.motors.stop(i)
+                speed_list[i-1] = 0
+                self.mailbox.post_motor(i, CMD_STOP, 0, prio)
 
-        if self.dev_manager.request_permission('SERVO', permission):
-            speed_map = {
-                'BEHAVIOR': self.servos_effect_data_list,
-                'EVENT': self.servo_simulation_data
-            }
+        if self.dev_manager.request(self.servo_dev, perm_id):
+            if perm_id == self.perm_behavior:
+                speed_list = self.servos_effect_data_list
+            else:
+                speed_list = self.servo_simulation_data
+            prio = PRIO_BEHAVIOR if perm_id == self.perm_behavior \
+                else PRIO_EVENT
             for i in range(1, 5):
-                speed_map[permission][i-1] = 0
-                self.servos.stop(i)
+                speed_list[i-1] = 0
+                self.mailbox.post_servo(i, CMD_STOP, 0, prio)
+
+    def is_busy(self):
+        """
+        Checks whether a source other than the remote drives an output or
+        a user script is running.
+
+        Returns:
+            bool: True while simulation or a script is active.
+        """
+        current = self.dev_manager.current
+        return current[self.motor_dev] != self.perm_behavior or \
+            current[self.servo_dev] != self.perm_behavior or \
+            self.executor.get_status() == "RUNNING"
+
+    def link_down(self):
+        """
+        Stops the remote controlled outputs while no frames arrive. Only the
+        first call stops them, until the remote or another source drives
+        an output again.
+        """
+        if self._outputs_stopped:
+            return
+        self.stop('BEHAVIOR')
+        self._outputs_stopped = True
 
     def reinit(self, permission=None):
         self.stop(permission)
 
         self.setting = {}
+        self.recv_info = {}
         self.servos_effect_data_list = [0] * 4
         self.motors_effect_speed_list = [0] * 2
         self.servo_simulation_data = [0] * 4
         self.motors_simulation_speed = [0] * 2
+        self.input_filter.reset()
+        # The sticks are reported from the centre again under the new setting
+        self.analog_detector.reset()
 
         for dev in self.d_ch_map:
             if dev is not None:
@@ -1017,52 +2150,7 @@ class BBL_Controller:
             if dev is not None:
                 dev.timing_proc()
 
-        if self.tim0_div_cnt == 0:
-            self.servos.timing_proc()
-
-        self.tim0_div_cnt = (self.tim0_div_cnt + 1) % 10
-
-    def _high_speed_map(self,
-                        current_speed,
-                        target_speed,
-                        elapsed_time,
-                        total_time=2.0,
-                        cycle_time=0.02):
-
-        def limit_value(value):
-            HIGHT_ZONE_MIN_SPEED = 800
-            if value < -HIGHT_ZONE_MIN_SPEED or value > HIGHT_ZONE_MIN_SPEED:
-                return value
-            elif value < 0:
-                return -HIGHT_ZONE_MIN_SPEED
-            else:
-                return HIGHT_ZONE_MIN_SPEED
-
-        remaining_time = total_time - elapsed_time  # Calculate remaining time
-
-        c_speed = abs(current_speed)
-        t_speed = abs(target_speed)
-
-        # If the remaining time is less than the cycle time
-        # set it directly as the target speed
-        if remaining_time < cycle_time:
-            return target_speed
-
-        if t_speed <= c_speed:
-            return target_speed
-
-        # Calculate the rate of change in speed
-        speed_change_rate = (t_speed - c_speed) / remaining_time
-
-        # Calculate the speed change within the current cycle
-        speed_change_this_cycle = speed_change_rate * cycle_time
-
-        # Calculate new speed
-        new_speed = c_speed + speed_change_this_cycle
-
-        new_speed = limit_value(new_speed)
-
-        return new_speed if target_speed >= 0 else -new_speed
+        self.servos.timing_proc()
 
     def _low_speed_map(self, value, start, end, rate):
         # Ensure that the input value is within the specified range
@@ -1071,41 +2159,29 @@ class BBL_Controller:
         elif value >= end:
             return 2047
 
-        mapped_value = rate * ((value - start)**2) / (2 * (end - start))
-        # mapped_value = rate * math.log(value - start) * (end - start)
-        return int(mapped_value)
-
-    def high_speed_zone_map_handler(self,
-                                    motor_idx,
-                                    current_speed,
-                                    target_speed,
-                                    last_tar_speed,
-                                    elapsed_time,
-                                    en):
-        if en is True:
-            if abs(
-                    last_tar_speed - target_speed
-            ) > self.updata_tar_speed_threadhold or elapsed_time > \
-                    self.high_speed_duration[motor_idx]:
-                elapsed_time = 0
-            if (abs(target_speed) > 2048 * (
-                    1 - self.tracker_high_speed_zone_pctg[motor_idx] / 100)):
-                current_speed = self._high_speed_map(
-                    current_speed, target_speed, elapsed_time,
-                    self.high_speed_duration[motor_idx], self.cycle_time)
-            else:
-                current_speed = target_speed
-        else:
-            current_speed = target_speed
-        last_tar_speed = target_speed
-        elapsed_time += self.cycle_time
-        return current_speed, last_tar_speed, elapsed_time
+        # rate / 1000 * (value - start)^2 / (2 * (end - start)), divided
+        # before scaling by the rate to stay within small integers
+        d = value - start
+        return d * d // (end - start) * rate // 2000
 
     def nonlinear_map(self,
                       set_speed,
                       dead_zone=500,
-                      low_speed_percentage=0.5,
-                      linear_rate=1.5):
+                      low_speed_percentage=50,
+                      linear_rate=1500):
+        """
+        Shapes a motor speed with a quadratic low speed zone.
+
+        Args:
+            set_speed (int): Speed in the range -2047 to 2047.
+            dead_zone (int): Speeds below this give 0.
+            low_speed_percentage (int): Size of the quadratic zone in \
+                percent of the range above the dead zone.
+            linear_rate (int): Slope in 1/1000 units.
+
+        Returns:
+            int: The shaped speed.
+        """
         THRESHOLD = 2047
         speed = abs(set_speed)
         # 死区内输出为0
@@ -1116,58 +2192,64 @@ class BBL_Controller:
 
         # 计算低速阶段的阈值
         low_speed_threshold = dead_zone + (
-            2048 - 2 * dead_zone) * low_speed_percentage
+            2048 - 2 * dead_zone) * low_speed_percentage // 100
 
         tracker_speed = self._low_speed_map(
             min(speed, low_speed_threshold - 1), dead_zone,
             low_speed_threshold, linear_rate)
         if speed >= low_speed_threshold:  # 中高速段
-            tracker_speed = tracker_speed + (speed -
-                                             low_speed_threshold) * linear_rate
+            tracker_speed = tracker_speed + (
+                speed - low_speed_threshold) * linear_rate // 1000
 
         tracker_speed = min(tracker_speed, THRESHOLD)
-        return int(tracker_speed if set_speed >= 0 else -tracker_speed)
+        return tracker_speed if set_speed >= 0 else -tracker_speed
 
     def _executor_final_cb(self):
-        self.dev_manager.set_device_permission('MOTOR', 'BEHAVIOR')
-        self.dev_manager.set_device_permission('SERVO', 'BEHAVIOR')
+        # The next script has to take the devices over again
+        self.servos_mapper._has_permission = False
+        self.motors_mapper._has_permission = False
+        self.dev_manager.set_level(self.motor_dev, self.perm_behavior)
+        self.dev_manager.set_level(self.servo_dev, self.perm_behavior)
 
     def simulation_effect_handle(self):
         # motors
-        if self.dev_manager.request_permission('MOTOR', 'EVENT'):
+        if self.dev_manager.request(self.motor_dev, self.perm_event):
             press_duration = utime.ticks_ms() - self.en_simulation_time
             if press_duration >= 2000:
-                self._en_simulation_loop('MOTOR', False)
+                self._en_simulation_loop(self.motor_dev, False)
                 logger.info("[CTRL]Simulation Motor loop end")
                 return
             for index in range(1, 3):
                 res_speed = self.motors_simulation_speed[index - 1]
-                self.motors.set_speed(index, res_speed)
+                self.mailbox.post_motor(index, CMD_SPEED, res_speed,
+                                        PRIO_EVENT)
 
         # servos
-        if self.dev_manager.request_permission('SERVO', 'EVENT'):
+        if self.dev_manager.request(self.servo_dev, self.perm_event):
             press_duration = utime.ticks_ms() - self.en_simulation_time
             if press_duration >= 2000:
-                self._en_simulation_loop('SERVO', False)
+                self._en_simulation_loop(self.servo_dev, False)
                 logger.info("[CTRL]Simulation Servo loop end")
                 return
             for i in range(1, 5):
                 effect = self.servo_simulation_data[i - 1]
                 is_angle_servo = effect % 10
                 if is_angle_servo == 1:
-                    self.servos.set_angle(i, (int)(effect / 10))
+                    self.mailbox.post_servo(i, CMD_ANGLE, effect // 10,
+                                            PRIO_EVENT)
                 elif is_angle_servo == 0:
-                    self.servos.set_speed(i, (int)(effect / 10))
+                    self.mailbox.post_servo(i, CMD_SPEED, effect // 10,
+                                            PRIO_EVENT)
 
     def _en_simulation_loop(self, dev, en):
         self.en_simulation_time = utime.ticks_ms()
         if en is True:
-            self.dev_manager.set_device_permission(dev, 'EVENT')
+            self.dev_manager.set_level(dev, self.perm_event)
         if en is False:
-            self.dev_manager.set_device_permission(dev, 'BEHAVIOR')
-            if dev == 'SERVO':
+            self.dev_manager.set_level(dev, self.perm_behavior)
+            if dev == self.servo_dev:
                 self.servo_simulation_data = [0, 0, 0, 0]
-            elif dev == 'MOTOR':
+            elif dev == self.motor_dev:
                 self.motors_simulation_speed = [0, 0]
 
     def simulation_effect_set(self, recv_idx, setting, effect):
@@ -1178,8 +2260,23 @@ class BBL_Controller:
         logger.error("[CTRL]executor loop crash.")
 
     def board_key_handler(self):
+        # Hold PWM1 at 90 degrees while the board key is pressed
         if self.board_key.value() == 0:
-            while self.board_key.value() == 0:
-                self.servos.set_angle(1, 90)
-                utime.sleep(0.01)
-            self.servos.stop(1)
+            self.board_key_held = True
+            self.mailbox.post_servo(1, CMD_ANGLE, 90, PRIO_BOARD)
+        elif self.board_key_held is True:
+            self.board_key_held = False
+            self.mailbox.post_servo(1, CMD_STOP, 0, PRIO_BOARD)
+
+    def commit(self):
+        """
+        Pushes the actuator commands of this tick to the hardware.
+        """
+        mailbox = self.mailbox
+        for slot in range(MAILBOX_SLOT_NUM):
+            if mailbox.prio[slot] > PRIO_BEHAVIOR:
+                # Another source took an output, the remote must resend
+                self._force_frame = True
+                self._outputs_stopped = False
+                break
+        mailbox.commit()
@@ -15,6 +15,9 @@ PARSER_NONE = 0
 PARSER_RECEIVE1 = 1
 PARSER_RECEIVE2 = 2
 
+ANALOG_HYSTERESIS_DEFAULT = 40
+ANALOG_DWELL_DEFAULT = 40
+
 logger = ulogger.Logger()
 
 
@@ -66,6 +69,8 @@ class DataParser:
                 if key == "sender":
                     parsed_data[key] = self._parse_channels(
                         value["channels"])
+                    parsed_data[key]["auto_calibrate"] = value.get(
+                        "auto_calibrate", "off")
                     data[key] = None
                     gc.collect()
                 if key == "receiver_1" and self.data_type == PARSER_RECEIVE1:
@@ -120,7 +125,6 @@ class DataParser:
             else:
                 parsed_list.append(item)
             lst[i] = None
-            gc.collect()
         return parsed_list
 
     def _parse_channels(self, channels):
@@ -136,6 +140,9 @@ class DataParser:
         parsed_channels = {
             "deadzones": [],
             "mid_values": [],
+            "hysteresis": [],
+            "dwell": [],
+            "filters": [],
             "key1": [],
             "key2": [],
             "key3": [],
@@ -153,7 +160,10 @@ class DataParser:
             "adc_ch5": [],
             "adc_ch6": [],
             "buzzer1": [],
-            "buzzer2": []
+            "buzzer2": [],
+            "chords": [],
+            "mix": [0] * 36,
+            "expo": []
         }
         for i, item in enumerate(channels[:6]):
             adc_ch_str = "adc_ch" + str(i + 1)
@@ -161,19 +171,33 @@ class DataParser:
                 data = item.get("data", {})
                 parsed_channels["deadzones"].append(data.get("deadzone", 0))
                 parsed_channels["mid_values"].append(data.get("mid_value", 0))
+                parsed_channels["hysteresis"].append(
+                    data.get("hysteresis", ANALOG_HYSTERESIS_DEFAULT))
+                parsed_channels["dwell"].append(
+                    data.get("dwell", ANALOG_DWELL_DEFAULT))
+                parsed_channels["filters"].append(
+                    [data.get("filter", "none"), data.get("filter_value", 0)])
+                parsed_channels["expo"].append(data.get("expo", 0))
                 control_data = item.get("controls", [])
                 for control in control_data:
                     if control["receiver"] == self.data_type:
                         direction = 1 if control[
                             "direction"] == "positive" else -1
+                        # Mix row: MOTOR1, MOTOR2, PWM1 to PWM4
+                        out_idx = -1
                         if control["actuator"].startswith("MOTOR"):
                             parsed_channels["m" +
                                             control["actuator"][-1]].append(
                                                 [i, direction])
+                            out_idx = int(control["actuator"][-1]) - 1
                         if control["actuator"].startswith("PWM"):
                             parsed_channels["p" +
                                             control["actuator"][-1]].append(
                                                 [i, direction])
+                            out_idx = int(control["actuator"][-1]) + 1
+                        if 0 <= out_idx < 6:
+                            parsed_channels["mix"][out_idx * 6 + i] += \
+                                control.get("weight", 100) * direction
                 events = item.get("event", [])
                 equal_mid_arr = self._match_events(events, "eq_mid")
                 above_mid_arr = self._match_events(events, "gt_mid")
@@ -184,13 +208,19 @@ class DataParser:
                 parsed_channels[adc_ch_str] = {
                     "equal_mid": parsed_equal_mid,
                     "above_mid": parsed_above_mid,
-                    "below_mid": parsed_below_mid
+                    "below_mid": parsed_below_mid,
+                    "zones": self._parse_zones(events)
                 }
 
             else:
                 parsed_channels["deadzones"].append(0)
                 parsed_channels["mid_values"].append(0)
+                parsed_channels["hysteresis"].append(ANALOG_HYSTERESIS_DEFAULT)
+                parsed_channels["dwell"].append(ANALOG_DWELL_DEFAULT)
+                parsed_channels["filters"].append(["none", 0])
+                parsed_channels["expo"].append(0)
         index = 0
+        chord_events = {}
         for item in channels[6:]:
             index += 1
             key = "key" + str(index)
@@ -200,23 +230,38 @@ class DataParser:
                 short_press = self._match_events(events, "short")
                 press_down = self._match_events(events, "down")
                 release = self._match_events(events, "up")
+                double_click = self._match_events(events, "double")
                 parsed_long_press = self._parse_actuators(long_press)
                 parsed_short_press = self._parse_actuators(short_press)
                 parsed_press_down = self._parse_actuators(press_down)
                 parsed_release = self._parse_actuators(release)
+                parsed_double_click = self._parse_actuators(double_click)
                 parsed_channels[key] = {
                     "short": parsed_short_press,
                     "long": parsed_long_press,
                     "down": parsed_press_down,
-                    "release": parsed_release
+                    "release": parsed_release,
+                    "double": parsed_double_click
                 }
+                for event in self._match_events(events, "chord"):
+                    # A chord joins this key with the keys listed in "keys"
+                    mask = 1 << (index - 1)
+                    for other in event.get("keys", []):
+                        if 1 <= other <= 4:
+                            mask |= 1 << (other - 1)
+                    if mask & (mask - 1):
+                        chord_events.setdefault(mask, []).append(event)
             else:
                 parsed_channels[key] = {
                     "short": [],
                     "long": [],
                     "dowm": [],
-                    "release": []
+                    "release": [],
+                    "double": []
                 }
+        for mask, events in chord_events.items():
+            parsed_channels["chords"].append(
+                [mask, self._parse_actuators(events)])
         return parsed_channels
 
     def _parse_actuators(self, actuator_data):
@@ -276,10 +321,16 @@ class DataParser:
                 data.get("speed", 0),
                 data.get("min_value", 0),
                 data.get("max_value", 0),
-                data.get("type", "")
+                data.get("type", ""),
+                data.get("profile", "constant"),
+                data.get("accel", 0),
+                data.get("pulse_min", 500),
+                data.get("pulse_max", 2500),
+                data.get("pulse_center", 1500),
+                data.get("refresh_rate", 50)
             ]
         else:
-            pwm_data = [0, 0, 0, 0, ""]
+            pwm_data = [0, 0, 0, 0, "", "constant", 0, 500, 2500, 1500, 50]
         return pwm_data
 
     def _parse_motor(self, data, motor_idx):
@@ -289,7 +340,8 @@ class DataParser:
             motor_data = [
                 data.get("bias", 0),
                 data.get("min_value", 0),
-                data.get("max_value", 0)
+                data.get("max_value", 0),
+                data.get("modulation", "pwm")
             ]
             adv_cfg = data.get("advance_motor_config", {})
             advanced_config = [
@@ -298,11 +350,12 @@ class DataParser:
                 adv_cfg.get("ACC", 0),
                 adv_cfg.get("LVZ", 0),
                 adv_cfg.get("HVZ", 0),
-                adv_cfg.get("HVD", 1)
+                adv_cfg.get("HVD", 1),
+                adv_cfg.get("DEC", 0)
             ]
         else:
-            motor_data = [0, 0, 0]
-            advanced_config = [motor_idx, False, 0, 0, 0, 1]
+            motor_data = [0, 0, 0, "pwm"]
+            advanced_config = [motor_idx, False, 0, 0, 0, 1, 0]
 
         return motor_data, advanced_config
 
@@ -395,6 +448,32 @@ class DataParser:
         gc.collect()  # 解析完再次释放内存
         return extracted_data
 
+    def _parse_zones(self, events_list):
+        """
+        Parses the threshold events of an analog channel.
+
+        Args:
+            events_list (list): The events of the channel.
+
+        Returns:
+            list: [threshold, rising effects, falling effects] for each \
+                threshold, sorted by threshold. The thresholds are converted \
+                from percent to normalized units (-2048 to 2048).
+        """
+        zones = {}
+        for event in events_list:
+            zone_type = event.get("type", "")
+            if zone_type != "gt_thr" and zone_type != "lt_thr":
+                continue
+            threshold = int(event.get("threshold", 0) * 2048 / 100)
+            zone = zones.setdefault(threshold, [[], []])
+            zone[0 if zone_type == "gt_thr" else 1].append(event)
+
+        return [[threshold,
+                 self._parse_actuators(zones[threshold][0]),
+                 self._parse_actuators(zones[threshold][1])]
+                for threshold in sorted(zones)]
+
     def _match_events(self, events_list, type_str):
         """
         Finds events that match the given type.
@@ -35,6 +35,11 @@ async def master_init():
 
 
 conf_updata_flag = True
+# Light sleep between idle frames while the link is down. Only for boards
+# whose radio and 1ms timer keep running through machine.lightsleep().
+IDLE_LIGHTSLEEP = False
+# Period of the frame, latency and GC statistics in the debug log
+STATS_LOG_MS = 10000
 
 
 async def slave_init():
@@ -50,8 +55,12 @@ async def slave_init():
 
     from control import BBL_Controller
     from parser import DataParser
+    from runtime import GCPolicy, FrameScheduler, FrameInput, RatePolicy
     gc.collect()
 
+    gc_policy = GCPolicy()
+    # Shared by the control and simulation tasks
+    rate_policy = RatePolicy()
     data_parser = DataParser()
     bbl_controller = BBL_Controller()
 
@@ -71,8 +80,14 @@ async def slave_init():
         global conf_updata_flag
         setting = None
         rc_index = 0
+        scheduler = FrameScheduler(20)
+        frame_input = FrameInput(rc_module.rc_slave_data)
+        woken = False
+        stats_tick = time.ticks_ms()
 
         while True:
+            scheduler.start()
+            link_up = False
             try:
                 if conf_updata_flag is True:
                     # Free memory before load file.
@@ -80,27 +95,29 @@ async def slave_init():
                     bbl_controller.reinit()
                     rc_conf = None
                     setting = None
-                    gc.collect()
+                    gc_policy.collect()
 
                     try:
                         with open('rc_config', 'r') as f:
                             rc_conf = ujson.load(f)
-                            gc.collect()
                     except Exception as e:
                         logger.warn(f"[MAIN]CFG LOAD ERR:{e}.")
-                    gc.collect()
+                    gc_policy.collect()
 
                     rc_index = rc_module.rc_index()
                     data_parser.set_slave_idx(rc_index)
                     if rc_conf is not None:
                         setting = data_parser.parse(rc_conf)
                     del rc_conf
-                    gc.collect()
+                    gc_policy.collect()
 
                     logger.info(f"[MAIN]PRASE UPDATE: {rc_index}")
                     bbl_controller.reinit()
 
-                rc_data = rc_module.rc_slave_data()
+                # Only a wake by new input has just read the receiver
+                if not woken:
+                    woken = frame_input.poll()
+                rc_data = frame_input.data
                 data_parser.set_slave_idx(rc_index)
 
                 if rc_index != rc_module.rc_index():
@@ -108,16 +125,39 @@ async def slave_init():
                     conf_updata_flag = True
                     continue
 
-                if rc_data and setting and rc_data != EMPTY_DATA:
+                link_up = bool(rc_data) and rc_data != EMPTY_DATA
+                if link_up and setting:
                     bbl_controller.handler(setting, rc_index, rc_data)
                 else:
-                    bbl_controller.stop('BEHAVIOR')
+                    bbl_controller.link_down()
             except Exception as e:
                 bbl_controller.reinit()
                 logger.error(f"[MAIN]CRTL TASK: {e}")
                 machine.reset()
             bbl_controller.board_key_handler()
-            await uasyncio.sleep(0.02)
+            bbl_controller.commit()
+            frame_input.applied()
+            scheduler.set_period(rate_policy.update(
+                woken, link_up, bbl_controller.is_busy()))
+            gc_policy.idle(scheduler.slack())
+            if time.ticks_diff(time.ticks_ms(), stats_tick) >= STATS_LOG_MS:
+                stats_tick = time.ticks_ms()
+                frames, overruns, _, max_ms = scheduler.get_stats()
+                _, count, avg_us, max_us = frame_input.get_stats()
+                gcs, _, max_pause_us, min_free = gc_policy.get_stats()
+                logger.debug(f"[MAIN]FRAMES:{frames} OVERRUN:{overruns} "
+                             f"MAX:{max_ms}ms INPUT:{count} "
+                             f"LAT:{avg_us}/{max_us}us GC:{gcs} "
+                             f"PAUSE:{max_pause_us}us FREE:{min_free}")
+                scheduler.reset_stats()
+                frame_input.reset_stats()
+                gc_policy.reset_stats()
+            # Nothing to poll for while the link is down, never idle while
+            # simulation or a script is busy
+            sleep_func = machine.lightsleep if IDLE_LIGHTSLEEP and \
+                not link_up and rate_policy.is_idle() else None
+            woken = await scheduler.wait(frame_input.poll,
+                                         rate_policy.poll_ms, sleep_func)
 
     async def simulation_task():
         while True:
@@ -133,14 +173,17 @@ async def slave_init():
                     value = data_parser.parse_simulation_value(sim_case)
                     idx = data_parser.parse_simulation_receiver(sim_case)
                     sim_case = None
-                    gc.collect()
+                    gc_policy.request()
                     bbl_controller.simulation_effect_set(idx, setting, value)
                 bbl_controller.simulation_effect_handle()
             except Exception as e:
                 bbl_controller.reinit()
                 logger.error(f"[MAIN]SIM TASK: {e}")
                 machine.reset()
-            await uasyncio.sleep(0.02)
+            # Polls at the frame rate, slower while idle. Its commands go
+            # out with the next control frame, which is at least at cruise
+            # rate while a simulation is running.
+            await uasyncio.sleep_ms(rate_policy.period_ms)
 
     await uasyncio.gather(control_task(),
                           period_task(),
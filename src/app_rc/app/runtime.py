@@ -0,0 +1,451 @@
+# -*-coding:utf-8-*-
+#
+# The CyberBrick Codebase License, see the file LICENSE for details.
+#
+# Copyright (c) 2025 MakerWorld
+#
+
+import gc
+import utime
+import uasyncio
+from array import array
+
+__all__ = ["GCPolicy", "FrameScheduler", "FrameInput", "RatePolicy"]
+
+GC_PAUSE_DEFAULT_US = 5000  # Assumed pause until one has been measured
+POLL_MS_DEFAULT = 4  # Input poll interval while waiting for a deadline
+RATE_FAST_MS = 10  # Frame period while the sticks move
+RATE_CRUISE_MS = 20
+RATE_IDLE_MS = 100  # Frame period without link or input changes
+RATE_IDLE_POLL_MS = 20
+ACTIVE_HOLD_MS = 500  # Time after the last input change spent fast
+IDLE_AFTER_MS = 5000  # Time after the last input change before idling
+
+
+class GCPolicy:
+    """
+    A class to keep garbage collections out of the control frame.
+
+    The automatic collection threshold is raised so the heap is not
+    collected at random points, and collect() is run from idle() in the
+    slack left after each control frame instead, when enough was allocated
+    since the last collection or when one was requested. Pause times and
+    the lowest free heap seen are recorded.
+
+    MicroPython collects the whole heap in one go, so idle() only starts a
+    collection when the slack is longer than the last measured pause.
+
+    Example:
+        >>> gc_policy = GCPolicy()
+        >>> # After each frame, with 12ms left before the next one
+        >>> gc_policy.idle(12)
+        >>> count, last_us, max_us, min_free = gc_policy.get_stats()
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(GCPolicy, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, collect_bytes=None):
+        """
+        Initializes the GCPolicy instance.
+
+        Args:
+            collect_bytes (int, optional): Bytes allocated since the last \
+                collection that make idle() collect, defaults to an eighth \
+                of the heap.
+        """
+        if hasattr(self, '_initialized') and self._initialized:
+            return
+        self._initialized = True
+
+        gc.collect()
+        heap = gc.mem_free() + gc.mem_alloc()
+        self.collect_bytes = collect_bytes if collect_bytes else heap >> 3
+        # Automatic collections only as a last resort
+        gc.threshold(heap >> 2)
+
+        self.pending = False
+        self.alloc_base = gc.mem_alloc()
+
+        self.count = 0
+        self.last_pause_us = 0
+        self.max_pause_us = 0
+        self.min_free = gc.mem_free()
+
+    def request(self):
+        """
+        Asks for a collection at the next idle slot.
+        """
+        self.pending = True
+
+    def collect(self):
+        """
+        Collects now and records the pause.
+
+        Returns:
+            int: The pause in microseconds.
+        """
+        free = gc.mem_free()
+        if free < self.min_free:
+            self.min_free = free
+
+        start = utime.ticks_us()
+        gc.collect()
+        pause = utime.ticks_diff(utime.ticks_us(), start)
+
+        self.pending = False
+        self.alloc_base = gc.mem_alloc()
+        self.count += 1
+        self.last_pause_us = pause
+        if pause > self.max_pause_us:
+            self.max_pause_us = pause
+        return pause
+
+    def idle(self, slack_ms):
+        """
+        Collects if one is due and fits in the slack before the next frame.
+
+        Args:
+            slack_ms (int): Time left until the next frame in milliseconds.
+
+        Returns:
+            bool: True if a collection was run.
+        """
+        pause_us = self.last_pause_us if self.count else GC_PAUSE_DEFAULT_US
+        if slack_ms * 1000 <= pause_us:
+            return False
+
+        if not self.pending and \
+                gc.mem_alloc() - self.alloc_base < self.collect_bytes:
+            return False
+
+        self.collect()
+        return True
+
+    def get_stats(self):
+        """
+        Gets the collection statistics.
+
+        Returns:
+            tuple: (count, last_pause_us, max_pause_us, min_free)
+        """
+        return (self.count, self.last_pause_us, self.max_pause_us,
+                self.min_free)
+
+    def reset_stats(self):
+        """
+        Resets the pause and heap watermarks.
+        """
+        self.count = 0
+        self.last_pause_us = 0
+        self.max_pause_us = 0
+        self.min_free = gc.mem_free()
+
+
+class FrameScheduler:
+    """
+    A class to run a task at a fixed rate against absolute deadlines.
+
+    The time spent in the frame is taken off the sleep, so the period does
+    not stretch with the processing time. A frame that ends after its
+    deadline counts as an overrun and the schedule restarts from there
+    instead of running the missed frames back to back.
+
+    While waiting, an input can be polled so that a new frame is handled
+    as soon as it arrives. The deadlines then restart from that frame.
+
+    Example:
+        >>> scheduler = FrameScheduler(20)
+        >>> while True:
+        >>>     scheduler.start()
+        >>>     # Frame work
+        >>>     await scheduler.wait(frame_input.poll)
+    """
+
+    def __init__(self, period_ms=20):
+        """
+        Initializes the FrameScheduler instance.
+
+        Args:
+            period_ms (int): Frame period in milliseconds.
+        """
+        self.period_ms = period_ms
+        now = utime.ticks_ms()
+        self.deadline = utime.ticks_add(now, period_ms)
+        self.last_start = now
+
+        self.frames = 0
+        self.overruns = 0
+        self.last_period_ms = period_ms
+        self.max_period_ms = 0
+
+    def set_period(self, period_ms):
+        """
+        Changes the frame period, the next frame is due one new period \
+            after the start of the current one.
+
+        Args:
+            period_ms (int): Frame period in milliseconds.
+        """
+        if period_ms == self.period_ms:
+            return
+        self.deadline = utime.ticks_add(self.last_start, period_ms)
+        self.period_ms = period_ms
+
+    def start(self):
+        """
+        Marks the start of a frame and records the measured period in \
+            the statistics.
+        """
+        now = utime.ticks_ms()
+        period = utime.ticks_diff(now, self.last_start)
+        self.last_start = now
+        self.frames += 1
+        self.last_period_ms = period
+        if period > self.max_period_ms:
+            self.max_period_ms = period
+
+    def slack(self):
+        """
+        Gets the time left until the next frame is due.
+
+        Returns:
+            int: Milliseconds to the deadline, negative once it has passed.
+        """
+        return utime.ticks_diff(self.deadline, utime.ticks_ms())
+
+    async def wait(self, poll=None, poll_ms=POLL_MS_DEFAULT,
+                   sleep_func=None):
+        """
+        Sleeps until the next frame is due or until poll reports new input.
+
+        Args:
+            poll (function, optional): Called every poll_ms while waiting, \
+                returns True when there is new input to handle.
+            poll_ms (int): Poll interval in milliseconds.
+            sleep_func (function, optional): Blocking sleep taking \
+                milliseconds, e.g. machine.lightsleep, used for the whole \
+                wait instead of polling.
+
+        Returns:
+            bool: True if woken by poll before the deadline.
+        """
+        now = utime.ticks_ms()
+        remaining = utime.ticks_diff(self.deadline, now)
+        if remaining <= 0:
+            self.overruns += 1
+            self.deadline = utime.ticks_add(now, self.period_ms)
+            # Still let the other tasks run
+            await uasyncio.sleep_ms(0)
+            return False
+
+        if sleep_func is not None:
+            self.deadline = utime.ticks_add(self.deadline, self.period_ms)
+            sleep_func(remaining)
+            await uasyncio.sleep_ms(0)
+            return False
+
+        if poll is None:
+            self.deadline = utime.ticks_add(self.deadline, self.period_ms)
+            await uasyncio.sleep_ms(remaining)
+            return False
+
+        while remaining > 0:
+            await uasyncio.sleep_ms(min(poll_ms, remaining))
+            if poll():
+                self.deadline = utime.ticks_add(utime.ticks_ms(),
+                                                self.period_ms)
+                return True
+            remaining = utime.ticks_diff(self.deadline, utime.ticks_ms())
+        self.deadline = utime.ticks_add(self.deadline, self.period_ms)
+        return False
+
+    def get_stats(self):
+        """
+        Gets the frame statistics.
+
+        Returns:
+            tuple: (frames, overruns, last_period_ms, max_period_ms)
+        """
+        return (self.frames, self.overruns, self.last_period_ms,
+                self.max_period_ms)
+
+    def reset_stats(self):
+        """
+        Resets the frame and overrun counters.
+        """
+        self.frames = 0
+        self.overruns = 0
+        self.max_period_ms = 0
+
+
+class FrameInput:
+    """
+    A class to detect new radio frames and time how fast they are applied.
+
+    poll() reads the receiver and compares it with the previous frame, a
+    frame that differs gets the next sequence number and a timestamp.
+    applied() closes the frame once its outputs are written and records
+    the latency. Frames are seen at the poll, so the time between the
+    radio delivering a frame and the poll is not included.
+
+    Example:
+        >>> frame_input = FrameInput(rc_module.rc_slave_data)
+        >>> await scheduler.wait(frame_input.poll)
+        >>> rc_data = frame_input.data
+        >>> # Handle rc_data and commit the outputs
+        >>> frame_input.applied()
+        >>> seq, count, avg_us, max_us = frame_input.get_stats()
+    """
+
+    def __init__(self, read_func, size=10):
+        """
+        Initializes the FrameInput instance.
+
+        Args:
+            read_func (function): Returns the latest frame as a list.
+            size (int): Number of values compared to detect a new frame.
+        """
+        self.read_func = read_func
+        self.raw = array('l', [0] * size)
+        self.data = None
+        self.seq = 0
+        self.stamp = 0
+        self.pending = False
+
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    def poll(self):
+        """
+        Reads the receiver into data.
+
+        Returns:
+            bool: True if the frame differs from the previous one.
+        """
+        data = self.read_func()
+        self.data = data
+        if not data:
+            return False
+
+        raw = self.raw
+        changed = False
+        for i in range(min(len(data), len(raw))):
+            if raw[i] != data[i]:
+                raw[i] = data[i]
+                changed = True
+        if changed:
+            self.seq += 1
+            self.stamp = utime.ticks_us()
+            self.pending = True
+        return changed
+
+    def applied(self):
+        """
+        Records the latency of the last new frame once its outputs are set.
+        """
+        if not self.pending:
+            return
+        self.pending = False
+
+        latency = utime.ticks_diff(utime.ticks_us(), self.stamp)
+        self.count += 1
+        self.total_us += latency
+        if latency > self.max_us:
+            self.max_us = latency
+
+    def get_stats(self):
+        """
+        Gets the frame latency statistics.
+
+        Returns:
+            tuple: (seq, count, avg_us, max_us)
+        """
+        avg = self.total_us // self.count if self.count else 0
+        return (self.seq, self.count, avg, self.max_us)
+
+    def reset_stats(self):
+        """
+        Resets the latency statistics.
+        """
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+
+class RatePolicy:
+    """
+    A class to pick the control frame period from the input activity.
+
+    Frames run every RATE_FAST_MS for ACTIVE_HOLD_MS after an input
+    change and every RATE_CRUISE_MS after that. Once the input has not
+    changed for IDLE_AFTER_MS, or while the link is down, they run every
+    RATE_IDLE_MS and the input is polled less often. New input is still
+    picked up at the next poll and switches straight back to fast. While
+    another source (simulation or a user script) drives an output, the
+    rate never drops below cruise, as its commands go out with the frames.
+
+    Example:
+        >>> rate_policy = RatePolicy()
+        >>> scheduler.set_period(rate_policy.update(woken, link_up, busy))
+        >>> await scheduler.wait(frame_input.poll, rate_policy.poll_ms)
+    """
+
+    def __init__(self, fast_ms=RATE_FAST_MS, cruise_ms=RATE_CRUISE_MS,
+                 idle_ms=RATE_IDLE_MS):
+        """
+        Initializes the RatePolicy instance.
+
+        Args:
+            fast_ms (int): Frame period while the input changes.
+            cruise_ms (int): Frame period with steady input.
+            idle_ms (int): Frame period without link or input changes.
+        """
+        self.fast_ms = fast_ms
+        self.cruise_ms = cruise_ms
+        self.idle_ms = idle_ms
+        self.last_input = utime.ticks_ms()
+        self.link_up = False
+        self.period_ms = cruise_ms
+        self.poll_ms = POLL_MS_DEFAULT
+
+    def update(self, new_input, link_up, busy=False):
+        """
+        Updates the policy after a frame.
+
+        Args:
+            new_input (bool): The frame brought changed input.
+            link_up (bool): Frames are being received.
+            busy (bool): Another source than the remote drives an output.
+
+        Returns:
+            int: Period of the next frame in milliseconds.
+        """
+        now = utime.ticks_ms()
+        if new_input:
+            self.last_input = now
+        self.link_up = link_up
+
+        quiet = utime.ticks_diff(now, self.last_input)
+        if not busy and (not link_up or quiet >= IDLE_AFTER_MS):
+            self.period_ms = self.idle_ms
+            self.poll_ms = RATE_IDLE_POLL_MS
+        else:
+            self.period_ms = self.fast_ms if link_up and \
+                quiet < ACTIVE_HOLD_MS else self.cruise_ms
+            self.poll_ms = POLL_MS_DEFAULT
+        return self.period_ms
+
+    def is_idle(self):
+        """
+        Checks whether the policy is in the idle rate.
+
+        Returns:
+            bool: True while idle.
+        """
+        return self.period_ms == self.idle_ms
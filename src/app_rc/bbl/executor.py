@@ -38,6 +38,8 @@ class CommandExecutor:
         self.command = ""
         self.start_func = None
         self.final_func = None
+        self.gc_func = gc.collect
+        self.compile_gc_func = gc.collect
 
     async def _execute(self, command: str, timeout=None):
         """Execute string command"""
@@ -114,6 +116,14 @@ class CommandExecutor:
     def register_start_cb(self, func=None):
         self.start_func = func
 
+    def register_gc_cb(self, func=None, compile_func=None):
+        """Route collections through func, e.g. to defer them. The one
+        right before the script is compiled goes through compile_func,
+        which should collect at once."""
+        self.gc_func = func if func is not None else gc.collect
+        self.compile_gc_func = compile_func if compile_func is not None \
+            else gc.collect
+
     def register_default_cmds(self, cmds):
         self._default_commands = cmds
 
@@ -144,7 +154,7 @@ class CommandExecutor:
                 if self.get_status() != "RUNNING":
                     command_lines = self.command.split("\n")
                     self.command = ""
-                    gc.collect()
+                    self.gc_func()
 
                     formatted_code = ""
 
@@ -162,7 +172,7 @@ class CommandExecutor:
                         formatted_code += "  " + line + "\n"  # Indent code block
 
                         line = ""
-                        gc.collect()
+                        self.gc_func()
 
                     # Replace (u)time.sleep() with await asyncio.sleep()
                     formatted_code = re.sub(r"(time|utime)\.sleep\((.*?)\)",
@@ -176,7 +186,8 @@ class CommandExecutor:
 
                     asyncio.create_task(self._execute(formatted_code))
                     formatted_code = None
-                    gc.collect()
+                    # The compile in _execute needs the heap in one piece
+                    self.compile_gc_func()
                 else:
                     self.stop()
             await asyncio.sleep(0.2)
@@ -5,14 +5,35 @@
 # Copyright (c) 2025 MakerWorld
 #
 
-from machine import Pin
+from machine import Pin, mem32, disable_irq, enable_irq
+from array import array
+import utime
 
 MOTOR1_CHANNEL1 = 4
 MOTOR1_CHANNEL2 = 5
 MOTOR2_CHANNEL1 = 6
 MOTOR2_CHANNEL2 = 7
 
+# ESP32-C3 GPIO output set/clear registers, writing 1 to a bit sets or
+# clears that pin in one store
+GPIO_OUT_W1TS_REG = 0x60004008
+GPIO_OUT_W1TC_REG = 0x6000400C
+
+MOTOR1_1_BIT = 1 << MOTOR1_CHANNEL1
+MOTOR1_2_BIT = 1 << MOTOR1_CHANNEL2
+MOTOR2_1_BIT = 1 << MOTOR2_CHANNEL1
+MOTOR2_2_BIT = 1 << MOTOR2_CHANNEL2
+MOTOR1_MASK = MOTOR1_1_BIT | MOTOR1_2_BIT
+MOTOR2_MASK = MOTOR2_1_BIT | MOTOR2_2_BIT
+
 PERIOD = 20
+SD_FULL = 2048  # Sigma-delta full scale, one step per speed unit
+
+MODULATION_PWM = 0
+MODULATION_SIGMA_DELTA = 1
+MODULATION_NAMES = ("pwm", "sigma_delta")
+
+SLEW_SHIFT = 8  # Slew limiter speeds are kept in Q8
 
 
 class MotorsController:
@@ -64,53 +85,188 @@ class MotorsController:
             2: {'forward_speed': 100, 'reverse_speed': 100, 'offset': 0}
         }
 
+        # Per motor modulation, last requested speed and the sigma-delta
+        # error accumulator
+        self.modulation = bytearray(2)
+        self.speed = array('h', [0, 0])
+        self.sd_acc = array('l', [0, 0])
+
+        # Slew limiter per motor, rates in speed units per second (0 is
+        # unlimited) and the output speed in Q8. Speeds up to the floor
+        # are reached at once. Motors still ramping are in slew_busy, the
+        # remainder carries the sub-step part of the rate between ticks.
+        self.slew_mask = 0
+        self.slew_busy = 0
+        self.slew_accel = array('l', [0, 0])
+        self.slew_decel = array('l', [0, 0])
+        self.slew_floor = array('h', [0, 0])
+        self.slew_cur = array('l', [0, 0])
+        self.slew_tick = array('l', [0, 0])
+        self.slew_rem = array('l', [0, 0])
+
         self.period_cnt = 0
+        self.writes_issued = 0
+        self.writes_suppressed = 0
 
+        # Level of the four motor pins as last written
+        self.out_mask = MOTOR1_MASK | MOTOR2_MASK
         self.motor1_1.on()
         self.motor1_2.on()
         self.motor2_1.on()
         self.motor2_2.on()
 
+    def _slew_start(self, internal_idx):
+        bit = 1 << internal_idx
+        if self.slew_busy & bit:
+            return
+        self.slew_tick[internal_idx] = utime.ticks_ms()
+        self.slew_rem[internal_idx] = 0
+        self.slew_busy |= bit
+
+    def _slew_delta(self, i, rate, elapsed):
+        # Q8 change for the elapsed time, the remainder carries over
+        rem = self.slew_rem[i] + (rate * elapsed << SLEW_SHIFT)
+        step = rem // 1000
+        self.slew_rem[i] = rem - step * 1000
+        return step
+
+    def _slew_step(self):
+        now = utime.ticks_ms()
+        for i in range(2):
+            bit = 1 << i
+            if not self.slew_busy & bit:
+                continue
+            cur = self.slew_cur[i]
+            tar = self.speed[i] << SLEW_SHIFT
+            elapsed = utime.ticks_diff(now, self.slew_tick[i])
+            self.slew_tick[i] = now
+            if cur == tar:
+                self.slew_busy &= ~bit
+                continue
+
+            if (tar > cur >= 0) or (tar < cur <= 0):
+                # Speeding up in the same direction
+                mag = cur if cur >= 0 else -cur
+                limit = tar if tar >= 0 else -tar
+                floor = self.slew_floor[i] << SLEW_SHIFT
+                if mag < floor:
+                    mag = floor if floor < limit else limit
+                rate = self.slew_accel[i]
+                if rate:
+                    mag += self._slew_delta(i, rate, elapsed)
+                if mag > limit or not rate:
+                    mag = limit
+                cur = mag if tar > 0 else -mag
+            else:
+                # Slowing down, through zero when the direction flips
+                goal = tar if (tar >= 0) == (cur >= 0) else 0
+                rate = self.slew_decel[i]
+                step = self._slew_delta(i, rate, elapsed) if rate else 0
+                if not rate or abs(cur - goal) <= step:
+                    cur = goal
+                elif cur > goal:
+                    cur -= step
+                else:
+                    cur += step
+
+            self.slew_cur[i] = cur
+            if cur == tar:
+                self.slew_busy &= ~bit
+            self._apply_speed(i, cur >> SLEW_SHIFT if cur >= 0 else
+                              -(-cur >> SLEW_SHIFT))
+
+    def _apply_speed(self, internal_idx, speed):
+        # Duties are worked out in place, without a tuple per call
+        level = speed if speed >= 0 else -speed
+        if self.modulation[internal_idx] == MODULATION_SIGMA_DELTA:
+            if level > SD_FULL:
+                level = SD_FULL
+        else:
+            level = level * PERIOD // 2048
+        duty1 = level if speed > 0 else 0
+        duty2 = level if speed < 0 else 0
+        if internal_idx == 0:
+            if duty1 == self.motor1_1_duty and duty2 == self.motor1_2_duty:
+                return False
+            self.motor1_1_duty = duty1
+            self.motor1_2_duty = duty2
+        else:
+            if duty1 == self.motor2_1_duty and duty2 == self.motor2_2_duty:
+                return False
+            self.motor2_1_duty = duty1
+            self.motor2_2_duty = duty2
+        return True
+
+    def _write_mask(self, out):
+        old = self.out_mask
+        if out & ~old:
+            mem32[GPIO_OUT_W1TS_REG] = out & ~old
+        if old & ~out:
+            mem32[GPIO_OUT_W1TC_REG] = old & ~out
+        self.out_mask = out
+
     def motors_period_cb(self):
         """
         Updates the duty cycles of the motors based on the current motor duty.
         This method simulates PWM
         by turning the motors on and off in intervals,
         adjusting the duty cycles based on the PWM timing signal.
+        The levels of all four pins are gathered into one mask and \
+            applied with a single set and a single clear register store, \
+            only on ticks where the mask changes.
+
+        Motors in sigma-delta mode instead add their duty to an error \
+            accumulator every call and drive one pulse each time it \
+            overflows, which spreads the pulses evenly and keeps the \
+            full speed resolution.
 
         This method should be called periodically to update motor speed.
         Example:
             >>> motors.motors_period_cb()  # Periodically update motor speed
         """
-        self.period_cnt = (self.period_cnt + 1) % PERIOD
-
-        if self.motor1_1_duty == 0 and self.motor1_2_duty == 0:
-            self.motor1_1.on()
-            self.motor1_2.on()
+        cnt = (self.period_cnt + 1) % PERIOD
+        self.period_cnt = cnt
+        if self.slew_busy:
+            # Every tick, so the duty follows the ramp at the tick rate
+            self._slew_step()
+        out = 0
+
+        d1 = self.motor1_1_duty
+        d2 = self.motor1_2_duty
+        if d1 == 0 and d2 == 0:
+            out = MOTOR1_MASK
+        elif self.modulation[0]:
+            acc = self.sd_acc[0] + d1 + d2
+            if acc >= SD_FULL:
+                acc -= SD_FULL
+                out = MOTOR1_1_BIT if d1 else MOTOR1_2_BIT
+            self.sd_acc[0] = acc
         else:
-            if self.period_cnt >= self.motor1_1_duty:
-                self.motor1_1.off()
-            else:
-                self.motor1_1.on()
-
-            if self.period_cnt >= self.motor1_2_duty:
-                self.motor1_2.off()
-            else:
-                self.motor1_2.on()
-
-        if self.motor2_1_duty == 0 and self.motor2_2_duty == 0:
-            self.motor2_1.on()
-            self.motor2_2.on()
+            if cnt < d1:
+                out = MOTOR1_1_BIT
+            if cnt < d2:
+                out |= MOTOR1_2_BIT
+
+        d1 = self.motor2_1_duty
+        d2 = self.motor2_2_duty
+        if d1 == 0 and d2 == 0:
+            out |= MOTOR2_MASK
+        elif self.modulation[1]:
+            acc = self.sd_acc[1] + d1 + d2
+            if acc >= SD_FULL:
+                acc -= SD_FULL
+                out |= MOTOR2_1_BIT if d1 else MOTOR2_2_BIT
+            self.sd_acc[1] = acc
         else:
-            if self.period_cnt >= self.motor2_1_duty:
-                self.motor2_1.off()
-            else:
-                self.motor2_1.on()
+            if cnt < d1:
+                out |= MOTOR2_1_BIT
+            if cnt < d2:
+                out |= MOTOR2_2_BIT
 
-            if self.period_cnt >= self.motor2_2_duty:
-                self.motor2_2.off()
-            else:
-                self.motor2_2.on()
+        # Pins only change a few times per period, skip the register
+        # stores on the other ticks
+        if out != self.out_mask:
+            self._write_mask(out)
 
     def set_speed(self, motor_idx, speed):
         """
@@ -138,17 +294,34 @@ class MotorsController:
             >>> # Set motor 2 to move reverse at a quarter speed
             >>> set_speed(2, -512)
         """
-        if motor_idx == 1:
-            self.motor1_1_duty, self.motor1_2_duty = self._speed_handler(speed)
-        elif motor_idx == 2:
-            self.motor2_1_duty, self.motor2_2_duty = self._speed_handler(speed)
-        else:
+        if motor_idx != 1 and motor_idx != 2:
             print("[motors]Invalid motor index. Must be between 1 and 2.")
+            return
+        internal_idx = motor_idx - 1
+        speed = int(speed)
+
+        if self.slew_mask & (1 << internal_idx):
+            # The motor tick ramps the output towards the new target
+            if self.speed[internal_idx] == speed:
+                self.writes_suppressed += 1
+                return
+            self.speed[internal_idx] = speed
+            self._slew_start(internal_idx)
+        else:
+            self.speed[internal_idx] = speed
+            if not self._apply_speed(internal_idx, speed):
+                self.writes_suppressed += 1
+                return
+        self.writes_issued += 1
 
     def stop(self, motor_idx):
         """
         Stops a motor by setting its duty cycles to 0.
 
+        The pins are braked at once instead of on the next motor tick, \
+            with interrupts off so the tick cannot change the pins in \
+            between.
+
         Args:
             motor_idx (int): Index of the motor (1 or 2).
         Raises:
@@ -158,18 +331,123 @@ class MotorsController:
             >>> motors.stop(2)  # Stop motor 2
         """
         if motor_idx == 1:
+            self.speed[0] = 0
+            self.slew_cur[0] = 0
+            if self.motor1_1_duty == 0 and self.motor1_2_duty == 0:
+                self.writes_suppressed += 1
+                return
             self.motor1_1_duty = 0
             self.motor1_2_duty = 0
-            self.motor1_1.on()
-            self.motor1_2.on()
+            # The timer callback also writes out_mask, keep it out
+            # while the mask is read and written back
+            state = disable_irq()
+            self._write_mask(self.out_mask | MOTOR1_MASK)
+            enable_irq(state)
         elif motor_idx == 2:
+            self.speed[1] = 0
+            self.slew_cur[1] = 0
+            if self.motor2_1_duty == 0 and self.motor2_2_duty == 0:
+                self.writes_suppressed += 1
+                return
             self.motor2_1_duty = 0
             self.motor2_2_duty = 0
-            self.motor2_1.on()
-            self.motor2_2.on()
+            state = disable_irq()
+            self._write_mask(self.out_mask | MOTOR2_MASK)
+            enable_irq(state)
         else:
             raise ValueError(
                 "[motors]Invalid motor index. Must be between 1 and 2.")
+        self.writes_issued += 1
+
+    def get_write_stats(self):
+        """
+        Gets the number of speed updates applied and suppressed as redundant.
+
+        Returns:
+            tuple: (issued, suppressed)
+        Example:
+            >>> issued, suppressed = motors.get_write_stats()
+        """
+        return self.writes_issued, self.writes_suppressed
+
+    def reset_write_stats(self):
+        """
+        Resets the speed update counters.
+        """
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+
+    def set_slew(self, motor_idx, accel=0, decel=0, floor=0):
+        """
+        Limits how fast the output speed of a motor may change.
+
+        The limiter runs in every motor tick while a ramp is under way \
+            and uses the real time since its last step, so ramps keep \
+            their duration even when the control loop or a tick is late.
+
+        Args:
+            motor_idx (int): Index of the motor (1 or 2).
+            accel (int): Largest speed increase in speed units \
+                (2048 is full speed) per second, 0 for no limit.
+            decel (int): Largest speed decrease per second, 0 for no limit.
+            floor (int): Speed reached at once when starting to speed up.
+        Example:
+            >>> # Take one second from standstill to full speed on motor 1
+            >>> motors.set_slew(1, 2048)
+        """
+        if motor_idx not in self.motor_params:
+            print("[motors]Invalid motor index or parameter.")
+            return
+
+        internal_idx = motor_idx - 1
+        self.slew_accel[internal_idx] = int(accel)
+        self.slew_decel[internal_idx] = int(decel)
+        self.slew_floor[internal_idx] = int(floor)
+        self.slew_cur[internal_idx] = self.speed[internal_idx] << SLEW_SHIFT
+        self.slew_busy &= ~(1 << internal_idx)
+        if accel or decel:
+            self.slew_mask |= 1 << internal_idx
+        else:
+            self.slew_mask &= ~(1 << internal_idx)
+            self._apply_speed(internal_idx, self.speed[internal_idx])
+
+    def set_modulation(self, motor_idx, mode="pwm"):
+        """
+        Selects how the software PWM drives a motor.
+
+        "pwm" switches the output once per 20-tick period, which gives \
+            20 speed steps.
+        "sigma_delta" spreads the on-ticks evenly by carrying the duty \
+            error from tick to tick, so the average output follows the \
+            full 11-bit speed, including crawl speeds below one PWM step.
+
+        Args:
+            motor_idx (int): Index of the motor (1 or 2).
+            mode (str): "pwm" or "sigma_delta".
+        Example:
+            >>> motors.set_modulation(1, "sigma_delta")
+        """
+        if motor_idx not in self.motor_params:
+            print("[motors]Invalid motor index or parameter.")
+            return
+        if mode not in MODULATION_NAMES:
+            print("[motors]Invalid modulation, Must be one of",
+                  MODULATION_NAMES)
+            return
+
+        internal_idx = motor_idx - 1
+        modulation = MODULATION_NAMES.index(mode)
+        if self.modulation[internal_idx] == modulation:
+            return
+        # Duties are in a different scale per mode, rework them
+        self.modulation[internal_idx] = modulation
+        self.sd_acc[internal_idx] = 0
+        if self.slew_mask & (1 << internal_idx):
+            cur = self.slew_cur[internal_idx]
+            self._apply_speed(internal_idx, cur >> SLEW_SHIFT if cur >= 0
+                              else -(-cur >> SLEW_SHIFT))
+        else:
+            self._apply_speed(internal_idx, self.speed[internal_idx])
 
     def set_forward_rate(self, motor_idx, val):
         """
@@ -304,24 +582,3 @@ class MotorsController:
         else:
             print("[motors] Invalid motor index.")
             return None
-
-    def _speed_handler(self, speed):
-        """
-        Converts a speed value to duty cycle values for two motor channels.
-
-        Args:
-            speed (int): Speed value to convert.
-        Returns:
-            tuple: A tuple containing the duty cycle values for \
-                the two motor channels.
-        """
-        if speed > 0:
-            pwm1 = int(speed * PERIOD / 2048)
-            pwm2 = 0
-        elif speed < 0:
-            pwm1 = 0
-            pwm2 = int(-speed * PERIOD / 2048)
-        else:
-            pwm1 = 0
-            pwm2 = 0
-        return pwm1, pwm2
@@ -6,12 +6,31 @@
 #
 
 from machine import Pin, PWM
+from array import array
 
 SERVO_CHANNEL1 = 3
 SERVO_CHANNEL2 = 2
 SERVO_CHANNEL3 = 1
 SERVO_CHANNEL4 = 0
 
+POS_SCALE = 1600  # Position units per degree
+PROFILE_CONSTANT = 0
+PROFILE_TRAPEZOID = 1
+PROFILE_SCURVE = 2
+ACCEL_DEFAULT = 1000  # deg/s^2
+SCURVE_JERK_MS = 100  # Time to build up the full acceleration
+SCURVE_TICKS_MAX = 34  # Frames averaged at most, 333Hz for 100ms
+PROFILE_NAMES = ("constant", "trapezoid", "s_curve")
+PULSE_MIN_DEFAULT = 500  # us at 0 degrees
+PULSE_MAX_DEFAULT = 2500  # us at 180 degrees
+PULSE_CENTER_DEFAULT = 1500  # us at 90 degrees
+REFRESH_RATES = (50, 100, 200, 333)  # Hz, 50 for analog servos
+TICK_NS = 1000000  # timing_proc is called every 1ms
+STEP_IDLE = 0
+STEP_PROFILE = 1  # Moving under the motion profile of the servo
+STEP_GROUP = 2  # Moving as part of a move_group
+GROUP_FRAC_SHIFT = 11  # Group progress resolution, 2048 steps
+
 
 class ServosController:
     """
@@ -46,20 +65,304 @@ class ServosController:
         self.servos_map = [
             self.servo1_pwm, self.servo2_pwm, self.servo3_pwm, self.servo4_pwm
         ]
-        self.servos_info_map = [
-            {"c_ang": 0, "s_ang": 0, "rh_ang": 0, "vel": 0, "step_en": False},
-            {"c_ang": 0, "s_ang": 0, "rh_ang": 0, "vel": 0, "step_en": False},
-            {"c_ang": 0, "s_ang": 0, "rh_ang": 0, "vel": 0, "step_en": False},
-            {"c_ang": 0, "s_ang": 0, "rh_ang": 0, "vel": 0, "step_en": False},
-        ]
-        self.sensitity = 180
-        self.tim_call_freq = 100
+        # Stepping state per servo. Positions are in 1/16 centidegree
+        # (POS_SCALE per degree), velocities in position units per tick and
+        # accelerations in position units per tick squared.
+        self.cur_pos = array('l', [0] * 4)
+        self.tar_pos = array('l', [0] * 4)
+        self.cur_vel = array('l', [0] * 4)
+        self.vel = array('h', [0] * 4)
+        self.step_en = bytearray(4)
+        self.profile = bytearray(4)
+        self.accel_dps2 = array('l', [ACCEL_DEFAULT] * 4)
+        # Output frame per channel. A moving channel steps once per frame,
+        # the time left in the frame is counted down in ns by the 1ms
+        # timing_proc calls so the steps keep the average frame period.
+        # Ticks before the nearest frame end only add to skip_ns.
+        self.refresh_hz = array('H', [50] * 4)
+        self.period_ns = array('l', [1000000000 // 50] * 4)
+        self.frame_rem = array('l', [0] * 4)
+        self.wait_ns = 0
+        self.skip_ns = 0
+        # Channels with step_en other than STEP_IDLE
+        self.step_mask = 0
+        self.radps = array('h', [4] * 4)
+        self.call_freq = array('h', [50] * 4)
+        self.rate = array('l', [0] * 4)
+        self.accel = array('l', [0] * 4)
+        # The s_curve runs the trapezoid on ref_pos and outputs the mean of
+        # its last hist_len positions, which ramps the acceleration over
+        # SCURVE_JERK_MS
+        self.ref_pos = array('l', [0] * 4)
+        self.hist = [array('l', [0] * SCURVE_TICKS_MAX) for _ in range(4)]
+        self.hist_len = bytearray(4)
+        self.hist_idx = bytearray(4)
+        self.hist_sum = array('l', [0] * 4)
+        for i in range(4):
+            self._update_rate(i, 4, 50)
+        # Angle to pulse lookup per servo, one entry per degree in 0.1us
+        self.lut = [array('H', [0] * 181) for _ in range(4)]
+        self.pulse_min = array('H', [0] * 4)
+        self.pulse_max = array('H', [0] * 4)
+        self.pulse_center = array('H', [0] * 4)
+        for i in range(4):
+            self._build_lut(i, PULSE_MIN_DEFAULT, PULSE_MAX_DEFAULT,
+                            PULSE_CENTER_DEFAULT)
+        # Last pulse width written to each channel in ns, -1 until the
+        # first write
+        self.last_duty = array('l', [-1] * 4)
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+        # Coordinated group motion, shared clock and per-servo start/delta
+        self.group_mask = 0
+        self.group_elapsed = 0
+        self.group_duration = 0
+        self.group_start = array('l', [0] * 4)
+        self.group_delta = array('l', [0] * 4)
+
+    def _update_rate(self, internal_idx, radPSec, call_freq):
+        self.radps[internal_idx] = radPSec
+        self.call_freq[internal_idx] = call_freq
+        # Step per tick at full step speed, radPSec rad/s at call_freq Hz
+        self.rate[internal_idx] = 5730 * radPSec * 16 // call_freq
+        self._update_accel(internal_idx)
+
+    def _update_accel(self, internal_idx):
+        call_freq = self.call_freq[internal_idx]
+        accel = self.accel_dps2[internal_idx] * POS_SCALE // (
+            call_freq * call_freq)
+        self.accel[internal_idx] = accel if accel > 0 else 1
+        ticks = call_freq * SCURVE_JERK_MS // 1000
+        self.hist_len[internal_idx] = 1 if ticks < 1 else \
+            SCURVE_TICKS_MAX if ticks > SCURVE_TICKS_MAX else ticks
+        self._smooth_reset(internal_idx)
+
+    def _smooth_reset(self, internal_idx):
+        pos = self.cur_pos[internal_idx]
+        hist = self.hist[internal_idx]
+        n = self.hist_len[internal_idx]
+        for k in range(n):
+            hist[k] = pos
+        self.hist_sum[internal_idx] = pos * n
+        self.hist_idx[internal_idx] = 0
+        self.ref_pos[internal_idx] = pos
+
+    def _smooth(self, internal_idx, pos):
+        # Mean of the last hist_len positions, kept as a running sum
+        hist = self.hist[internal_idx]
+        k = self.hist_idx[internal_idx]
+        total = self.hist_sum[internal_idx] + pos - hist[k]
+        hist[k] = pos
+        self.hist_sum[internal_idx] = total
+        k += 1
+        n = self.hist_len[internal_idx]
+        self.hist_idx[internal_idx] = 0 if k >= n else k
+        return total // n
+
+    def _stop_speed(self, internal_idx, remain, guess):
+        # Largest v with v * (v + accel) / (2 * accel) <= remain, that is
+        # accel * (s - 1) / 2 with s = sqrt(1 + 8 * remain / accel). s is
+        # kept in 1/16 so every product stays a small int, and the Newton
+        # iteration starts from the s of the current speed.
+        accel = self.accel[internal_idx]
+        n = 256 + (remain << 11) // accel
+        x = (guess << 5) // accel + 17
+        x = (x + n // x) >> 1
+        y = (x + n // x) >> 1
+        while y < x:
+            x = y
+            y = (x + n // x) >> 1
+        return accel * (x - 16) >> 5
+
+    def _trapezoid_step(self, internal_idx, pos, vmax):
+        # One frame of the trapezoid from pos. The speed towards the target
+        # changes by accel per frame, and is capped so that braking by
+        # accel per frame from the next one on stops right at the target.
+        # Returns the new position, the signed speed is kept in cur_vel.
+        tar = self.tar_pos[internal_idx]
+        remain = tar - pos
+        if remain == 0:
+            self.cur_vel[internal_idx] = 0
+            return pos
+        speed = self.cur_vel[internal_idx]
+        if remain < 0:
+            remain = -remain
+            speed = -speed
+
+        accel = self.accel[internal_idx]
+        if speed > vmax:
+            speed -= accel
+            if speed < vmax:
+                speed = vmax
+        else:
+            speed += accel
+            if speed > vmax:
+                speed = vmax
+        # Braking from speed covers speed + (speed - accel) + ... up to
+        # speed * (speed + accel) / (2 * accel)
+        if speed > 0 and speed * (speed + accel) // (2 * accel) > remain:
+            stop = self._stop_speed(internal_idx, remain, speed)
+            speed = stop if stop > 0 else remain
+
+        if speed >= remain:
+            self.cur_vel[internal_idx] = 0
+            return tar
+        if tar < pos:
+            speed = -speed
+        self.cur_vel[internal_idx] = speed
+        return pos + speed
+
+    def _build_lut(self, internal_idx, min_us, max_us, center_us):
+        self.pulse_min[internal_idx] = min_us
+        self.pulse_max[internal_idx] = max_us
+        self.pulse_center[internal_idx] = center_us
+        lut = self.lut[internal_idx]
+        # Two linear segments so the centre trim lands exactly on 90
+        for deg in range(91):
+            lut[deg] = (min_us * 10 * (90 - deg) + center_us * 10 * deg) // 90
+        for deg in range(91, 181):
+            lut[deg] = (center_us * 10 * (180 - deg) +
+                        max_us * 10 * (deg - 90)) // 90
+
+    def _pos_to_ns(self, internal_idx, pos):
+        lut = self.lut[internal_idx]
+        deg = pos // POS_SCALE
+        if deg >= 180:
+            return lut[180] * 100
+        lo = lut[deg]
+        return (lo * POS_SCALE + (lut[deg + 1] - lo) *
+                (pos - deg * POS_SCALE)) * 100 // POS_SCALE
+
+    def _frame_restart(self, internal_idx):
+        # Step on the next tick, then once per frame
+        self.frame_rem[internal_idx] = self.skip_ns + TICK_NS
+        self.wait_ns = 0
+
+    def _step_start(self, internal_idx, mode):
+        if mode == STEP_PROFILE and self.step_en[internal_idx] != mode:
+            self._smooth_reset(internal_idx)
+        self.step_en[internal_idx] = mode
+        bit = 1 << internal_idx
+        if not self.step_mask & bit:
+            self._frame_restart(internal_idx)
+            self.step_mask |= bit
+
+    def _step_stop(self, internal_idx):
+        self.step_en[internal_idx] = STEP_IDLE
+        self.step_mask &= ~(1 << internal_idx)
+        self.cur_vel[internal_idx] = 0
+
+    def _write_duty(self, internal_idx, duty_ns):
+        if self.last_duty[internal_idx] == duty_ns:
+            self.writes_suppressed += 1
+            return
+        self.last_duty[internal_idx] = duty_ns
+        self.writes_issued += 1
+        self.servos_map[internal_idx].duty_ns(duty_ns)
+
+    def set_refresh_rate(self, servo_idx, freq=50):
+        """
+        Sets the PWM frame rate of a servo channel.
+
+        Digital servos accept frames faster than 50Hz, which cuts the \
+            delay between a new target and the servo seeing it.
+        The stepping motion of the channel is updated once per frame.
+
+        Args:
+            servo_idx (int): Index of the servo motor (1 to 4).
+            freq (int): Frame rate in Hz, one of 50, 100, 200 or 333.
+
+        Example:
+            >>> # Run servo 1 at 333Hz
+            >>> servos.set_refresh_rate(1, 333)
+        """
+        internal_idx = servo_idx - 1
+
+        if not 0 <= internal_idx < len(self.servos_map):
+            print("[servo]Invalid servo index. Must be between 1 and 4.")
+            return
+        if freq not in REFRESH_RATES:
+            print("[servo]Invalid refresh rate, Must be one of", REFRESH_RATES)
+            return
+        if self.refresh_hz[internal_idx] != freq:
+            self.refresh_hz[internal_idx] = freq
+            self.period_ns[internal_idx] = 1000000000 // freq
+            self.servos_map[internal_idx].freq(freq)
+            # Rewrite the pulse in the new frame
+            self.last_duty[internal_idx] = -1
+            # The frame restarts with the new period
+            self._frame_restart(internal_idx)
+            self._update_rate(internal_idx, self.radps[internal_idx], freq)
+            if self.pulse_max[internal_idx] * 1000 >= \
+                    self.period_ns[internal_idx]:
+                print("[servo]Pulse range does not fit in a", freq,
+                      "Hz frame, calibration reset.")
+                self._build_lut(internal_idx, PULSE_MIN_DEFAULT,
+                                PULSE_MAX_DEFAULT, PULSE_CENTER_DEFAULT)
+
+    def set_calibration(self, servo_idx, min_us=PULSE_MIN_DEFAULT,
+                        max_us=PULSE_MAX_DEFAULT, center_us=None):
+        """
+        Sets the pulse widths a servo expects at 0, 90 and 180 degrees.
+
+        The angle to pulse table is rebuilt once here, \
+            so later angle writes only read the table.
+
+        Args:
+            servo_idx (int): Index of the servo motor (1 to 4).
+            min_us (int): Pulse width at 0 degrees in microseconds.
+            max_us (int): Pulse width at 180 degrees in microseconds.
+            center_us (int, optional): \
+                Pulse width at 90 degrees, defaults to the middle of the range.
+
+        Example:
+            >>> # Trim servo 1 so its centre sits slightly to the left
+            >>> servos.set_calibration(1, 600, 2400, 1480)
+        """
+        internal_idx = servo_idx - 1
+
+        if not 0 <= internal_idx < len(self.servos_map):
+            print("[servo]Invalid servo index. Must be between 1 and 4.")
+            return
+        if center_us is None:
+            center_us = (min_us + max_us) // 2
+        if not 0 < min_us < center_us < max_us <= 6000:
+            print("[servo]Invalid calibration, "
+                  "Must be 0 < min < center < max <= 6000.")
+            return
+        if max_us * 1000 >= self.period_ns[internal_idx]:
+            print("[servo]Pulse range does not fit in the servo frame.")
+            return
+
+        self._build_lut(internal_idx, min_us, max_us, center_us)
+        # Force the next write so the new trim takes effect
+        self.last_duty[internal_idx] = -1
+
+    def get_write_stats(self):
+        """
+        Gets the number of PWM writes issued and suppressed as redundant.
+
+        Returns:
+            tuple: (issued, suppressed)
+
+        Example:
+            >>> issued, suppressed = servos.get_write_stats()
+        """
+        return self.writes_issued, self.writes_suppressed
+
+    def reset_write_stats(self):
+        """
+        Resets the PWM write counters.
+        """
+        self.writes_issued = 0
+        self.writes_suppressed = 0
 
     def set_angle(self, servo_idx, angle):
         """
         Sets the angle of a specified servo motor.
 
-        This method converts the angle to a corresponding duty cycle for the PWM signal.
+        This method converts the angle to a pulse width through the \
+            calibration table of the servo, with sub-degree resolution.
         The angle should be between 0 and 180 degrees.
 
         Args:
@@ -74,23 +377,29 @@ class ServosController:
             print("[servo]Invalid angle, Must be between 0 and 180.")
             return
 
-        duty = (int)(angle * 102 / 180 + 25)
         internal_idx = servo_idx - 1
 
-        self.reset_info(servo_idx, angle)
-
         if not 0 <= internal_idx < len(self.servos_map):
             print("[servo]Invalid servo index. Must be between 1 and 4.")
             return
 
-        self.servos_map[internal_idx].duty(duty)
+        pos = int(angle * POS_SCALE)
+        duty = self._pos_to_ns(internal_idx, pos)
+        if self.step_en[internal_idx] == 0 and \
+                self.cur_pos[internal_idx] == pos and \
+                self.last_duty[internal_idx] == duty:
+            self.writes_suppressed += 1
+            return
+
+        self.reset_info(servo_idx, angle)
+        self._write_duty(internal_idx, duty)
 
     def set_angle_stepping(self, servo_idx, angle, step_speed=None):
         """
         Sets the servo to move to the target angle using stepping motions.
 
         The servo will gradually move to the target angle \
-            at the specified speed.
+            at the specified speed, following its motion profile.
 
         Args:
             servo_idx (int): Index of the servo motor (1 to 4).
@@ -108,14 +417,68 @@ class ServosController:
 
         internal_idx = servo_idx - 1
 
-        cur_angle = self.servos_info_map[internal_idx]["c_ang"]
-        self.servos_info_map[internal_idx]["rh_ang"] = cur_angle
-        self.servos_info_map[internal_idx]["s_ang"] = angle
-
         if step_speed is not None:
-            self.servos_info_map[internal_idx]["vel"] = step_speed
+            self.vel[internal_idx] = step_speed
+
+        # Same target: keep the running motion instead of restarting it
+        pos = int(angle * POS_SCALE)
+        if self.tar_pos[internal_idx] == pos and (
+                self.step_en[internal_idx] == STEP_PROFILE or
+                self.cur_pos[internal_idx] == pos):
+            self.writes_suppressed += 1
+            return
+
+        self.group_mask &= ~(1 << internal_idx)
+        self.tar_pos[internal_idx] = pos
+        self._step_start(internal_idx, STEP_PROFILE)
+
+    def move_group(self, targets, duration_ms):
+        """
+        Moves several servos together so they all arrive at the same time.
 
-        self.servos_info_map[internal_idx]["step_en"] = True
+        The distance of each servo is worked out once here, and every \
+            frame each servo is placed at the same fraction of its move, \
+            regardless of its step speed or motion profile.
+        Any later stepping or angle command takes a servo out of the group.
+
+        Args:
+            targets (dict): Servo index (1 to 4) to target angle (0 to 180).
+            duration_ms (int): Time for the whole move in milliseconds.
+
+        Example:
+            >>> # Move an arm on PWM1-PWM3 to a new pose in 1.5 seconds
+            >>> servos.move_group({1: 30, 2: 120, 3: 90}, 1500)
+        """
+        for servo_idx, angle in targets.items():
+            if not 1 <= servo_idx <= len(self.servos_map):
+                print("[servo]Invalid servo index. Must be between 1 and 4.")
+                return
+            if not 0 <= angle <= 180:
+                print("[servo]Invalid angle, Must be between 0 and 180.")
+                return
+
+        if duration_ms <= 0:
+            for servo_idx, angle in targets.items():
+                self.set_angle(servo_idx, angle)
+            return
+
+        self.group_elapsed = 0
+        self.group_duration = duration_ms
+        mask = 0
+        for servo_idx, angle in targets.items():
+            i = servo_idx - 1
+            pos = int(angle * POS_SCALE)
+            self.group_start[i] = self.cur_pos[i]
+            self.group_delta[i] = pos - self.cur_pos[i]
+            self.tar_pos[i] = pos
+            self.cur_vel[i] = 0
+            self._step_start(i, STEP_GROUP)
+            mask |= 1 << i
+        # Servos left over from an earlier group finish on their own profile
+        for i in range(4):
+            if self.group_mask & ~mask & (1 << i):
+                self._step_start(i, STEP_PROFILE)
+        self.group_mask = mask
 
     def set_angle_step(self, servo_idx, step_speed=100):
         """
@@ -134,9 +497,38 @@ class ServosController:
             return
 
         internal_idx = servo_idx - 1
-        self.servos_info_map[internal_idx]["vel"] = step_speed
+        self.vel[internal_idx] = step_speed
+
+    def set_motion_profile(self, servo_idx, profile="constant", accel=0):
+        """
+        Sets the motion profile used by the stepping motion of a servo.
+
+        Args:
+            servo_idx (int): Index of the servo motor (1 to 4).
+            profile (str): "constant" moves at the step speed at once, \
+                "trapezoid" accelerates and decelerates at a constant rate, \
+                "s_curve" also ramps the acceleration up and down.
+            accel (int, optional): Acceleration in degrees per second \
+                squared, 0 keeps the default of 1000.
+
+        Example:
+            >>> # Smooth start and stop for servo 1
+            >>> servos.set_motion_profile(1, "s_curve", 720)
+        """
+        internal_idx = servo_idx - 1
+
+        if not 0 <= internal_idx < len(self.servos_map):
+            print("[servo]Invalid servo index. Must be between 1 and 4.")
+            return
+        if profile not in PROFILE_NAMES:
+            print("[servo]Invalid profile, Must be one of", PROFILE_NAMES)
+            return
+
+        self.profile[internal_idx] = PROFILE_NAMES.index(profile)
+        self.accel_dps2[internal_idx] = accel if accel > 0 else ACCEL_DEFAULT
+        self._update_accel(internal_idx)
 
-    def reset_info(self, servo_idx, angle, radPSec=4, call_freq=100):
+    def reset_info(self, servo_idx, angle, radPSec=4, call_freq=None):
         """
         Resets the information for a servo motor, \
             including its current angle and step configuration.
@@ -147,7 +539,8 @@ class ServosController:
             radPSec (int, optional): \
                 The rotational speed in radians per second (default 4).
             call_freq (int, optional): \
-                Frequency at which the timing function is called (default 100).
+                Frequency the servo is stepped at, \
+                defaults to its refresh rate.
 
         Example:
             >>> # Reset servo 1 to 90 degrees with default settings
@@ -159,17 +552,20 @@ class ServosController:
 
         internal_idx = servo_idx - 1
 
-        if not 0 <= internal_idx < len(self.servos_info_map):
+        if not 0 <= internal_idx < len(self.servos_map):
             print("[servo]Invalid servo index. Must be between 1 and 4.")
             return
 
-        self.tim_call_freq = call_freq
-        self.sensitivity = (57.3 * radPSec) / self.tim_call_freq
+        if call_freq is None:
+            call_freq = self.refresh_hz[internal_idx]
+        self._update_rate(internal_idx, radPSec, call_freq)
 
-        self.servos_info_map[internal_idx]["step_en"] = False
-        self.servos_info_map[internal_idx]["c_ang"] = angle
-        self.servos_info_map[internal_idx]["rh_ang"] = angle
-        self.servos_info_map[internal_idx]["s_ang"] = angle
+        pos = int(angle * POS_SCALE)
+        self.group_mask &= ~(1 << internal_idx)
+        self._step_stop(internal_idx)
+        self.cur_pos[internal_idx] = pos
+        self.tar_pos[internal_idx] = pos
+        self.cur_vel[internal_idx] = 0
 
     def set_speed(self, servo_idx, speed_percentage):
         """
@@ -192,14 +588,19 @@ class ServosController:
             print("[servo]Invalid speed, Must be between -100 and 100.")
             return
 
-        duty = round(speed_percentage * 51.2 / 100 + 76.8)
         internal_idx = servo_idx - 1
 
         if not 0 <= internal_idx < len(self.servos_map):
             print("[servo]Invalid servo index. Must be between 1 and 4.")
             return
 
-        self.servos_map[internal_idx].duty(duty)
+        center = self.pulse_center[internal_idx]
+        if speed_percentage >= 0:
+            span = self.pulse_max[internal_idx] - center
+        else:
+            span = center - self.pulse_min[internal_idx]
+        self._write_duty(internal_idx,
+                         (center * 100 + speed_percentage * span) * 10)
 
     def set_duty(self, servo_idx, duty):
         """
@@ -224,7 +625,8 @@ class ServosController:
         internal_idx = servo_idx - 1
 
         if 0 <= internal_idx < len(self.servos_map):
-            self.servos_map[internal_idx].duty(duty)
+            self._write_duty(internal_idx,
+                             duty * self.period_ns[internal_idx] // 1024)
         else:
             raise ValueError(
                 "[servo]Invalid servo index. Must be between 1 and 4.")
@@ -233,41 +635,104 @@ class ServosController:
         """
         Periodically checks and updates the servo motors that are in stepping mode.
 
-        This method is called by a timer or main loop to \
+        This method is called by a 1ms timer to \
             update the servo positions gradually.
-        It calculates the next angle based on the velocity and \
-            sensitivity settings, and applies the PWM duty cycle.
+        It returns at once when no servo is moving, and after one add \
+            and compare on ticks before the nearest frame end. A moving \
+            channel is stepped once per output frame, so it gets at most \
+            one duty write per PWM period. The steps follow the frame \
+            period on average, but are not phase locked to the PWM output.
+        Servos in a move_group share one progress value per call and \
+            are placed with a single multiply each.
+        It calculates the next angle from the step speed and the motion \
+            profile of each servo in integer maths, and applies the PWM \
+            duty cycle.
 
         Example:
             >>> # Call timing_proc in the main loop to update servo positions.
             >>> servos.timing_proc()
         """
-        for servo_idx in range(4):
-            if self.servos_info_map[servo_idx]["step_en"] is False:
+        active = self.step_mask
+        if not active:
+            return
+        elapsed = self.skip_ns + TICK_NS
+        if elapsed < self.wait_ns:
+            self.skip_ns = elapsed
+            return
+        self.skip_ns = 0
+
+        frac = 0
+        if self.group_mask:
+            self.group_elapsed += elapsed // TICK_NS
+            if self.group_elapsed >= self.group_duration:
+                frac = 1 << GROUP_FRAC_SHIFT
+            else:
+                frac = (self.group_elapsed << GROUP_FRAC_SHIFT) // \
+                    self.group_duration
+
+        wait = 1000000000
+        for i in range(4):
+            if not active & (1 << i):
+                continue
+            rem = self.frame_rem[i] - elapsed
+            if rem > 0:
+                self.frame_rem[i] = rem
+                if rem < wait:
+                    wait = rem
+                continue
+            rem += self.period_ns[i]
+            self.frame_rem[i] = rem
+            if rem < wait:
+                wait = rem
+            mode = self.step_en[i]
+
+            if mode == STEP_GROUP:
+                if frac >> GROUP_FRAC_SHIFT:
+                    pos = self.tar_pos[i]
+                    self._step_stop(i)
+                    self.group_mask &= ~(1 << i)
+                else:
+                    pos = self.group_start[i] + \
+                        (self.group_delta[i] * frac >> GROUP_FRAC_SHIFT)
+                self.cur_pos[i] = pos
+                self._write_duty(i, self._pos_to_ns(i, pos))
                 continue
 
-            c_ang = self.servos_info_map[servo_idx]["c_ang"]
-            s_ang = self.servos_info_map[servo_idx]["s_ang"]
-            velocity = self.servos_info_map[servo_idx]["vel"]
-            interval = s_ang - c_ang
-
-            if interval != 0 and velocity != 0:
-                angle = 0
-                if interval > 0:
-                    angle = c_ang + (velocity / 100 * self.sensitivity)
-                    angle = angle if angle <= s_ang else s_ang
-                elif interval < 0:
-                    angle = c_ang - (velocity / 100 * self.sensitivity)
-                    angle = angle if angle >= s_ang else s_ang
+            pos = self.cur_pos[i]
+            tar = self.tar_pos[i]
+            vmax = self.vel[i] * self.rate[i] // 100
+            profile = self.profile[i]
+            if profile == PROFILE_CONSTANT:
+                remain = tar - pos
+                if remain == 0:
+                    self._step_stop(i)
+                    continue
+                if vmax == 0:
+                    continue
+                if -vmax <= remain <= vmax:
+                    pos = tar
+                    self._step_stop(i)
+                elif remain > 0:
+                    pos += vmax
                 else:
-                    self.servos_info_map[servo_idx]["rh_ang"] = s_ang
-                    self.servos_info_map[servo_idx]["step_en"] = False
+                    pos -= vmax
+            else:
+                if vmax == 0:
                     continue
+                if profile == PROFILE_SCURVE:
+                    ref = self._trapezoid_step(i, self.ref_pos[i], vmax)
+                    self.ref_pos[i] = ref
+                    pos = self._smooth(i, ref)
+                    if pos == tar and ref == tar:
+                        self._step_stop(i)
+                else:
+                    pos = self._trapezoid_step(i, pos, vmax)
+                    if pos == tar:
+                        self._step_stop(i)
+            self.cur_pos[i] = pos
 
-                self.servos_info_map[servo_idx]["c_ang"] = angle
-
-                duty = (int)(angle * 102 / 180 + 25)
-                self.servos_map[servo_idx].duty(duty)
+            self._write_duty(i, self._pos_to_ns(i, pos))
+        self.wait_ns = wait
 
     def stop(self, servo_idx):
         """
@@ -281,7 +746,7 @@ class ServosController:
         internal_idx = servo_idx - 1
 
         if 0 <= internal_idx < len(self.servos_map):
-            self.servos_map[internal_idx].duty(0)
+            self._write_duty(internal_idx, 0)
         else:
             raise ValueError(
                 "[servo]Invalid servo index. Must be between 1 and 4.")
@@ -0,0 +1,115 @@
+"""
+Host test setup for src/app_rc.
+
+The MicroPython modules the receiver imports (machine, utime, uasyncio,
+ulogger) are replaced by the stand-ins in tests/host, and the clock only
+moves when a test advances it.
+"""
+
+import builtins
+import copy
+import gc
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_RC = os.path.join(HERE, os.pardir, "src", "app_rc")
+sys.path[:0] = [os.path.join(HERE, "host"), APP_RC,
+                os.path.join(APP_RC, "app")]
+
+# MicroPython only extras
+builtins.List = list
+if not hasattr(gc, "mem_free"):
+    gc.mem_free = lambda: 100000
+    gc.mem_alloc = lambda: 50000
+    gc.threshold = lambda *args: None
+
+import utime  # noqa: E402
+
+
+def _ev(event_type, actuator, values, **kwargs):
+    event = {"type": event_type, "actuator": actuator, "receiver": 1,
+             "set_value": values}
+    event.update(kwargs)
+    return event
+
+
+def _ch(controls=(), events=()):
+    return {"data": {"deadzone": 100, "mid_value": 2048},
+            "controls": list(controls), "event": list(events)}
+
+
+RC_CONFIG = {
+    "sender": {"channels": [
+        _ch([{"receiver": 1, "actuator": "MOTOR1",
+              "direction": "positive"}]),
+        _ch([{"receiver": 1, "actuator": "PWM1", "direction": "positive"},
+             {"receiver": 1, "actuator": "MOTOR2",
+              "direction": "negative"}]),
+        _ch([{"receiver": 1, "actuator": "PWM2",
+              "direction": "positive"}]),
+        None, None, None,
+        {"event": [_ev("short", "PWM3", [90]), _ev("long", "MOTOR2", [50]),
+                   _ev("double", "PWM3", [30])]},
+        {"event": [_ev("short", "PWM4", [10])]},
+        {"event": [_ev("chord", "PWM4", [170], keys=[3, 4])]},
+        None]},
+    "receiver_1": {
+        "PWM1": {"initial_value": 90, "speed": 0, "min_value": 0,
+                 "max_value": 180, "type": "angle"},
+        "PWM2": {"initial_value": 0, "speed": 0, "min_value": -100,
+                 "max_value": 100, "type": "speed"},
+        "PWM3": {"initial_value": 90, "speed": 0, "min_value": 0,
+                 "max_value": 180, "type": "angle"},
+        "PWM4": {"initial_value": 90, "speed": 0, "min_value": 0,
+                 "max_value": 180, "type": "angle"},
+        "MOTOR1": {"bias": 0, "min_value": 100, "max_value": 100},
+        "MOTOR2": {"bias": 0, "min_value": 100, "max_value": 100},
+    }}
+
+CENTRED = [2048] * 6 + [1, 1, 1, 1]
+
+
+def _reset_singletons():
+    for name in list(sys.modules):
+        module = sys.modules[name]
+        if not getattr(module, "__file__", None) or \
+                not os.path.abspath(module.__file__).startswith(
+                    os.path.abspath(APP_RC)):
+            continue
+        for value in vars(module).values():
+            if isinstance(value, type) and "_instance" in vars(value):
+                value._instance = None
+
+
+@pytest.fixture
+def rc_config():
+    return copy.deepcopy(RC_CONFIG)
+
+
+@pytest.fixture
+def make_setting():
+    def make(config=None):
+        from parser import DataParser
+        parser = DataParser()
+        parser.set_slave_idx(1)
+        return parser.parse(copy.deepcopy(config or RC_CONFIG))
+    return make
+
+
+@pytest.fixture
+def controller():
+    _reset_singletons()
+    from control import BBL_Controller
+    return BBL_Controller()
+
+
+@pytest.fixture
+def run_frame():
+    def run(controller, setting, frame, ms=20):
+        utime.advance(ms)
+        controller.handler(setting, 1, frame)
+        controller.commit()
+    return run
@@ -0,0 +1,112 @@
+"""Host stand-in for the parts of the MicroPython machine module in use."""
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, n, mode=None, *args, **kwargs):
+        self.n = n
+        self.v = 1
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def on(self):
+        self.v = 1
+
+    def off(self):
+        self.v = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self.v
+        self.v = v
+
+
+class PWM:
+    def __init__(self, pin, freq=50, duty=0):
+        self.pin = pin
+        self._freq = freq
+        self._duty_ns = 0
+
+    def freq(self, freq=None):
+        if freq is None:
+            return self._freq
+        self._freq = freq
+
+    def duty(self, duty=None):
+        if duty is None:
+            return self._duty_ns * 1024 * self._freq // 1000000000
+        self._duty_ns = duty * 1000000000 // (1024 * self._freq)
+
+    def duty_ns(self, duty_ns=None):
+        if duty_ns is None:
+            return self._duty_ns
+        self._duty_ns = duty_ns
+
+    def duty_u16(self, duty=None):
+        pass
+
+    def deinit(self):
+        pass
+
+
+class Timer:
+    PERIODIC = 1
+    ONE_SHOT = 0
+
+    def __init__(self, n):
+        self.callback = None
+
+    def init(self, **kwargs):
+        self.callback = kwargs.get("callback")
+
+    def deinit(self):
+        self.callback = None
+
+
+class _Mem32:
+    def __init__(self):
+        self.regs = {}
+        # Set to a list to record the (addr, value) stores
+        self.writes = None
+
+    def __setitem__(self, addr, value):
+        self.regs[addr] = value
+        if self.writes is not None:
+            self.writes.append((addr, value))
+
+    def __getitem__(self, addr):
+        return self.regs.get(addr, 0)
+
+
+mem32 = _Mem32()
+
+
+def bitstream(*args):
+    pass
+
+
+def disable_irq():
+    return 1
+
+
+def enable_irq(state):
+    pass
+
+
+def reset():
+    raise SystemExit("machine.reset()")
+
+
+def reset_cause():
+    return 0
+
+
+def lightsleep(ms=0):
+    pass
+
+
+def idle():
+    pass
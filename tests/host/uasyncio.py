@@ -0,0 +1,15 @@
+"""Host stand-in for uasyncio, sleeping on the utime stand-in clock."""
+
+from asyncio import *  # noqa: F401,F403
+import asyncio
+import utime
+
+
+async def sleep(s):
+    utime.sleep(s)
+    await asyncio.sleep(0)
+
+
+async def sleep_ms(ms):
+    utime.sleep_ms(ms)
+    await asyncio.sleep(0)
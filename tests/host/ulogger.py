@@ -0,0 +1,37 @@
+"""Host stand-in for ulogger that keeps the messages for inspection."""
+
+DEBUG = 10
+INFO = 20
+WARN = 30
+ERROR = 40
+TO_TERM = 0
+TO_FILE = 1
+
+records = []
+
+
+class BaseClock:
+    def __call__(self):
+        return ""
+
+
+class Handler:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class Logger:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def debug(self, msg):
+        records.append((DEBUG, msg))
+
+    def info(self, msg):
+        records.append((INFO, msg))
+
+    def warn(self, msg):
+        records.append((WARN, msg))
+
+    def error(self, msg):
+        records.append((ERROR, msg))
@@ -0,0 +1,41 @@
+"""Host stand-in for utime, driven by advance() instead of the wall clock."""
+
+_TICKS_MAX = 0x3fffffff
+_now_us = [0]
+
+
+def advance(ms):
+    _now_us[0] += ms * 1000
+
+
+def advance_us(us):
+    _now_us[0] += us
+
+
+def ticks_ms():
+    return (_now_us[0] // 1000) & _TICKS_MAX
+
+
+def ticks_us():
+    return _now_us[0] & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(a, b):
+    d = (a - b) & _TICKS_MAX
+    return d - (_TICKS_MAX + 1) if d > (_TICKS_MAX >> 1) else d
+
+
+def sleep(s):
+    advance(int(s * 1000))
+
+
+def sleep_ms(ms):
+    advance(ms)
+
+
+def sleep_us(us):
+    advance_us(us)
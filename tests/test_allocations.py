@@ -0,0 +1,71 @@
+"""
+The control path must not allocate per frame, the GC pauses it causes
+show up as jitter on the outputs.
+"""
+
+import gc
+import tracemalloc
+
+import utime
+from conftest import CENTRED
+
+FRAMES = 500
+INT_BLOCK_SIZE = 32
+
+
+def _frames():
+    moving = [list(CENTRED) for _ in range(8)]
+    for i, frame in enumerate(moving):
+        frame[0] = 2048 + 200 * i
+        frame[1] = 2048 - 150 * i
+        frame[2] = 1000 + 300 * i
+    return moving
+
+
+def _run(controller, setting, frames, count):
+    for n in range(count):
+        utime.advance(20)
+        controller.handler(setting, 1, frames[n % len(frames)])
+        controller.commit()
+        utime.advance(1)
+        controller.timer0_callback(None)
+
+
+def _measure(controller, setting, frames):
+    # Warm up caches and the one-off buffers first
+    _run(controller, setting, frames, FRAMES)
+    gc.collect()
+    objects = len(gc.get_objects())
+    _run(controller, setting, frames, FRAMES)
+    gc.collect()
+    objects = len(gc.get_objects()) - objects
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    _run(controller, setting, frames, FRAMES)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # CPython boxes ints above 256, MicroPython keeps them as small ints,
+    # so only blocks larger than an int count. A one-off block is fine,
+    # anything kept per frame shows up hundreds of times.
+    growth = 0
+    for stat in after.compare_to(before, "lineno"):
+        if "app_rc" in stat.traceback[0].filename and \
+                stat.count_diff >= FRAMES // 10 and \
+                stat.size_diff > stat.count_diff * INT_BLOCK_SIZE:
+            growth += stat.size_diff
+    return objects, growth
+
+
+def test_moving_frames_do_not_grow_the_heap(controller, make_setting):
+    setting = make_setting()
+    objects, growth = _measure(controller, setting, _frames())
+    assert objects <= 0
+    assert growth <= 0
+
+
+def test_unchanged_frames_do_not_grow_the_heap(controller, make_setting):
+    setting = make_setting()
+    objects, growth = _measure(controller, setting, [list(CENTRED)])
+    assert objects <= 0
+    assert growth <= 0
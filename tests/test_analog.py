@@ -0,0 +1,201 @@
+import utime
+from conftest import CENTRED
+
+from control import AnalogCrossDetector, AnalogZoneDetector, ANALOG_EQUAL, \
+    ANALOG_BELOW, ANALOG_ABOVE
+
+
+def _detector(band=40, dwell_ms=40):
+    detector = AnalogCrossDetector()
+    for ch_idx in range(6):
+        detector.set_hysteresis(ch_idx, band)
+        detector.set_dwell(ch_idx, dwell_ms)
+    return detector
+
+
+def _feed(detector, value, ms=20, ch_idx=0):
+    utime.advance(ms)
+    values = [0] * 6
+    values[ch_idx] = value
+    return detector.update(values)
+
+
+def test_state_leaves_centre_only_past_the_band():
+    detector = _detector(dwell_ms=0)
+    assert _feed(detector, 40) == 0
+    assert detector.get_state(0) == ANALOG_EQUAL
+    assert _feed(detector, 41) == 3
+    assert detector.get_state(0) == ANALOG_ABOVE
+    assert _feed(detector, -40) == 0
+    assert detector.get_state(0) == ANALOG_ABOVE
+    assert _feed(detector, -41) == 3
+    assert detector.get_state(0) == ANALOG_BELOW
+
+
+def test_state_returns_only_in_the_deadzone():
+    detector = _detector(dwell_ms=0)
+    _feed(detector, 500)
+    # Inside the band but outside the deadzone keeps the state
+    for value in (40, 1, -1, -40):
+        assert _feed(detector, value) == 0
+        assert detector.get_state(0) == ANALOG_ABOVE
+    assert _feed(detector, 0) == 3
+    assert detector.get_state(0) == ANALOG_EQUAL
+
+
+def test_state_is_reported_after_the_dwell():
+    detector = _detector(dwell_ms=40)
+    assert _feed(detector, 500) == 0
+    assert detector.pending_mask == 3
+    assert _feed(detector, 500, 39) == 0
+    assert _feed(detector, 500, 1) == 3
+    assert detector.get_state(0) == ANALOG_ABOVE
+    assert detector.pending_mask == 0
+
+
+def test_jitter_shorter_than_the_dwell_is_dropped():
+    detector = _detector(dwell_ms=40)
+    for value in (500, 0, 500, 0, 500, 0):
+        assert _feed(detector, value) == 0
+    assert detector.get_state(0) == ANALOG_EQUAL
+    assert detector.pending_mask == 0
+
+
+def test_new_candidate_restarts_the_dwell():
+    detector = _detector(dwell_ms=40)
+    _feed(detector, 500)
+    _feed(detector, 500)
+    # Flipping to the other side waits a full dwell again
+    assert _feed(detector, -500) == 0
+    assert _feed(detector, -500, 39) == 0
+    assert _feed(detector, -500, 1) == 3
+    assert detector.get_state(0) == ANALOG_BELOW
+
+
+def test_channels_are_tracked_apart():
+    detector = _detector(dwell_ms=0)
+    utime.advance(20)
+    changed = detector.update([500, 0, -500, 0, 20, -500])
+    assert changed == 3 | 3 << 4 | 3 << 10
+    assert [detector.get_state(i) for i in range(6)] == \
+        [ANALOG_ABOVE, ANALOG_EQUAL, ANALOG_BELOW, ANALOG_EQUAL,
+         ANALOG_EQUAL, ANALOG_BELOW]
+
+
+def test_negative_settings_clamp_to_zero():
+    detector = _detector(band=-5, dwell_ms=-5)
+    assert list(detector.hysteresis) == [0] * 6
+    assert list(detector.dwell) == [0] * 6
+    assert _feed(detector, 1) == 3
+
+
+def test_reset_returns_to_centre_without_a_change():
+    detector = _detector(dwell_ms=40)
+    _feed(detector, 500)
+    _feed(detector, 500, 40)
+    _feed(detector, -500, 20, ch_idx=1)
+    detector.reset()
+    assert detector.get_state(0) == ANALOG_EQUAL
+    assert detector.pending_mask == 0
+    # A centred stick reports nothing after the reset
+    assert _feed(detector, 0) == 0
+
+
+def test_controller_reinit_resets_the_detector(controller, make_setting,
+                                               run_frame):
+    setting = make_setting()
+    pushed = [4000] + [2048] * 5 + [1, 1, 1, 1]
+    for _ in range(4):
+        run_frame(controller, setting, list(pushed))
+    assert controller.analog_detector.get_state(0) == ANALOG_ABOVE
+
+    controller.reinit()
+    assert controller.analog_detector.get_state(0) == ANALOG_EQUAL
+
+    # The held stick is reported again under the reloaded setting
+    setting = make_setting()
+    for _ in range(4):
+        run_frame(controller, setting, list(pushed))
+    assert controller.analog_detector.get_state(0) == ANALOG_ABOVE
+    run_frame(controller, setting, list(CENTRED))
+    run_frame(controller, setting, list(CENTRED), 40)
+    assert controller.analog_detector.get_state(0) == ANALOG_EQUAL
+
+
+def _zones(thresholds, ch_idx=0):
+    detector = AnalogZoneDetector()
+    detector.set_thresholds(ch_idx, thresholds)
+    return detector
+
+
+def test_find_zone_counts_thresholds_at_or_below():
+    thresholds = [-1024, -10, 0, 512, 2047]
+    detector = _zones(thresholds)
+    for value in range(-2048, 2049):
+        expected = len([t for t in thresholds if t <= value])
+        assert detector.find_zone(0, value) == expected, value
+
+
+def test_find_zone_boundaries():
+    detector = _zones([100, -100])
+    assert list(detector.thresholds[0]) == [-100, 100]
+    assert detector.find_zone(0, -2048) == 0
+    assert detector.find_zone(0, -101) == 0
+    assert detector.find_zone(0, -100) == 1
+    assert detector.find_zone(0, 99) == 1
+    assert detector.find_zone(0, 100) == 2
+    assert detector.find_zone(0, 2048) == 2
+
+
+def test_find_zone_single_and_repeated_thresholds():
+    detector = _zones([0])
+    assert detector.find_zone(0, -1) == 0
+    assert detector.find_zone(0, 0) == 1
+    detector.set_thresholds(1, [300, 300, 300])
+    assert detector.find_zone(1, 299) == 0
+    assert detector.find_zone(1, 300) == 3
+
+
+def test_zone_starts_at_the_centre():
+    detector = _zones([-500, 500, 1000])
+    assert detector.zone[0] == detector.last_zone[0] == 1
+    assert detector.update([0] * 6) == 0
+
+
+def test_update_reports_zone_changes():
+    detector = _zones([-500, 500, 1000])
+    detector.set_thresholds(2, [0])
+    assert detector.update([1500, 0, -1, 0, 0, 0]) == 1 << 0 | 1 << 2
+    assert (detector.last_zone[0], detector.zone[0]) == (1, 3)
+    assert (detector.last_zone[2], detector.zone[2]) == (1, 0)
+    # Moving within a zone is not a change
+    assert detector.update([1200, 0, -5, 0, 0, 0]) == 0
+    assert detector.update([-2048, 0, 0, 0, 0, 0]) == 1 << 0 | 1 << 2
+    assert (detector.last_zone[0], detector.zone[0]) == (3, 0)
+    assert (detector.last_zone[2], detector.zone[2]) == (0, 1)
+
+
+def test_channels_without_thresholds_are_skipped():
+    detector = AnalogZoneDetector()
+    assert detector.update([2048, -2048, 2048, -2048, 2048, -2048]) == 0
+    assert list(detector.zone) == [0] * 6
+
+
+def test_controller_zone_effects(controller, make_setting, run_frame,
+                                 rc_config):
+    def event(zone_type, angle):
+        return {"type": zone_type, "threshold": 50, "actuator": "PWM3",
+                "receiver": 1, "set_value": [angle]}
+
+    rc_config["sender"]["channels"][3] = {
+        "data": {"deadzone": 100, "mid_value": 2048}, "controls": [],
+        "event": [event("gt_thr", 45), event("lt_thr", 135)]}
+    setting = make_setting(rc_config)
+    frame = list(CENTRED)
+    run_frame(controller, setting, list(frame))
+    frame[3] = 4095
+    run_frame(controller, setting, list(frame))
+    assert controller.servos_effect_data_list[2] // 10 == 45
+    frame[3] = 2048
+    run_frame(controller, setting, list(frame))
+    assert controller.servos_effect_data_list[2] // 10 == 135
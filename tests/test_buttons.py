@@ -0,0 +1,100 @@
+import ulogger
+import utime
+
+from control import ButtonHandler
+
+KEY1 = 1 << 0
+KEY3 = 1 << 2
+KEY4 = 1 << 3
+
+
+def _handler(double_mask=KEY1):
+    handler = ButtonHandler()
+    events = []
+    for name in ("long", "short", "press_down", "release", "double"):
+        getattr(handler, f"{name}_callback_register")(
+            lambda i, name=name: events.append((name, i)))
+    handler.chord_callback_register(lambda i: events.append(("chord", i)))
+    handler.set_double_mask(double_mask)
+    handler.set_chords([KEY3 | KEY4])
+    return handler, events
+
+
+def _step(handler, mask, ms=20):
+    utime.advance(ms)
+    handler.check_mask(mask)
+
+
+def _only(events, *names):
+    return [e for e in events if e[0] in names]
+
+
+def test_double_click_reports_no_short():
+    handler, events = _handler()
+    for mask in (KEY1, 0, KEY1, 0):
+        _step(handler, mask, 50)
+    for _ in range(30):
+        _step(handler, 0)
+    assert _only(events, "short", "double") == [("double", 0)]
+
+
+def test_single_click_reports_short_after_double_window():
+    handler, events = _handler()
+    _step(handler, KEY1, 50)
+    _step(handler, 0, 50)
+    _step(handler, 0, handler.double_thr)
+    assert _only(events, "short") == []
+    _step(handler, 0)
+    assert _only(events, "short", "double") == [("short", 0)]
+
+
+def test_short_without_double_event_is_not_delayed():
+    handler, events = _handler(double_mask=0)
+    _step(handler, KEY1, 50)
+    _step(handler, 0, 50)
+    assert _only(events, "short") == [("short", 0)]
+
+
+def test_chord_replaces_member_key_events():
+    handler, events = _handler()
+    _step(handler, KEY3)
+    _step(handler, KEY3 | KEY4)
+    for _ in range(100):
+        _step(handler, KEY3 | KEY4)
+    _step(handler, KEY3)
+    _step(handler, 0)
+    for _ in range(30):
+        _step(handler, 0)
+    # Only the press of KEY3 went out before the chord, its release pairs
+    # with it and nothing else of KEY3 or KEY4 is reported
+    assert events == [("press_down", 2), ("chord", 0), ("release", 2)]
+
+
+def test_chord_pressed_at_once_reports_only_the_chord():
+    handler, events = _handler()
+    _step(handler, KEY3 | KEY4)
+    _step(handler, 0)
+    for _ in range(30):
+        _step(handler, 0)
+    assert events == [("chord", 0)]
+    # The keys work alone again afterwards
+    _step(handler, KEY4)
+    _step(handler, 0)
+    assert events[1:] == [("press_down", 3), ("release", 3), ("short", 3)]
+
+
+def test_controller_double_click_posts_double_effect(controller,
+                                                     make_setting,
+                                                     run_frame):
+    setting = make_setting()
+    del ulogger.records[:]
+    pressed = [2048] * 6 + [0, 1, 1, 1]
+    released = [2048] * 6 + [1, 1, 1, 1]
+    for frame in (released, pressed, released, pressed, released):
+        run_frame(controller, setting, list(frame), 50)
+    for _ in range(30):
+        run_frame(controller, setting, list(released))
+    # key1 double sets PWM3 to 30, short would have set 90
+    assert controller.servos_effect_data_list[2] // 10 == 30
+    assert not [msg for _, msg in ulogger.records
+                if msg == "[CTRL]BTN:0 short"]
@@ -0,0 +1,73 @@
+import pytest
+import utime
+from conftest import CENTRED
+
+from control import StickCalibrator, CAL_PROPOSE, CAL_WINDOW_MS, \
+    CAL_MIN_FRAMES, CAL_DZ_MIN
+
+
+def _calibrating_setting(make_setting, mode="apply"):
+    setting = make_setting()
+    setting["sender"]["auto_calibrate"] = mode
+    return setting
+
+
+def test_resting_offset_is_learned(controller, make_setting, run_frame):
+    setting = _calibrating_setting(make_setting)
+    for i in range(130):
+        frame = list(CENTRED)
+        frame[0] = 2080 + (i & 1)
+        run_frame(controller, setting, frame)
+    assert controller.adc_mid_list[0] in (2080, 2081)
+    assert controller.adc_deadzone_list[0] < 100
+
+
+def test_held_deflection_is_not_learned(controller, make_setting, run_frame):
+    setting = _calibrating_setting(make_setting)
+    held = list(CENTRED)
+    held[0] = 2048 + 240
+    for _ in range(200):
+        run_frame(controller, setting, list(held))
+    assert controller.adc_mid_list[0] == 2048
+    assert controller.adc_deadzone_list[0] == 100
+
+    run_frame(controller, setting, list(CENTRED))
+    assert controller.mixer.out[0] == 0
+    assert controller.motors.speed[0] == 0
+
+
+def test_propose_leaves_the_config(controller, make_setting, run_frame):
+    setting = _calibrating_setting(make_setting, "propose")
+    frame = list(CENTRED)
+    frame[0] = 2080
+    for _ in range(130):
+        run_frame(controller, setting, list(frame))
+    assert controller.calibrator.mid[0] == 2080
+    assert controller.adc_mid_list[0] == 2048
+
+
+@pytest.mark.parametrize("period_ms", [10, 20, 100])
+def test_window_is_timed_not_counted(controller, make_setting, run_frame,
+                                     period_ms):
+    setting = _calibrating_setting(make_setting, "propose")
+    frame = list(CENTRED)
+    frame[0] = 2080
+    elapsed = 0
+    while elapsed < CAL_WINDOW_MS - period_ms:
+        run_frame(controller, setting, list(frame), period_ms)
+        elapsed += period_ms
+    assert not controller.calibrator.valid & 1
+
+    for _ in range(2):
+        run_frame(controller, setting, list(frame), period_ms)
+    assert controller.calibrator.mid[0] == 2080
+    assert controller.calibrator.deadzone[0] == CAL_DZ_MIN
+
+
+def test_too_few_frames_give_no_result():
+    calibrator = StickCalibrator()
+    calibrator.set_mode(CAL_PROPOSE)
+    for _ in range(CAL_MIN_FRAMES - 1):
+        assert calibrator.update([2048] * 6) == 0
+        utime.advance(CAL_WINDOW_MS)
+    assert calibrator.valid == 0
@@ -0,0 +1,97 @@
+import pytest
+from conftest import CENTRED
+
+from control import EffectStore, EFFECT_NONE, div_round
+
+INT32_MIN = -(1 << 31)
+INT32_MAX = (1 << 31) - 1
+
+
+def _cycle(store, slot, n):
+    return [store.next_effect(slot) for _ in range(n)]
+
+
+def test_empty_events_add_no_group():
+    store = EffectStore()
+    assert store.add_group([]) == EFFECT_NONE
+    assert store.add_group([[], []]) == EFFECT_NONE
+    assert store.add_group([["x", None, 1.5]]) == EFFECT_NONE
+    assert len(store.group_start) == 0 and len(store.slot_offset) == 0
+
+
+def test_groups_and_slots_are_laid_out_flat():
+    store = EffectStore()
+    assert store.add_group([[101, 201], [], [305]]) == 0
+    assert store.add_group([[7]]) == 1
+    assert list(store.effects) == [101, 201, 305, 7]
+    assert list(store.slot_offset) == [0, 2, 3]
+    assert list(store.slot_len) == [2, 1, 1]
+    assert list(store.group_start) == [0, 2]
+    assert list(store.group_len) == [2, 1]
+
+
+def test_non_int_effects_are_skipped():
+    store = EffectStore()
+    group = store.add_group([["a", 105, 2.0, 205]])
+    assert group == 0
+    assert _cycle(store, 0, 3) == [105, 205, 105]
+
+
+def test_cursor_wraps_per_slot():
+    store = EffectStore()
+    store.add_group([[1, 2, 3], [4]])
+    assert _cycle(store, 0, 7) == [1, 2, 3, 1, 2, 3, 1]
+    assert _cycle(store, 1, 3) == [4, 4, 4]
+    assert store.slot_cursor[0] == 1 and store.slot_cursor[1] == 0
+
+
+@pytest.mark.parametrize("effect", [0, -1, -100, -5001, INT32_MIN,
+                                    INT32_MAX, INT32_MIN + 1])
+def test_effect_values_round_trip(effect):
+    store = EffectStore()
+    store.add_group([[effect, 0]])
+    assert _cycle(store, 0, 3) == [effect, 0, effect]
+
+
+def test_negative_effects_keep_actuator_and_value():
+    store = EffectStore()
+    # MOTOR2 at -50 and PWM1 at -100, as the parser encodes them
+    store.add_group([[2 - 50 * 100, 5 - 100 * 100]])
+    effects = _cycle(store, 0, 2)
+    assert [(e % 100, e // 100) for e in effects] == [(2, -50), (5, -100)]
+
+
+def test_clear_drops_groups_and_cursors():
+    store = EffectStore()
+    store.add_group([[1, 2]])
+    store.next_effect(0)
+    store.clear()
+    assert len(store.effects) == 0 and len(store.slot_cursor) == 0
+    assert store.add_group([[9, 8]]) == 0
+    assert store.next_effect(0) == 9
+
+
+def test_slot_index_limit():
+    store = EffectStore()
+    # Offsets and cursors are unsigned 16 bit, the last slot still works
+    for effect in range(0xFFFF):
+        store.add_group([[effect]])
+    assert store.slot_offset[0xFFFE] == 0xFFFE
+    assert store.next_effect(0xFFFE) == 0xFFFE
+    assert store.group_start[0xFFFE] == 0xFFFE
+
+
+def test_controller_cycles_negative_motor_effects(controller, make_setting,
+                                                   run_frame, rc_config):
+    rc_config["sender"]["channels"][7] = {"event": [
+        {"type": "short", "actuator": "MOTOR1", "receiver": 1,
+         "set_value": [-50, -100, 25]}]}
+    setting = make_setting(rc_config)
+    pressed = list(CENTRED)
+    pressed[7] = 0
+    speeds = []
+    for _ in range(4):
+        run_frame(controller, setting, list(pressed), 50)
+        run_frame(controller, setting, list(CENTRED), 50)
+        speeds.append(controller.motors_effect_speed_list[0])
+    assert speeds == [div_round(2047 * v, 100) for v in (-50, -100, 25, -50)]
@@ -0,0 +1,116 @@
+import time
+
+import pytest
+import utime
+
+from control import AnalogInputFilter, FILTER_IIR, FILTER_MEDIAN, \
+    FILTER_RATE, FILTER_NONE, FILTER_TICK_MS
+
+
+def _filter(kind, param=0):
+    f = AnalogInputFilter()
+    for ch_idx in range(6):
+        f.set_filter(ch_idx, kind, param)
+    return f
+
+
+def _run(f, values, period_ms, total_ms):
+    out = None
+    for _ in range(total_ms // period_ms):
+        utime.advance(period_ms)
+        out = list(values)
+        f.update(out)
+    return out
+
+
+def _primed(kind, param, start):
+    f = _filter(kind, param)
+    f.update([start] * 6)
+    return f
+
+
+def test_iir_follows_a_step_in_time_not_frames():
+    results = []
+    for period_ms in (10, 20, 100):
+        f = _primed(FILTER_IIR, 2, 1000)
+        results.append(_run(f, [3000] * 6, period_ms, 200)[0])
+    # 20 steps of a quarter of the gap, whatever the frame period
+    expected = 3000 - int(2000 * 0.75 ** 20 + 0.5)
+    assert results == [expected] * 3
+
+
+def test_iir_keeps_the_remainder_of_short_frames():
+    f = _primed(FILTER_IIR, 1, 0)
+    out = None
+    # 4ms frames, 5 steps of 10ms in 50ms
+    for _ in range(50 // 4):
+        utime.advance(4)
+        out = [2048] * 6
+        f.update(out)
+    utime.advance(2)
+    out = [2048] * 6
+    f.update(out)
+    assert out[0] == 2048 - (2048 >> 5)
+
+
+def test_iir_settles_on_the_input():
+    f = _primed(FILTER_IIR, 8, 4095)
+    out = _run(f, [0] * 6, 100, 30000)
+    assert out[0] == 0
+
+
+def test_median_drops_single_frame_spikes():
+    f = _primed(FILTER_MEDIAN, 0, 2048)
+    outs = []
+    for x in (2048, 4095, 2048, 2050, 0, 2052, 2054):
+        utime.advance(20)
+        values = [x] * 6
+        f.update(values)
+        outs.append(values[0])
+    assert outs == [2048, 2048, 2048, 2050, 2048, 2050, 2052]
+
+
+@pytest.mark.parametrize("period_ms", [10, 20, 100])
+def test_rate_limit_is_per_time(period_ms):
+    f = _primed(FILTER_RATE, 8, 2048)
+    out = _run(f, [4095] * 6, period_ms, 500)
+    assert out[0] == 2048 + 8 * 500 // FILTER_TICK_MS
+    out = _run(f, [2000] * 6, period_ms, 1000)
+    assert out[0] == 2000
+
+
+def test_long_gap_catches_up_bounded():
+    f = _primed(FILTER_RATE, 8, 0)
+    utime.advance(10000)
+    values = [4095] * 6
+    f.update(values)
+    assert values[0] == 8 * 16
+
+
+def test_reset_and_none_pass_values_through():
+    f = _primed(FILTER_RATE, 1, 0)
+    f.set_filter(1, FILTER_NONE)
+    f.reset()
+    utime.advance(10)
+    values = [4000] * 6
+    f.update(values)
+    assert values == [4000] * 6
+
+
+@pytest.mark.parametrize("kind,param", [(FILTER_NONE, 0), (FILTER_IIR, 4),
+                                        (FILTER_MEDIAN, 0),
+                                        (FILTER_RATE, 16)])
+def test_filter_cost_benchmark(kind, param):
+    # Host timing only, it shows the relative cost of the filters and
+    # catches a blow up, not the time on the board
+    f = _primed(kind, param, 2048)
+    values = [2048] * 6
+    frames = 2000
+    start = time.perf_counter_ns()
+    for i in range(frames):
+        utime.advance(20)
+        values[0] = 1024 + (i & 1023)
+        f.update(values)
+    per_frame_us = (time.perf_counter_ns() - start) / frames / 1000
+    print(f"filter {kind}: {per_frame_us:.1f}us per frame")
+    assert per_frame_us < 200
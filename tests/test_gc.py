@@ -0,0 +1,115 @@
+import gc
+
+import pytest
+import uasyncio
+import utime
+from conftest import _reset_singletons
+
+from runtime import GCPolicy, GC_PAUSE_DEFAULT_US
+
+
+class _Heap:
+    def __init__(self, monkeypatch):
+        self.alloc = 50000
+        self.free = 100000
+        self.collects = 0
+        monkeypatch.setattr(gc, "mem_alloc", lambda: self.alloc)
+        monkeypatch.setattr(gc, "mem_free", lambda: self.free)
+        monkeypatch.setattr(gc, "collect", self.collect)
+
+    def collect(self):
+        self.collects += 1
+        # A collection takes 3ms
+        utime.advance_us(3000)
+
+
+@pytest.fixture
+def heap(monkeypatch):
+    _reset_singletons()
+    return _Heap(monkeypatch)
+
+
+def test_idle_collects_after_the_threshold(heap):
+    policy = GCPolicy(collect_bytes=10000)
+    start = heap.collects
+    heap.alloc += 9999
+    assert not policy.idle(20)
+    heap.alloc += 1
+    assert policy.idle(20)
+    assert heap.collects == start + 1
+    # Counted again from the heap after the collection
+    assert not policy.idle(20)
+
+
+def test_request_collects_at_the_next_idle_slot(heap):
+    policy = GCPolicy(collect_bytes=10000)
+    start = heap.collects
+    policy.request()
+    assert heap.collects == start
+    assert policy.idle(20)
+    assert heap.collects == start + 1
+    assert not policy.pending
+    assert not policy.idle(20)
+
+
+def test_idle_waits_for_enough_slack(heap):
+    policy = GCPolicy(collect_bytes=10000)
+    policy.request()
+    # Nothing measured yet, the default pause is assumed
+    assert not policy.idle(GC_PAUSE_DEFAULT_US // 1000)
+    assert policy.idle(GC_PAUSE_DEFAULT_US // 1000 + 1)
+    assert policy.get_stats()[:3] == (1, 3000, 3000)
+
+    # Then the measured pause counts
+    policy.request()
+    assert not policy.idle(3)
+    assert policy.pending
+    assert policy.idle(4)
+
+
+def test_collect_is_forced_and_recorded(heap):
+    policy = GCPolicy(collect_bytes=10000)
+    heap.free = 20000
+    start = heap.collects
+    assert policy.collect() == 3000
+    assert heap.collects == start + 1
+    count, last_us, max_us, min_free = policy.get_stats()
+    assert (count, last_us, max_us, min_free) == (1, 3000, 3000, 20000)
+
+    heap.free = 60000
+    policy.reset_stats()
+    assert policy.get_stats() == (0, 0, 0, 60000)
+
+
+def test_executor_collects_before_compiling(heap, monkeypatch):
+    import bbl.executor
+    from bbl.executor import CommandExecutor
+
+    policy = GCPolicy(collect_bytes=1 << 20)
+    executor = CommandExecutor(log_info=lambda *args: None)
+    executor.register_gc_cb(policy.request, policy.collect)
+
+    order = []
+    real_exec = exec
+
+    def recording_exec(code, env):
+        order.append(("compile", heap.collects))
+        real_exec(code, env)
+
+    monkeypatch.setattr(bbl.executor, "exec", recording_exec, raising=False)
+    start = heap.collects
+    executor.run("x = 1\ny = 2")
+
+    async def drive():
+        task = uasyncio.create_task(executor.block_handle())
+        for _ in range(20):
+            await uasyncio.sleep_ms(50)
+        task.cancel()
+
+    uasyncio.run(drive())
+    # The per-line collections were only requested, the one before the
+    # compile ran at once and covers them
+    assert order == [("compile", start + 1)]
+    assert heap.collects == start + 1
+    assert not policy.pending
+    assert executor.get_status() == "DONE"
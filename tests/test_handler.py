@@ -0,0 +1,34 @@
+from conftest import CENTRED
+
+
+def _outputs(controller):
+    return (list(controller.motors.speed), list(controller.servos.tar_pos),
+            list(controller.mixer.out))
+
+
+def test_handler_leaves_frame_untouched(controller, make_setting, run_frame):
+    setting = make_setting()
+    frame = [3000, 1000, 2500] + [2048] * 3 + [1, 1, 1, 1]
+    raw = list(frame)
+    run_frame(controller, setting, frame)
+    assert frame == raw
+
+
+def test_same_frame_twice_gives_same_outputs(controller, make_setting,
+                                             run_frame):
+    setting = make_setting()
+    run_frame(controller, setting, list(CENTRED))
+    frame = [3000, 1000, 2500] + [2048] * 3 + [1, 1, 1, 1]
+
+    run_frame(controller, setting, frame)
+    first = _outputs(controller)
+    assert first[0][0] > 0
+
+    # Unchanged frame path
+    run_frame(controller, setting, frame)
+    assert _outputs(controller) == first
+
+    # Full frame on the same buffer, as after an overrun or config reload
+    controller.update_setting(setting)
+    run_frame(controller, setting, frame)
+    assert _outputs(controller) == first
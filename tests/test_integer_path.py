@@ -0,0 +1,134 @@
+"""
+The integer control path against the float code it replaced, across the
+whole ADC range. The old results are rounded or truncated once at the
+end, the new ones at every division, so they may differ by one unit.
+"""
+
+import pytest
+
+from control import Mixer, MIX_IN_NUM
+
+ADC_MAX = 4096
+ADC_SETTINGS = [(2048, 200), (2048, 0), (1900, 150), (2200, 50),
+                (2048, 2000)]
+
+
+def _old_adc(x, max=4096, mid=2048, dz=200):
+    def convert(x, i_min, i_max, o_min, o_max):
+        return (x - i_min) * (o_max - o_min) / (i_max - i_min) + o_min
+
+    if mid - dz <= x <= mid + dz:
+        return 0
+    m_mid = max / 2
+    if x <= mid:
+        return convert(x, 0, mid - dz, -m_mid, 0)
+    return convert(x, mid + dz, max, 0, m_mid)
+
+
+def _old_motor(rc, bias, min_val, max_val):
+    bias = bias * 2048 / 100
+    if rc + bias >= 0:
+        return abs(min(max(int((rc + bias) * max_val / 100), -2047), 2047))
+    return -abs(min(max(int((rc + bias) * min_val / 100), -2047), 2047))
+
+
+def _old_pwm_speed(rc, min_val, max_val):
+    rc = rc * (min_val if rc <= 0 else max_val) / 2048
+    return round(min(max(rc, -100), 100))
+
+
+def _old_pwm_angle(rc, min_val, max_val):
+    rc = rc * (max_val - min_val) / 4096 + (max_val + min_val) / 2
+    return round(min(max(rc, 0), 180))
+
+
+def _old_nonlinear(set_speed, dead_zone, low_pct, rate):
+    speed = abs(set_speed)
+    if speed < dead_zone:
+        return 0
+    speed = min(speed, 2047)
+    threshold = dead_zone + (2048 - 2 * dead_zone) * low_pct
+    value = min(speed, threshold - 1)
+    if value <= dead_zone + 1:
+        tracker = 0
+    elif value >= threshold:
+        tracker = 2047
+    else:
+        tracker = int(rate * (value - dead_zone) ** 2 /
+                      (2 * (threshold - dead_zone)))
+    if speed >= threshold:
+        tracker = tracker + (speed - threshold) * rate
+    tracker = min(tracker, 2047)
+    return int(tracker if set_speed >= 0 else -tracker)
+
+
+def _mixer(motor, pwm1, pwm2):
+    # Input 0 drives every output, at full weight
+    weights = [0] * (MIX_IN_NUM * 6)
+    for o in range(6):
+        weights[o * MIX_IN_NUM] = 100
+    mixer = Mixer()
+    mixer.load({"mix": weights, "expo": [0] * MIX_IN_NUM},
+               {"motor": [motor, motor],
+                "pwm": [pwm1, pwm2, [0, 0, 0, 0, ""], [0, 0, 0, 0, ""]]})
+    return mixer
+
+
+@pytest.mark.parametrize("mid,dz", ADC_SETTINGS)
+def test_adc_value_deal_matches_float(controller, mid, dz):
+    for x in range(ADC_MAX + 1):
+        new = controller.adc_value_deal(x, ADC_MAX, mid, dz)
+        assert isinstance(new, int)
+        assert abs(new - _old_adc(x, ADC_MAX, mid, dz)) <= 0.5, x
+
+
+@pytest.mark.parametrize("mid,dz", ADC_SETTINGS)
+def test_adc_value_deal_deadzone_edges(controller, mid, dz):
+    lo = mid - dz
+    hi = mid + dz
+    assert controller.adc_value_deal(lo, ADC_MAX, mid, dz) == 0
+    assert controller.adc_value_deal(hi, ADC_MAX, mid, dz) == 0
+    assert controller.adc_value_deal(0, ADC_MAX, mid, dz) == -ADC_MAX // 2
+    assert controller.adc_value_deal(ADC_MAX, ADC_MAX, mid, dz) == \
+        ADC_MAX // 2
+    # One step outside the deadzone rounds to the nearest unit and never
+    # jumps the sign, whatever the slope
+    for x, sign in ((lo - 1, -1), (hi + 1, 1)):
+        if not 0 <= x <= ADC_MAX:
+            continue
+        new = controller.adc_value_deal(x, ADC_MAX, mid, dz)
+        old = _old_adc(x, ADC_MAX, mid, dz)
+        assert new * sign >= 0
+        assert new == int(old + 0.5 * sign)
+
+
+@pytest.mark.parametrize("motor,pwm1,pwm2", [
+    ([0, 100, 100], [0, 0, 100, 100, "speed"], [0, 0, 0, 180, "angle"]),
+    ([10, 60, 80], [0, 0, 30, 70, "speed"], [0, 0, 20, 150, "angle"]),
+    ([-25, 100, 40], [0, 0, 100, 50, "speed"], [0, 0, 45, 135, "angle"]),
+])
+def test_mixer_matches_float(controller, motor, pwm1, pwm2):
+    mixer = _mixer(motor, pwm1, pwm2)
+    inputs = [0] * MIX_IN_NUM
+    for x in range(ADC_MAX + 1):
+        rc = controller.adc_value_deal(x, ADC_MAX, 2048, 200)
+        inputs[0] = rc
+        mixer.evaluate(inputs)
+        out = mixer.out
+        assert abs(out[0] - _old_motor(rc, *motor)) <= 1, x
+        assert abs(out[2] - _old_pwm_speed(rc, pwm1[2], pwm1[3])) <= 1, x
+        assert abs(out[3] - _old_pwm_angle(rc, pwm2[2], pwm2[3])) <= 1, x
+        # Both sides of the deadzone stop the outputs
+        if rc == 0:
+            assert out[2] == 0
+            assert out[3] == (pwm2[2] + pwm2[3] + 1) // 2
+
+
+@pytest.mark.parametrize("low_pct,rate", [(50, 1.5), (20, 1.0), (80, 0.8),
+                                          (0, 1.2)])
+def test_nonlinear_map_matches_float(controller, low_pct, rate):
+    for speed in range(-2047, 2048):
+        new = controller.nonlinear_map(speed, 0, low_pct, int(rate * 1000))
+        assert isinstance(new, int)
+        assert abs(new - _old_nonlinear(speed, 0, low_pct / 100, rate)) \
+            <= 1, speed
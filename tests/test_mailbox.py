@@ -0,0 +1,81 @@
+import pytest
+from bbl.servos import POS_SCALE
+from conftest import CENTRED
+
+from control import ActuatorMailbox, CMD_ANGLE, CMD_SPEED, CMD_STOP, \
+    CMD_DUTY, PRIO_NONE, PRIO_BEHAVIOR, PRIO_EVENT, PRIO_EXEC, PRIO_BOARD
+
+
+class _Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name,) + args)
+
+
+@pytest.fixture
+def mailbox(controller):
+    mailbox = ActuatorMailbox()
+    mailbox.motors = _Recorder()
+    mailbox.servos = _Recorder()
+    return mailbox
+
+
+def test_higher_priority_wins(mailbox):
+    mailbox.post_servo(1, CMD_ANGLE, 10, PRIO_BEHAVIOR)
+    mailbox.post_servo(1, CMD_ANGLE, 20, PRIO_EXEC)
+    mailbox.post_servo(1, CMD_ANGLE, 30, PRIO_EVENT)
+    mailbox.commit()
+    assert mailbox.servos.calls == [("set_angle", 1, 20)]
+
+
+def test_last_writer_wins_between_equal_priorities(mailbox):
+    mailbox.post_motor(2, CMD_SPEED, 100, PRIO_EVENT)
+    mailbox.post_motor(2, CMD_STOP, 0, PRIO_EVENT)
+    mailbox.post_motor(2, CMD_SPEED, -300, PRIO_EVENT)
+    mailbox.commit()
+    assert mailbox.motors.calls == [("set_speed", 2, -300)]
+
+
+def test_commit_dispatches_every_command_once(mailbox):
+    mailbox.post_motor(1, CMD_STOP, 0, PRIO_BEHAVIOR)
+    mailbox.post_servo(1, CMD_STOP, 0, PRIO_BOARD)
+    mailbox.post_servo(2, CMD_SPEED, -50, PRIO_BEHAVIOR)
+    mailbox.post_servo(3, CMD_DUTY, 512, PRIO_EXEC)
+    mailbox.commit()
+    assert mailbox.motors.calls == [("stop", 1)]
+    assert mailbox.servos.calls == [("stop", 1), ("set_speed", 2, -50),
+                                    ("set_duty", 3, 512)]
+    assert list(mailbox.prio) == [PRIO_NONE] * 6
+
+    # Nothing left for the next tick
+    mailbox.commit()
+    assert len(mailbox.servos.calls) == 3
+
+
+def test_out_of_range_and_cleared_posts_are_dropped(mailbox):
+    mailbox.post_motor(0, CMD_SPEED, 1, PRIO_BOARD)
+    mailbox.post_motor(3, CMD_SPEED, 1, PRIO_BOARD)
+    mailbox.post_servo(5, CMD_ANGLE, 1, PRIO_BOARD)
+    mailbox.post_servo(4, CMD_ANGLE, 1, PRIO_BOARD)
+    mailbox.clear()
+    mailbox.commit()
+    assert mailbox.motors.calls == [] and mailbox.servos.calls == []
+
+
+def test_controller_commit_forces_a_frame_after_other_sources(
+        controller, make_setting, run_frame):
+    setting = make_setting()
+    run_frame(controller, setting, list(CENTRED))
+    run_frame(controller, setting, list(CENTRED))
+    assert not controller._force_frame
+
+    controller.mailbox.post_servo(3, CMD_ANGLE, 45, PRIO_EXEC)
+    controller.commit()
+    assert controller.servos.tar_pos[2] == 45 * POS_SCALE
+    assert controller._force_frame
+
+    # The remote's next frame goes through the full path again
+    run_frame(controller, setting, list(CENTRED))
+    assert not controller._force_frame
@@ -0,0 +1,266 @@
+import pytest
+import utime
+from bbl.motors import SLEW_SHIFT, PERIOD, MOTOR1_MASK, MOTOR1_1_BIT, \
+    MOTOR1_2_BIT
+
+
+def _tick(motors, n):
+    for _ in range(n):
+        utime.advance(1)
+        motors.motors_period_cb()
+
+
+def test_slew_steps_every_tick(controller):
+    motors = controller.motors
+    motors.set_slew(1, 2048)
+    motors.set_speed(1, 2048)
+
+    last = motors.slew_cur[0]
+    for _ in range(10):
+        _tick(motors, 1)
+        assert motors.slew_cur[0] > last
+        last = motors.slew_cur[0]
+    # 2048 per second is 2.048 per ms, without losing the fraction
+    assert last >> SLEW_SHIFT == 20
+
+    _tick(motors, 990)
+    assert motors.slew_cur[0] == 2048 << SLEW_SHIFT
+    assert motors.slew_busy == 0
+
+
+def test_slew_decel_to_stop(controller):
+    motors = controller.motors
+    motors.set_speed(1, 1024)
+    motors.set_slew(1, 0, 1024)
+    motors.set_speed(1, 0)
+    _tick(motors, 500)
+    assert motors.slew_cur[0] >> SLEW_SHIFT == 512
+    _tick(motors, 500)
+    assert motors.slew_cur[0] == 0
+    assert motors.motor1_1_duty == 0 and motors.motor1_2_duty == 0
+
+
+def _out(motors, i=0):
+    cur = motors.slew_cur[i]
+    return cur >> SLEW_SHIFT if cur >= 0 else -(-cur >> SLEW_SHIFT)
+
+
+def test_slew_floor_is_reached_at_once(controller):
+    motors = controller.motors
+    motors.set_slew(1, 1000, 1000, 600)
+    motors.set_speed(1, 1600)
+    _tick(motors, 1)
+    assert _out(motors) == 601
+    _tick(motors, 999)
+    assert _out(motors) == 1600
+
+    # Slowing down goes through the floor, it only helps a start
+    motors.set_speed(1, 200)
+    _tick(motors, 1000)
+    assert _out(motors) == 600
+    _tick(motors, 400)
+    assert _out(motors) == 200
+    # Speeding up again to below the floor jumps straight there
+    motors.set_speed(1, 400)
+    _tick(motors, 1)
+    assert _out(motors) == 400
+
+
+def test_slew_floor_above_target_stops_at_target(controller):
+    motors = controller.motors
+    motors.set_slew(2, 1000, 1000, 600)
+    motors.set_speed(2, -300)
+    _tick(motors, 1)
+    assert _out(motors, 1) == -300
+    assert not motors.slew_busy
+
+
+def test_slew_direction_flip_goes_through_zero(controller):
+    motors = controller.motors
+    motors.set_speed(1, 1024)
+    motors.set_slew(1, 1024, 2048, 300)
+    motors.set_speed(1, -1024)
+    outs = []
+    for _ in range(1300):
+        _tick(motors, 1)
+        outs.append(_out(motors))
+    # Half a second braking to zero at the decel rate, then the floor and
+    # the accel rate in the new direction
+    assert outs[499] == 0
+    assert outs[249] == 512
+    assert outs[500] == -301
+    assert all(b <= a for a, b in zip(outs, outs[1:]))
+    assert outs[-1] == -1024
+    assert motors.slew_busy == 0
+    # The pins follow the ramp
+    assert motors.motor1_2_duty > 0 and motors.motor1_1_duty == 0
+
+
+def test_slew_without_a_rate_is_immediate(controller):
+    motors = controller.motors
+    motors.set_slew(1, 0, 1024)
+    motors.set_speed(1, 2000)
+    _tick(motors, 1)
+    assert _out(motors) == 2000
+    motors.set_slew(2, 1024, 0)
+    motors.set_speed(2, 2000)
+    _tick(motors, 1000)
+    motors.set_speed(2, -2000)
+    _tick(motors, 1)
+    # Braking is immediate, the new direction still ramps up
+    assert _out(motors, 1) == 0
+    _tick(motors, 1)
+    assert 0 > _out(motors, 1) > -10
+
+
+def test_slew_late_tick_keeps_the_ramp_time(controller):
+    motors = controller.motors
+    motors.set_slew(1, 2048)
+    motors.set_speed(1, 2048)
+    _tick(motors, 1)
+    utime.advance(249)
+    _tick(motors, 1)
+    assert _out(motors) == 2048 * 251 // 1000
+
+
+def test_slew_off_applies_the_target(controller):
+    motors = controller.motors
+    motors.set_slew(1, 100)
+    motors.set_speed(1, 2048)
+    _tick(motors, 10)
+    motors.set_slew(1)
+    assert not motors.slew_mask and not motors.slew_busy
+    assert motors.motor1_1_duty == PERIOD
+
+
+def test_stop_ends_a_ramp(controller):
+    motors = controller.motors
+    motors.set_slew(1, 1024, 1024)
+    motors.set_speed(1, 2048)
+    _tick(motors, 500)
+    motors.stop(1)
+    assert motors.slew_cur[0] == 0 and motors.speed[0] == 0
+    _tick(motors, 10)
+    assert motors.motor1_1_duty == 0 and motors.motor1_2_duty == 0
+
+def test_stop_writes_pins_with_irq_off(controller, monkeypatch):
+    import bbl.motors
+    motors = controller.motors
+    motors.set_speed(1, 2048)
+    _tick(motors, 1)
+
+    irq = {"off": False, "writes": []}
+
+    def disable_irq():
+        irq["off"] = True
+        return 7
+
+    def enable_irq(state):
+        assert state == 7
+        irq["off"] = False
+
+    write = motors._write_mask
+
+    def checked_write(out):
+        irq["writes"].append(irq["off"])
+        write(out)
+
+    monkeypatch.setattr(bbl.motors, "disable_irq", disable_irq)
+    monkeypatch.setattr(bbl.motors, "enable_irq", enable_irq)
+    monkeypatch.setattr(motors, "_write_mask", checked_write)
+    motors.stop(1)
+    assert irq["writes"] == [True]
+    assert not irq["off"]
+    assert motors.out_mask & bbl.motors.MOTOR1_MASK == bbl.motors.MOTOR1_MASK
+
+
+def _on_ticks(motors, n, on_bits):
+    on = 0
+    for _ in range(n):
+        motors.motors_period_cb()
+        if motors.out_mask & MOTOR1_MASK == on_bits:
+            on += 1
+    return on
+
+
+@pytest.mark.parametrize("speed", [30, 100, 700, 2048, -30, -700])
+def test_sigma_delta_average_duty_follows_speed(controller, speed):
+    motors = controller.motors
+    motors.set_modulation(1, "sigma_delta")
+    motors.set_speed(1, speed)
+    ticks = 8192
+    on_bits = MOTOR1_1_BIT if speed > 0 else MOTOR1_2_BIT
+    on = _on_ticks(motors, ticks, on_bits)
+    # Within one speed step (ticks / 2048 on-ticks) of speed / 2048
+    assert abs(on - abs(speed) * ticks // 2048) <= ticks // 2048
+
+
+@pytest.mark.parametrize("speed", [30, 100, 700, 1024, 2048, -700])
+def test_pwm_mode_keeps_period_steps(controller, speed):
+    motors = controller.motors
+    motors.set_speed(1, speed)
+    level = abs(speed) * PERIOD // 2048
+    on_bits = MOTOR1_1_BIT if speed > 0 else MOTOR1_2_BIT
+    periods = 400
+    assert _on_ticks(motors, PERIOD * periods, on_bits) == level * periods
+    if level:
+        # One pulse per period, starting at the period start
+        for _ in range(PERIOD):
+            motors.motors_period_cb()
+            on = motors.out_mask & MOTOR1_MASK == on_bits
+            assert on == (motors.period_cnt < level)
+
+
+@pytest.fixture
+def stores(monkeypatch):
+    import machine
+    writes = []
+    monkeypatch.setattr(machine.mem32, "writes", writes)
+    return writes
+
+
+def test_pin_registers_written_only_on_change(controller, stores):
+    from bbl.motors import GPIO_OUT_W1TS_REG, GPIO_OUT_W1TC_REG
+    motors = controller.motors
+    _tick(motors, PERIOD)
+    # Both motors braked, nothing to write
+    assert stores == []
+
+    motors.set_speed(1, 1024)
+    _tick(motors, PERIOD)
+    del stores[:]
+    for _ in range(3):
+        _tick(motors, PERIOD)
+    # One set at the period start and one clear at half the period, only
+    # ever touching the pin driven forward
+    assert sorted(stores) == [(GPIO_OUT_W1TS_REG, MOTOR1_1_BIT)] * 3 + \
+        [(GPIO_OUT_W1TC_REG, MOTOR1_1_BIT)] * 3
+
+
+def test_stop_brakes_both_pins(controller, stores):
+    from bbl.motors import GPIO_OUT_W1TS_REG, GPIO_OUT_W1TC_REG, \
+        MOTOR2_MASK, MOTOR2_2_BIT
+    motors = controller.motors
+    motors.set_speed(1, 1024)
+    motors.set_speed(2, -1024)
+    _tick(motors, PERIOD - 2)
+    # Past the pulse, both motors coast with all pins low
+    assert motors.out_mask == 0
+    del stores[:]
+
+    motors.stop(1)
+    assert stores == [(GPIO_OUT_W1TS_REG, MOTOR1_MASK)]
+    motors.stop(2)
+    assert stores[1:] == [(GPIO_OUT_W1TS_REG, MOTOR2_MASK)]
+    assert motors.out_mask == MOTOR1_MASK | MOTOR2_MASK
+
+    # Stopped during the pulse, only the low pin needs setting
+    motors.set_speed(2, -1024)
+    _tick(motors, 3)
+    assert motors.out_mask & MOTOR2_MASK == MOTOR2_2_BIT
+    del stores[:]
+    motors.stop(2)
+    assert stores == [(GPIO_OUT_W1TS_REG, MOTOR2_MASK & ~MOTOR2_2_BIT)]
+    _tick(motors, PERIOD)
+    assert (GPIO_OUT_W1TC_REG, MOTOR2_MASK) not in stores
+    assert motors.out_mask == MOTOR1_MASK | MOTOR2_MASK
@@ -0,0 +1,111 @@
+import pytest
+from conftest import CENTRED
+
+from control import PermissionManager, PERMISSION_NONE
+
+
+@pytest.fixture
+def manager():
+    PermissionManager._instance = None
+    logs = []
+    manager = PermissionManager(logs.append)
+    manager.logs = logs
+    return manager
+
+
+def test_permissions_are_interned_once(manager):
+    behavior = manager.permission_id("BEHAVIOR")
+    assert manager.permission_id("EXEC") == behavior + 1
+    assert manager.permission_id("BEHAVIOR") == behavior
+    assert manager.permission_names[behavior] == "BEHAVIOR"
+
+
+def test_register_device(manager):
+    assert manager.register_device("motor", "BEHAVIOR")
+    assert manager.register_device("servo", "EXEC")
+    assert not manager.register_device("motor", "EXEC")
+    motor = manager.device_id("motor")
+    servo = manager.device_id("servo")
+    assert (motor, servo) == (0, 1)
+    assert manager.device_id("led") == PERMISSION_NONE
+    assert manager.get_device_permission("servo") == "EXEC"
+    assert manager.request(motor, manager.permission_id("BEHAVIOR"))
+
+
+def test_set_level_only_to_ordered_permissions(manager):
+    manager.register_device("motor", "BEHAVIOR")
+    manager.set_permission_order("motor", ["BEHAVIOR", "EXEC", "BOARD"])
+    motor = manager.device_id("motor")
+    behavior = manager.permission_id("BEHAVIOR")
+    board = manager.permission_id("BOARD")
+    other = manager.permission_id("OTHER")
+
+    assert manager.set_level(motor, board)
+    assert manager.request(motor, board)
+    assert not manager.request(motor, behavior)
+    assert not manager.set_level(motor, other)
+    assert manager.request(motor, board)
+    assert manager.get_device_permission("motor") == "BOARD"
+
+
+def test_set_level_logs_only_changes(manager):
+    manager.register_device("motor", "BEHAVIOR")
+    manager.set_permission_order("motor", ["BEHAVIOR", "EXEC"])
+    motor = manager.device_id("motor")
+    exec_id = manager.permission_id("EXEC")
+    del manager.logs[:]
+    manager.set_level(motor, exec_id)
+    manager.set_level(motor, exec_id)
+    assert manager.logs == ["Device 0 set to 'EXEC'."]
+
+
+def test_string_methods_match_interned_ones(manager):
+    manager.register_device("servo", "BEHAVIOR")
+    manager.set_permission_order("servo", ["BEHAVIOR", "EXEC"])
+    assert manager.set_device_permission("servo", "EXEC")
+    assert manager.request_permission("servo", "EXEC")
+    assert not manager.request_permission("servo", "BEHAVIOR")
+    # Unknown names are refused without being interned
+    names = list(manager.permission_names)
+    assert not manager.set_device_permission("servo", "NOPE")
+    assert not manager.request_permission("servo", "NOPE")
+    assert manager.permission_names == names
+    assert not manager.request_permission("led", "EXEC")
+    assert not manager.set_device_permission("led", "EXEC")
+    assert manager.get_device_permission("led") is None
+
+
+def test_permission_order(manager):
+    manager.register_device("motor", "BEHAVIOR")
+    assert not manager.set_permission_order("motor", [])
+    assert not manager.set_permission_order("led", ["EXEC"])
+    assert manager.set_permission_order("motor", ["EXEC", "BEHAVIOR"])
+    motor = manager.device_id("motor")
+    assert manager.device_orders[motor] == [
+        manager.permission_id("EXEC"), manager.permission_id("BEHAVIOR")]
+    assert not manager.add_permission("motor", "EXEC")
+    assert manager.add_permission("motor", "BOARD")
+    assert not manager.add_permission("led", "BOARD")
+    assert manager.set_device_permission("motor", "BOARD")
+
+
+def test_silent_without_logger():
+    PermissionManager._instance = None
+    manager = PermissionManager(None)
+    assert not manager.set_permission_order("led", ["EXEC"])
+
+
+def test_controller_follows_the_current_level(controller, make_setting,
+                                              run_frame):
+    setting = make_setting()
+    manager = controller.dev_manager
+    run_frame(controller, setting, list(CENTRED))
+    assert manager.set_device_permission("MOTOR", "EXEC")
+    pushed = [3000] + [2048] * 5 + [1, 1, 1, 1]
+    run_frame(controller, setting, list(pushed))
+    assert controller.motors.speed[0] == 0
+
+    # Only the level changed, the same frame is processed again
+    manager.set_level(controller.motor_dev, controller.perm_behavior)
+    run_frame(controller, setting, list(pushed))
+    assert controller.motors.speed[0] > 0
@@ -0,0 +1,192 @@
+import pytest
+import utime
+from bbl.servos import POS_SCALE, PROFILE_CONSTANT, PROFILE_TRAPEZOID, \
+    PROFILE_SCURVE, ACCEL_DEFAULT, SCURVE_JERK_MS, SCURVE_TICKS_MAX
+
+
+def _move(servos, angle, start=0, profile="constant", accel=0, ms=5000):
+    servos.reset_info(1, start)
+    servos.set_angle_step(1, 100)
+    servos.set_motion_profile(1, profile, accel)
+    servos.set_angle_stepping(1, angle)
+    return _positions(servos, ms)
+
+
+def _positions(servos, ms):
+    positions = [servos.cur_pos[0]]
+    write = servos._write_duty
+
+    def recording_write(i, duty_ns):
+        if i == 0:
+            positions.append(servos.cur_pos[0])
+        write(i, duty_ns)
+
+    servos._write_duty = recording_write
+    try:
+        for _ in range(ms):
+            utime.advance(1)
+            servos.timing_proc()
+            if not servos.step_mask:
+                break
+    finally:
+        del servos._write_duty
+    return positions
+
+
+def _diffs(values):
+    return [b - a for a, b in zip(values, values[1:])]
+
+
+def _vmax(servos):
+    return servos.vel[0] * servos.rate[0] // 100
+
+
+DISTANCES = [(0, 180), (180, 0), (90, 93), (45, 44), (0, 8), (0, 15),
+             (0, 50), (13, 170), (100, 0), (0, 162)]
+
+
+@pytest.mark.parametrize("profile", ["constant", "trapezoid", "s_curve"])
+@pytest.mark.parametrize("start,angle", DISTANCES)
+def test_profile_reaches_the_target(controller, profile, start, angle):
+    servos = controller.servos
+    positions = _move(servos, angle, start, profile)
+    assert positions[-1] == angle * POS_SCALE
+    assert servos.step_mask == 0 and servos.cur_vel[0] == 0
+    # Never past the target or back towards the start, never above vmax
+    sign = 1 if angle > start else -1
+    speeds = [d * sign for d in _diffs(positions)]
+    assert all(0 < v <= _vmax(servos) for v in speeds)
+
+
+@pytest.mark.parametrize("profile", ["constant", "trapezoid", "s_curve"])
+def test_profile_reaches_vmax(controller, profile):
+    servos = controller.servos
+    positions = _move(servos, 180, 0, profile)
+    assert max(_diffs(positions)) == _vmax(servos)
+
+
+@pytest.mark.parametrize("start,angle", DISTANCES)
+def test_trapezoid_ramps_at_constant_acceleration(controller, start, angle):
+    servos = controller.servos
+    accel = ACCEL_DEFAULT * POS_SCALE // (50 * 50)
+    speeds = [abs(d) for d in _diffs(_move(servos, angle, start,
+                                            "trapezoid"))]
+    accels = _diffs(speeds)
+    assert speeds[0] == min(accel, abs(angle - start) * POS_SCALE)
+    # Speeding up, holding, then braking, at most accel per frame. Only
+    # the last step onto the target may brake harder.
+    braking = [i for i, a in enumerate(accels) if a < 0]
+    if braking:
+        assert all(a <= 0 for a in accels[braking[0]:])
+        assert all(a >= -accel for a in accels[braking[0]:-1])
+    assert all(a <= accel for a in accels)
+    assert speeds[-1] <= 2 * accel
+
+
+@pytest.mark.parametrize("start,angle", DISTANCES)
+def test_scurve_ramps_the_acceleration(controller, start, angle):
+    servos = controller.servos
+    accel = servos.accel[0]
+    positions = _move(servos, angle, start, "s_curve")
+    n = servos.hist_len[0]
+    speeds = [abs(d) for d in _diffs(positions)]
+    accels = [0] + _diffs([0] + speeds)
+    # The acceleration changes over n frames where the trapezoid jumps at
+    # once, by accel or by 2 * accel straight from speeding up to braking.
+    # The mean is rounded down, a few units either way.
+    jerk = 2 * accel // n + 4
+    assert all(abs(b - a) <= jerk for a, b in zip(accels, accels[1:-1]))
+    # Bar the harder last step of the trapezoid, spread over n frames
+    assert all(abs(a) <= accel + 4 for a in accels[:-n - 1])
+
+
+def test_scurve_ramps_over_the_jerk_time(controller):
+    servos = controller.servos
+    positions = _move(servos, 180, 0, "s_curve")
+    accel = servos.accel[0]
+    n = servos.hist_len[0]
+    assert n == 50 * SCURVE_JERK_MS // 1000
+    speeds = _diffs(positions)
+    assert speeds[:n] == [accel * (k + 1) * (k + 2) // 2 // n
+                          for k in range(n)]
+    accels = _diffs([0] + speeds)
+    assert max(abs(b - a) for a, b in zip(accels, accels[1:-1])) <= \
+        accel // n + 4
+
+
+def test_smoother_profiles_take_longer(controller):
+    servos = controller.servos
+    frames = [len(_move(servos, 180, 0, name))
+              for name in ("constant", "trapezoid", "s_curve")]
+    assert frames[0] < frames[1] < frames[2]
+
+
+@pytest.mark.parametrize("profile", ["trapezoid", "s_curve"])
+def test_target_reversal_brakes_first(controller, profile):
+    servos = controller.servos
+    servos.reset_info(1, 0)
+    servos.set_angle_step(1, 100)
+    servos.set_motion_profile(1, profile)
+    servos.set_angle_stepping(1, 180)
+    forward = _positions(servos, 400)
+    assert servos.step_mask
+    speed = forward[-1] - forward[-2]
+
+    servos.set_angle_stepping(1, 0)
+    back = _positions(servos, 10000)
+    speeds = _diffs(forward[-2:] + back[1:])
+    # Still moving forward, slower, before turning round at accel
+    assert 0 < speeds[1] < speed
+    assert all(-servos.accel[0] - 4 <= b - a <= 4
+               for a, b in zip(speeds, speeds[1:speeds.index(min(speeds))]))
+    assert min(speeds) == -_vmax(servos)
+    assert back[-1] == 0 and servos.step_mask == 0
+
+
+def test_lower_step_speed_brakes_to_it(controller):
+    servos = controller.servos
+    servos.reset_info(1, 0)
+    servos.set_angle_step(1, 100)
+    servos.set_motion_profile(1, "trapezoid")
+    servos.set_angle_stepping(1, 180)
+    _positions(servos, 400)
+    speed = servos.cur_vel[0]
+    servos.set_angle_step(1, 50)
+    speeds = _diffs(_positions(servos, 200))
+    vmax = _vmax(servos)
+    k = speeds.index(vmax)
+    assert speeds[:k] == [speed - servos.accel[0] * (j + 1)
+                          for j in range(k)]
+    assert all(v == vmax for v in speeds[k:])
+
+
+def test_motion_profile_settings(controller):
+    servos = controller.servos
+    servos.set_motion_profile(2, "s_curve", 720)
+    assert servos.profile[1] == PROFILE_SCURVE
+    assert servos.accel_dps2[1] == 720
+    assert servos.accel[1] == 720 * POS_SCALE // (50 * 50)
+    assert servos.hist_len[1] == 5
+
+    servos.set_motion_profile(2, "trapezoid", -1)
+    assert servos.profile[1] == PROFILE_TRAPEZOID
+    assert servos.accel_dps2[1] == ACCEL_DEFAULT
+
+    # Unknown names and servos are ignored
+    servos.set_motion_profile(2, "cubic", 100)
+    servos.set_motion_profile(5, "constant")
+    assert list(servos.profile) == [PROFILE_CONSTANT, PROFILE_TRAPEZOID,
+                                    PROFILE_CONSTANT, PROFILE_CONSTANT]
+
+    servos.set_refresh_rate(2, 333)
+    assert servos.hist_len[1] == 33
+    servos.reset_info(2, 90, 4, 1000)
+    assert servos.hist_len[1] == SCURVE_TICKS_MAX
+
+
+def test_tiny_acceleration_keeps_moving(controller):
+    servos = controller.servos
+    servos.set_refresh_rate(1, 333)
+    positions = _move(servos, 1, 0, "s_curve", 1, 60000)
+    assert servos.accel[0] == 1
+    assert positions[-1] == POS_SCALE
@@ -0,0 +1,208 @@
+import uasyncio
+import utime
+from runtime import FrameScheduler, FrameInput, RatePolicy, RATE_FAST_MS, \
+    RATE_CRUISE_MS, RATE_IDLE_MS
+
+
+def test_rate_follows_input_and_link():
+    policy = RatePolicy()
+    assert policy.update(True, True) == RATE_FAST_MS
+    utime.advance(1000)
+    assert policy.update(False, True) == RATE_CRUISE_MS
+    utime.advance(5000)
+    assert policy.update(False, True) == RATE_IDLE_MS
+    assert policy.update(False, False) == RATE_IDLE_MS
+    assert policy.is_idle()
+
+
+def test_busy_outputs_keep_cruise_rate():
+    policy = RatePolicy()
+    assert policy.update(False, False, busy=True) == RATE_CRUISE_MS
+    utime.advance(10000)
+    assert policy.update(False, True, busy=True) == RATE_CRUISE_MS
+    assert not policy.is_idle()
+
+
+def test_simulation_counts_as_busy(controller, make_setting):
+    setting = make_setting()
+    assert not controller.is_busy()
+    from devices import Devices
+    effect = Devices.PWM_3 + 45 * Devices.get_base_multiplier()
+    controller.simulation_effect_set(1, setting, effect)
+    assert controller.is_busy()
+
+
+def _frames(scheduler, work_ms, count):
+    starts = []
+    for i in range(count):
+        scheduler.start()
+        starts.append(utime.ticks_ms())
+        utime.advance(work_ms[i] if isinstance(work_ms, list) else work_ms)
+        uasyncio.run(scheduler.wait())
+    return starts
+
+
+def test_deadlines_do_not_stretch_with_work():
+    scheduler = FrameScheduler(20)
+    t0 = utime.ticks_ms()
+    starts = _frames(scheduler, [3, 15, 7, 19, 1], 5)
+    assert [utime.ticks_diff(t, t0) for t in starts] == [0, 20, 40, 60, 80]
+    frames, overruns, last_ms, max_ms = scheduler.get_stats()
+    assert (frames, overruns, last_ms, max_ms) == (5, 0, 20, 20)
+
+
+def test_overrun_is_counted_and_not_caught_up():
+    scheduler = FrameScheduler(20)
+    t0 = utime.ticks_ms()
+    # The second frame takes 50ms, the missed frames are not run back to
+    # back and the schedule restarts from the end of the long frame
+    starts = _frames(scheduler, [5, 50, 5, 5], 4)
+    assert [utime.ticks_diff(t, t0) for t in starts] == [0, 20, 70, 90]
+    frames, overruns, _, max_ms = scheduler.get_stats()
+    assert overruns == 1
+    assert max_ms == 50
+
+    scheduler.reset_stats()
+    assert scheduler.get_stats()[:2] == (0, 0)
+
+
+def test_set_period_applies_from_the_frame_start():
+    scheduler = FrameScheduler(20)
+    scheduler.start()
+    t0 = utime.ticks_ms()
+    utime.advance(4)
+    scheduler.set_period(100)
+    assert scheduler.slack() == 96
+    uasyncio.run(scheduler.wait())
+    assert utime.ticks_diff(utime.ticks_ms(), t0) == 100
+    scheduler.start()
+    scheduler.set_period(10)
+    uasyncio.run(scheduler.wait())
+    assert utime.ticks_diff(utime.ticks_ms(), t0) == 110
+
+
+def test_sleep_func_replaces_polling():
+    scheduler = FrameScheduler(100)
+    scheduler.start()
+    slept = []
+
+    def sleep_func(ms):
+        slept.append(ms)
+        utime.advance(ms)
+
+    polls = []
+    woken = uasyncio.run(scheduler.wait(lambda: polls.append(1), 4,
+                                        sleep_func))
+    assert not woken
+    assert slept == [100]
+    assert polls == []
+
+
+class _Receiver:
+    """Delivers a new frame at the given times, in ms from the start."""
+
+    def __init__(self, t0, arrivals):
+        self.t0 = t0
+        self.arrivals = arrivals
+        self.reads = []
+
+    def __call__(self):
+        now = utime.ticks_diff(utime.ticks_ms(), self.t0)
+        self.reads.append(now)
+        n = len([t for t in self.arrivals if t <= now])
+        return [2048 + n] * 6 + [1, 1, 1, 1]
+
+
+def test_wait_polls_every_4ms_until_the_deadline():
+    scheduler = FrameScheduler(20)
+    t0 = utime.ticks_ms()
+    receiver = _Receiver(t0, [])
+    frame_input = FrameInput(receiver)
+    frame_input.poll()
+    scheduler.start()
+    utime.advance(2)
+    woken = uasyncio.run(scheduler.wait(frame_input.poll))
+    assert not woken
+    assert receiver.reads == [0, 6, 10, 14, 18, 20]
+
+
+def test_new_frame_wakes_the_wait_and_restarts_the_deadline():
+    scheduler = FrameScheduler(20)
+    t0 = utime.ticks_ms()
+    frame_input = FrameInput(_Receiver(t0, [9]))
+    frame_input.poll()
+    scheduler.start()
+    woken = uasyncio.run(scheduler.wait(frame_input.poll))
+    assert woken
+    # Seen at the first poll after it arrived, not at the 20ms deadline
+    assert utime.ticks_diff(utime.ticks_ms(), t0) == 12
+    assert frame_input.data[0] == 2049
+    assert scheduler.slack() == 20
+
+
+def test_latency_is_measured_from_the_poll_to_applied():
+    t0 = utime.ticks_ms()
+    frame_input = FrameInput(_Receiver(t0, [5, 10]))
+    assert frame_input.poll()
+    utime.advance_us(1500)
+    frame_input.applied()
+    # An unchanged frame is not counted
+    utime.advance_us(500)
+    assert not frame_input.poll()
+    frame_input.applied()
+
+    utime.advance(8)
+    assert frame_input.poll()
+    utime.advance_us(500)
+    frame_input.applied()
+    assert frame_input.get_stats() == (2, 2, 1000, 1500)
+
+    frame_input.reset_stats()
+    assert frame_input.get_stats() == (2, 0, 0, 0)
+
+
+def test_empty_read_is_not_a_frame():
+    frame_input = FrameInput(lambda: None)
+    assert not frame_input.poll()
+    assert frame_input.data is None
+    frame_input.applied()
+    assert frame_input.get_stats() == (0, 0, 0, 0)
+
+
+def test_simulation_rate_drops_to_idle_after_the_loop(controller,
+                                                      make_setting):
+    setting = make_setting()
+    policy = RatePolicy()
+    from devices import Devices
+    effect = Devices.MOTOR_1 + 50 * Devices.get_base_multiplier()
+    controller.simulation_effect_set(1, setting, effect)
+    # Simulation runs at the cruise rate even without a link
+    assert policy.update(False, False, controller.is_busy()) == \
+        RATE_CRUISE_MS
+    utime.advance(2000)
+    controller.simulation_effect_handle()
+    assert not controller.is_busy()
+    assert policy.update(False, False, controller.is_busy()) == RATE_IDLE_MS
+
+
+def test_input_conditioning_ignores_the_frame_rate(controller, make_setting,
+                                                   run_frame, rc_config):
+    # The filters are timed, like the calibration window, so the rate the
+    # policy picks (fast, cruise, idle or busy) does not change them
+    data = rc_config["sender"]["channels"][0]["data"]
+    data["filter"] = "iir"
+    data["filter_value"] = 3
+    setting = make_setting(rc_config)
+
+    results = []
+    for period_ms in (RATE_FAST_MS, RATE_CRUISE_MS, RATE_IDLE_MS):
+        controller.reinit()
+        frame = [1000] + [2048] * 5 + [1, 1, 1, 1]
+        run_frame(controller, setting, list(frame), period_ms)
+        frame[0] = 3000
+        for _ in range(300 // period_ms):
+            run_frame(controller, setting, list(frame), period_ms)
+        # Normalised channel 0 after the filter
+        results.append(controller.frame[0])
+    assert results[0] == results[1] == results[2]
+    assert 0 < results[0] < controller.adc_value_deal(3000, 4096, 2048, 100)
@@ -0,0 +1,115 @@
+import pytest
+from bbl.servos import POS_SCALE, PULSE_MIN_DEFAULT, PULSE_MAX_DEFAULT, \
+    PULSE_CENTER_DEFAULT
+
+
+def _ns(servos, angle, servo_idx=1):
+    return servos._pos_to_ns(servo_idx - 1, int(angle * POS_SCALE))
+
+
+def test_default_table_is_linear(controller):
+    servos = controller.servos
+    lut = servos.lut[0]
+    assert (lut[0], lut[90], lut[180]) == (PULSE_MIN_DEFAULT * 10,
+                                           PULSE_CENTER_DEFAULT * 10,
+                                           PULSE_MAX_DEFAULT * 10)
+    for deg in range(181):
+        assert lut[deg] == 5000 + deg * 20000 // 180
+
+
+def test_pos_to_ns_interpolates_within_a_degree(controller):
+    servos = controller.servos
+    last = -1
+    # Every position from 0 to 180 degrees, in steps of 1/16 degree
+    for pos in range(0, 180 * POS_SCALE + 1, POS_SCALE // 16):
+        ns = servos._pos_to_ns(0, pos)
+        exact = 500000 + pos * 2000000 // (180 * POS_SCALE)
+        assert abs(ns - exact) <= 100, pos
+        assert ns >= last
+        last = ns
+    assert _ns(servos, 0) == 500000
+    assert _ns(servos, 90) == 1500000
+    assert _ns(servos, 180) == 2500000
+    # Half way between two table entries
+    assert _ns(servos, 45.5) == (servos.lut[0][45] + servos.lut[0][46]) * 50
+
+
+def test_centre_trim_lands_on_90(controller):
+    servos = controller.servos
+    servos.set_calibration(1, 600, 2400, 1480)
+    lut = servos.lut[0]
+    assert (lut[0], lut[90], lut[180]) == (6000, 14800, 24000)
+    # Two slopes, each straight from its end to the centre
+    assert lut[45] == (6000 + 14800) // 2
+    assert lut[135] == (14800 + 24000) // 2
+    assert _ns(servos, 90) == 1480000
+    assert all(a < b for a, b in zip(lut, lut[1:]))
+    # The other servos keep their table
+    assert servos.lut[1][90] == PULSE_CENTER_DEFAULT * 10
+
+
+def test_default_centre_is_the_middle(controller):
+    servos = controller.servos
+    servos.set_calibration(2, 700, 2301)
+    assert servos.pulse_center[1] == 1500
+    assert servos.lut[1][90] == 15000
+
+
+@pytest.mark.parametrize("min_us,max_us,center_us", [
+    (0, 2500, 1500), (1500, 2500, 1500), (500, 1500, 1500),
+    (500, 400, None), (500, 6001, 3000), (-100, 2500, 1200)])
+def test_invalid_calibration_is_refused(controller, min_us, max_us,
+                                        center_us):
+    servos = controller.servos
+    before = list(servos.lut[0])
+    servos.set_calibration(1, min_us, max_us, center_us)
+    assert list(servos.lut[0]) == before
+    assert servos.pulse_center[0] == PULSE_CENTER_DEFAULT
+
+
+def test_calibration_must_fit_the_frame(controller):
+    servos = controller.servos
+    servos.set_refresh_rate(1, 333)
+    servos.set_calibration(1, 500, 3100, 1800)
+    assert servos.pulse_max[0] == PULSE_MAX_DEFAULT
+    servos.set_calibration(1, 500, 2900, 1700)
+    assert servos.pulse_max[0] == 2900
+    # Index out of range is ignored
+    servos.set_calibration(5, 600, 2400)
+    assert servos.pulse_max[0] == 2900
+
+
+def test_calibration_rewrites_the_held_angle(controller):
+    servos = controller.servos
+    servos.set_angle(1, 90)
+    pwm = servos.servos_map[0]
+    assert pwm.duty_ns() == 1500000
+    servos.set_calibration(1, 500, 2500, 1450)
+    servos.set_angle(1, 90)
+    assert pwm.duty_ns() == 1450000
+
+
+def test_faster_frame_resets_a_range_that_no_longer_fits(controller):
+    servos = controller.servos
+    servos.set_calibration(1, 800, 3500, 2000)
+    servos.set_calibration(2, 800, 2900, 1900)
+    servos.set_refresh_rate(1, 200)
+    assert servos.pulse_max[0] == 3500
+    servos.set_refresh_rate(1, 333)
+    servos.set_refresh_rate(2, 333)
+    assert (servos.pulse_min[0], servos.pulse_center[0],
+            servos.pulse_max[0]) == (PULSE_MIN_DEFAULT, PULSE_CENTER_DEFAULT,
+                                     PULSE_MAX_DEFAULT)
+    assert servos.lut[0][180] == PULSE_MAX_DEFAULT * 10
+    # 2.9ms still fits the 3ms frame
+    assert servos.pulse_max[1] == 2900
+
+
+def test_speed_uses_the_calibrated_ends(controller):
+    servos = controller.servos
+    servos.set_calibration(1, 600, 2400, 1480)
+    pwm = servos.servos_map[0]
+    for speed, ns in ((0, 1480000), (100, 2400000), (-100, 600000),
+                      (50, 1940000), (-50, 1040000)):
+        servos.set_speed(1, speed)
+        assert pwm.duty_ns() == ns
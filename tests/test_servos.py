@@ -0,0 +1,250 @@
+import pytest
+import utime
+
+
+def _count_steps(servos, servo_idx, ms):
+    steps = []
+    write = servos._write_duty
+
+    def counting_write(i, duty_ns):
+        if i == servo_idx - 1:
+            steps.append(utime.ticks_ms())
+        write(i, duty_ns)
+
+    servos._write_duty = counting_write
+    try:
+        for _ in range(ms):
+            utime.advance(1)
+            servos.timing_proc()
+    finally:
+        del servos._write_duty
+    return steps
+
+
+def test_idle_servos_do_no_work(controller):
+    servos = controller.servos
+    assert servos.step_mask == 0
+    assert _count_steps(servos, 1, 100) == []
+
+
+def test_333hz_steps_keep_the_frame_period(controller):
+    servos = controller.servos
+    servos.set_refresh_rate(1, 333)
+    servos.reset_info(1, 0, radPSec=4)
+    # Slow enough to still be moving after three seconds
+    servos.set_angle_step(1, 1)
+    servos.set_angle_stepping(1, 180)
+
+    steps = _count_steps(servos, 1, 3003)
+    # One step per 3.003ms frame, the fraction is carried
+    assert len(steps) == 1000
+    gaps = {b - a for a, b in zip(steps, steps[1:])}
+    assert gaps <= {3, 4}
+
+
+def test_50hz_steps_every_20ms(controller):
+    servos = controller.servos
+    servos.reset_info(2, 0, radPSec=4)
+    servos.set_angle_step(2, 1)
+    servos.set_angle_stepping(2, 180)
+    steps = _count_steps(servos, 2, 200)
+    assert {b - a for a, b in zip(steps, steps[1:])} == {20}
+
+
+def test_exec_mapper_configures_the_controller_servos(controller):
+    from bbl.servos import PROFILE_SCURVE
+    from control import ServosControllerExecMapper, MotorsControllerExecMapper
+    real = controller.servos
+    pwm = real.servos_map[0]
+
+    # A script run constructs the mappers again and again
+    for _ in range(2):
+        servos = ServosControllerExecMapper()
+        servos.set_refresh_rate(1, 200)
+        servos.set_calibration(1, 600, 2400, 1480)
+        servos.set_motion_profile(1, "s_curve", 720)
+    assert not hasattr(servos, "servos_map")
+
+    assert real.refresh_hz[0] == 200
+    assert real.period_ns[0] == 1000000000 // 200
+    assert pwm.freq() == 200
+    assert real.pulse_center[0] == 1480
+    assert real.lut[0][90] == 14800
+    assert real.profile[0] == PROFILE_SCURVE
+    assert real.accel_dps2[0] == 720
+    # The other channels are untouched
+    assert real.period_ns[1] == 1000000000 // 50
+    assert real.pulse_center[1] == 1500
+
+    mailbox = MotorsControllerExecMapper().mailbox
+    assert MotorsControllerExecMapper().mailbox is mailbox
+
+
+def _full_passes(servos, ms):
+    passes = []
+    for t in range(1, ms + 1):
+        utime.advance(1)
+        servos.timing_proc()
+        if servos.skip_ns == 0:
+            passes.append(t)
+    return passes
+
+
+def test_ticks_between_frames_return_early(controller):
+    servos = controller.servos
+    servos.reset_info(1, 0, radPSec=4)
+    servos.set_angle_step(1, 1)
+    servos.set_angle_stepping(1, 180)
+    # Only the ticks at a frame end look at the channels
+    assert _full_passes(servos, 100) == [1, 21, 41, 61, 81]
+
+    # A second channel at 200Hz adds its own frame ends
+    servos.set_refresh_rate(2, 200)
+    servos.reset_info(2, 0, radPSec=4)
+    servos.set_angle_step(2, 1)
+    servos.set_angle_stepping(2, 180)
+    assert _full_passes(servos, 21) == [1, 6, 11, 16, 21]
+
+
+def test_new_target_steps_on_the_next_tick(controller):
+    servos = controller.servos
+    servos.reset_info(1, 0, radPSec=4)
+    servos.set_angle_step(1, 1)
+    servos.set_angle_stepping(1, 180)
+    _full_passes(servos, 5)
+
+    servos.reset_info(3, 0, radPSec=4)
+    servos.set_angle_step(3, 1)
+    servos.set_angle_stepping(3, 90)
+    assert _count_steps(servos, 3, 41) == [utime.ticks_ms() - 40,
+                                           utime.ticks_ms() - 20,
+                                           utime.ticks_ms()]
+
+
+def test_group_motion_keeps_time_across_skipped_ticks(controller):
+    from bbl.servos import POS_SCALE
+    servos = controller.servos
+    servos.reset_info(1, 0)
+    servos.reset_info(2, 0)
+    servos.move_group({1: 90, 2: 180}, 200)
+    _full_passes(servos, 100)
+    # Last step at 81ms, placed by the time since the start
+    frac = (81 << 11) // 200
+    assert servos.cur_pos[0] == 90 * POS_SCALE * frac >> 11
+    _full_passes(servos, 101)
+    assert servos.cur_pos[0] == 90 * POS_SCALE
+    assert servos.cur_pos[1] == 180 * POS_SCALE
+    assert servos.step_mask == 0
+
+
+def _group_at(servos, targets, start=0):
+    for servo_idx in targets:
+        servos.reset_info(servo_idx, start)
+    servos.move_group(targets, 400)
+
+
+def test_group_servos_share_their_progress(controller):
+    from bbl.servos import POS_SCALE
+    servos = controller.servos
+    servos.reset_info(3, 180)
+    _group_at(servos, {1: 30, 2: 180})
+    servos.move_group({1: 30, 2: 180, 3: 90}, 400)
+    for _ in range(10):
+        _full_passes(servos, 20)
+        moved = [servos.cur_pos[0] * 2048 // (30 * POS_SCALE),
+                 servos.cur_pos[1] * 2048 // (180 * POS_SCALE),
+                 (180 * POS_SCALE - servos.cur_pos[2]) * 2048 //
+                 (90 * POS_SCALE)]
+        # The same fraction of each move, down to rounding
+        assert max(moved) - min(moved) <= 1
+    _full_passes(servos, 201)
+    assert list(servos.cur_pos)[:3] == [30 * POS_SCALE, 180 * POS_SCALE,
+                                        90 * POS_SCALE]
+    assert servos.group_mask == 0 and servos.step_mask == 0
+
+
+def test_group_arrives_together_at_different_frame_rates(controller):
+    from bbl.servos import POS_SCALE
+    servos = controller.servos
+    servos.set_refresh_rate(2, 333)
+    _group_at(servos, {1: 90, 2: 90})
+    arrived = {}
+    for t in range(1, 430):
+        utime.advance(1)
+        servos.timing_proc()
+        for i in (0, 1):
+            if i not in arrived and servos.cur_pos[i] == 90 * POS_SCALE:
+                arrived[i] = t
+    # On the first frame of each servo at or after 400ms
+    assert arrived == {0: 401, 1: 401}
+
+
+def test_group_member_without_distance_stays_put(controller):
+    from bbl.servos import POS_SCALE
+    servos = controller.servos
+    servos.reset_info(2, 60)
+    _group_at(servos, {1: 120})
+    servos.move_group({1: 120, 2: 60}, 400)
+    pwm = servos.servos_map[1]
+    _full_passes(servos, 100)
+    assert servos.cur_pos[1] == 60 * POS_SCALE
+    assert pwm.duty_ns() == servos._pos_to_ns(1, 60 * POS_SCALE)
+    _full_passes(servos, 301)
+    assert servos.step_mask == 0
+
+
+def test_group_without_duration_moves_at_once(controller):
+    from bbl.servos import POS_SCALE
+    servos = controller.servos
+    servos.move_group({1: 10, 4: 170}, 0)
+    assert servos.cur_pos[0] == 10 * POS_SCALE
+    assert servos.cur_pos[3] == 170 * POS_SCALE
+    assert servos.step_mask == 0 and servos.group_mask == 0
+
+
+@pytest.mark.parametrize("targets", [{1: 90, 5: 90}, {1: 90, 2: 181},
+                                     {0: 90}, {2: -1}])
+def test_invalid_group_moves_nothing(controller, targets):
+    servos = controller.servos
+    servos.reset_info(1, 0)
+    servos.reset_info(2, 0)
+    servos.move_group(targets, 400)
+    assert servos.step_mask == 0 and servos.group_mask == 0
+    assert servos.tar_pos[0] == 0 and servos.tar_pos[1] == 0
+
+
+def test_stepping_command_leaves_the_group(controller):
+    from bbl.servos import POS_SCALE, STEP_PROFILE
+    servos = controller.servos
+    _group_at(servos, {1: 90, 2: 90})
+    _full_passes(servos, 100)
+    servos.set_angle_stepping(2, 0, 100)
+    assert servos.group_mask == 1 << 0
+    assert servos.step_en[1] == STEP_PROFILE
+    _full_passes(servos, 301)
+    assert servos.cur_pos[0] == 90 * POS_SCALE
+    assert servos.cur_pos[1] == 0
+    assert servos.step_mask == 0
+
+    # A direct angle also takes a servo out
+    _group_at(servos, {1: 90, 2: 90})
+    servos.set_angle(1, 45)
+    assert servos.group_mask == 1 << 1
+    assert servos.cur_pos[0] == 45 * POS_SCALE
+
+
+def test_new_group_hands_leftovers_to_their_profile(controller):
+    from bbl.servos import POS_SCALE, STEP_PROFILE
+    servos = controller.servos
+    _group_at(servos, {1: 90, 2: 90})
+    servos.set_angle_step(2, 100)
+    _full_passes(servos, 100)
+    servos.move_group({1: 0}, 200)
+    # Servo 2 keeps going to its target on its own step speed
+    assert servos.group_mask == 1 << 0
+    assert servos.step_en[1] == STEP_PROFILE
+    assert servos.tar_pos[1] == 90 * POS_SCALE
+    _full_passes(servos, 3000)
+    assert servos.cur_pos[0] == 0
+    assert servos.cur_pos[1] == 90 * POS_SCALE
+    assert servos.step_mask == 0
@@ -0,0 +1,125 @@
+from conftest import CENTRED
+
+
+def _counted(servos, internal_idx):
+    calls = []
+    pwm = servos.servos_map[internal_idx]
+    write = pwm.duty_ns
+
+    def duty_ns(value=None):
+        if value is not None:
+            calls.append(value)
+        return write(value)
+
+    pwm.duty_ns = duty_ns
+    return calls
+
+
+def test_motor_repeated_speed_is_suppressed(controller):
+    motors = controller.motors
+    motors.reset_write_stats()
+    motors.set_speed(1, 1000)
+    motors.set_speed(1, 1000)
+    motors.set_speed(2, -1000)
+    assert motors.get_write_stats() == (2, 1)
+    motors.set_speed(1, -1000)
+    assert motors.get_write_stats() == (3, 1)
+
+
+def test_motor_stop_counts_only_a_running_motor(controller):
+    motors = controller.motors
+    motors.set_speed(1, 1000)
+    motors.reset_write_stats()
+    motors.stop(1)
+    motors.stop(1)
+    motors.stop(2)
+    assert motors.get_write_stats() == (1, 2)
+    # Stopping keeps the speed at zero, so zero is not written again
+    motors.set_speed(1, 0)
+    assert motors.get_write_stats() == (1, 3)
+
+
+def test_motor_slew_suppresses_same_target(controller):
+    motors = controller.motors
+    motors.set_slew(1, 2048)
+    motors.reset_write_stats()
+    motors.set_speed(1, 1500)
+    motors.set_speed(1, 1500)
+    assert motors.get_write_stats() == (1, 1)
+
+
+def test_reset_write_stats(controller):
+    motors = controller.motors
+    motors.set_speed(1, 200)
+    motors.set_speed(1, 200)
+    motors.reset_write_stats()
+    assert motors.get_write_stats() == (0, 0)
+    servos = controller.servos
+    servos.set_angle(1, 30)
+    servos.reset_write_stats()
+    assert servos.get_write_stats() == (0, 0)
+
+
+def test_servo_same_duty_reaches_the_pwm_once(controller):
+    servos = controller.servos
+    calls = _counted(servos, 0)
+    servos.reset_write_stats()
+    servos.set_angle(1, 45)
+    servos.set_angle(1, 45)
+    servos.set_duty(1, 100)
+    servos.set_duty(1, 100)
+    servos.stop(1)
+    servos.stop(1)
+    assert servos.get_write_stats() == (3, 3)
+    assert len(calls) == 3 and calls[-1] == 0
+
+
+def test_servo_speed_writes_only_on_change(controller):
+    servos = controller.servos
+    calls = _counted(servos, 1)
+    servos.reset_write_stats()
+    for speed in (50, 50, -50, -50, 0):
+        servos.set_speed(2, speed)
+    assert servos.get_write_stats() == (3, 2)
+    assert len(calls) == 3
+
+
+def test_servo_same_stepping_target_is_suppressed(controller):
+    servos = controller.servos
+    servos.reset_write_stats()
+    servos.set_angle_stepping(1, 120, 10)
+    servos.set_angle_stepping(1, 120)
+    assert servos.get_write_stats() == (0, 1)
+    assert servos.step_mask & 1
+
+
+def test_mapper_reads_the_controller_counters(controller):
+    servos = controller.servos
+    servos.reset_write_stats()
+    servos.set_angle(3, 10)
+    servos.set_angle(3, 10)
+    assert controller.servos_mapper.get_write_stats() == (1, 1)
+    controller.servos_mapper.reset_write_stats()
+    assert servos.get_write_stats() == (0, 0)
+
+
+def test_full_frames_with_same_outputs_write_nothing(controller,
+                                                     make_setting,
+                                                     run_frame):
+    setting = make_setting()
+    frame = [3000, 1000, 2500] + [2048] * 3 + [1, 1, 1, 1]
+    run_frame(controller, setting, list(CENTRED))
+    run_frame(controller, setting, list(frame))
+    motors = controller.motors
+    servos = controller.servos
+    motors.reset_write_stats()
+    servos.reset_write_stats()
+
+    # Forced frames go through the mixer and post every output again
+    for _ in range(5):
+        controller._force_frame = True
+        run_frame(controller, setting, list(frame))
+    assert motors.get_write_stats()[0] == 0
+    assert servos.get_write_stats()[0] == 0
+    assert motors.get_write_stats()[1] > 0
+    assert servos.get_write_stats()[1] > 0